@@ -1,11 +1,32 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+import plotly.colors
 from plotly.subplots import make_subplots
 import io
 import ast
 import numpy as np
 import re
+import os
+import time
+import gzip
+import bz2
+import zipfile
+import openpyxl
+import hashlib
+import base64
+import json
+import shutil
+import threading
+from collections import OrderedDict
+import weakref
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import zstandard  # 可选依赖：读取 .zst 压缩文件
+except ImportError:
+    zstandard = None
 
 # Test push - 2026-02-05
 st.set_page_config(page_title="绘图小工具-by YMX", layout="wide")
@@ -17,7 +38,7 @@ def generate_chart_title(data_source, y_columns, x_column, chart_type='折线图
     根据文件名、Y轴特征和X轴特征生成图表标题
     
     格式：文件名 - Y特征1, Y特征2, ... vs. X轴特征
-    如果是直方图，格式：文件名 - Y特征1, Y特征2, ... 分布
+    如果是直方图或通道分布图，格式：文件名 - Y特征1, Y特征2, ... 分布
     
     Args:
         data_source: 数据源文件名
@@ -41,7 +62,7 @@ def generate_chart_title(data_source, y_columns, x_column, chart_type='折线图
         y_str = ", ".join(y_columns[:3]) + f" 等{len(y_columns)}个特征"
     
     # 根据图表类型生成不同格式的标题
-    if chart_type == '直方图':
+    if chart_type in ('直方图', '通道分布图'):
         return f"{filename} - {y_str} 分布"
     else:
         return f"{filename} - {y_str} vs. {x_column}"
@@ -56,10 +77,14 @@ def is_auto_generated_title(title):
 
 # ============ 时间戳智能识别与转换 ============
 
-def detect_timestamp_type(series):
+def detect_timestamp_type(series, column_stats=None):
     """
     智能检测数据是否为时间戳
     
+    Args:
+        series: pandas Series
+        column_stats: 该列的统计信息（提供时直接使用其中的最小/最大值，不再扫描整列）
+    
     Returns:
         None: 不是时间戳
         '10digit': 10位秒级时间戳（无小数）
@@ -104,33 +129,191 @@ def detect_timestamp_type(series):
         return None
     
     # 检查数值范围
-    min_val = valid_values.min()
-    max_val = valid_values.max()
+    if column_stats is not None and column_stats.get('min') is not None:
+        min_val = column_stats['min']
+        max_val = column_stats['max']
+    else:
+        min_val = valid_values.min()
+        max_val = valid_values.max()
     
     # 检查是否为13位时间戳（毫秒级）
     # 合理范围：2000年到2100年，即 946684800000 到 4102444800000
     if min_val >= 946684800000 and max_val <= 4102444800000:
         # 进一步检查：大部分值应该是13位
-        sample = valid_values.head(100)
-        digit_counts = sample.apply(lambda x: len(str(int(x))))
-        if (digit_counts == 13).mean() > 0.8:
+        sample = valid_values.head(100).to_numpy(dtype=float)
+        if (count_integer_digits(sample) == 13).mean() > 0.8:
             return '13digit'
     
     # 检查是否为10位时间戳（秒级）
     # 合理范围：2000年到2100年，即 946684800 到 4102444800
     if min_val >= 946684800 and max_val <= 4102444800:
         # 进一步检查：大部分值应该是10位
-        sample = valid_values.head(100)
-        digit_counts = sample.apply(lambda x: len(str(int(x))))
-        if (digit_counts == 10).mean() > 0.8:
+        sample = valid_values.head(100).to_numpy(dtype=float)
+        if (count_integer_digits(sample) == 10).mean() > 0.8:
             # 检查是否带小数毫秒部分
-            has_decimal = sample.apply(lambda x: x != int(x)).mean() > 0.5
+            has_decimal = (sample != np.trunc(sample)).mean() > 0.5
             if has_decimal:
                 return '10digit_ms'
             return '10digit'
     
     return None
 
+# 10的1~18次幂，用于整数位数的向量化计算
+POWERS_OF_TEN = 10 ** np.arange(1, 19, dtype=np.int64)
+
+def count_integer_digits(values):
+    """向量化计算数值整数部分的位数（整数比较，不做字符串格式化）"""
+    int_values = np.abs(np.trunc(values)).astype(np.int64)
+    return np.searchsorted(POWERS_OF_TEN, int_values, side='right') + 1
+
+NUMERIC_TIMESTAMP_TYPES = ('10digit', '10digit_ms', '13digit')
+DATETIME_STRING_TYPES = ('datetime', 'datetime_ms')
+
+# 日期时间字符串的候选格式（按先精确后宽松排列）
+DATETIME_FORMAT_CANDIDATES = [
+    '%Y-%m-%d %H:%M:%S.%f', '%Y/%m/%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M',
+    '%Y-%m-%d', '%Y/%m/%d'
+]
+
+def infer_datetime_format(series):
+    """
+    从样本推断日期时间字符串列的格式
+    
+    Returns:
+        str: strptime 格式；样本中格式不统一时返回 'mixed'（逐个解析，较慢）
+    """
+    sample = series.dropna().head(100).astype(str).str.strip()
+    if len(sample) == 0:
+        return None
+    for fmt in DATETIME_FORMAT_CANDIDATES:
+        try:
+            pd.to_datetime(sample, format=fmt)
+            return fmt
+        except (ValueError, TypeError):
+            continue
+    return 'mixed'
+
+def convert_x_to_datetime(series, col_stats):
+    """
+    把时间类X列转换为 datetime：数值时间戳转北京时间，日期时间字符串按推断的格式一次向量化解析
+    
+    Returns:
+        pandas Series，datetime 类型；不是时间列时原样返回
+    """
+    ts_type = col_stats.get('ts_type') if col_stats else None
+    if ts_type in NUMERIC_TIMESTAMP_TYPES:
+        return convert_timestamp_to_beijing_time(series, ts_type)
+    if ts_type in DATETIME_STRING_TYPES and not pd.api.types.is_datetime64_any_dtype(series):
+        fmt = col_stats.get('datetime_format') or infer_datetime_format(series)
+        return pd.to_datetime(series.str.strip() if fmt != 'mixed' else series, format=fmt, errors='coerce')
+    return series
+
+def needs_datetime_conversion(series, col_stats):
+    """X列是否需要转换为 datetime（数值时间戳或日期时间字符串）"""
+    ts_type = col_stats.get('ts_type') if col_stats else None
+    if ts_type in NUMERIC_TIMESTAMP_TYPES:
+        return True
+    return ts_type in DATETIME_STRING_TYPES and not pd.api.types.is_datetime64_any_dtype(series)
+
+def get_time_x_column(df, column, col_stats, data_source=None):
+    """
+    获取时间类X列转换为 datetime 后的整列数组（每个文件每列只转换一次）
+    
+    Returns:
+        numpy.ndarray: datetime64，与原列逐行对应
+    """
+    cache_key = f"{data_source}_{column}"
+    if data_source:
+        touch_session_cache('x_time', cache_key)
+        cached = st.session_state.x_time_columns.get(cache_key)
+        if cached is not None and len(cached) == len(df):
+            return cached
+    time_values = convert_x_to_datetime(df[column], col_stats).to_numpy()
+    if data_source:
+        st.session_state.x_time_columns[cache_key] = time_values
+    return time_values
+
+def datetime_to_epoch_ms(series):
+    """
+    datetime 列转换为自1970年起的毫秒数（float64，缺失值为NaN）
+    
+    配合 type='date' 的坐标轴，以紧凑的二进制数组发送给前端，不再逐个序列化日期字符串
+    """
+    values = series.to_numpy(dtype='datetime64[ns]')
+    epoch_ms = values.astype(np.int64) / 1e6
+    epoch_ms[np.isnat(values)] = np.nan
+    return epoch_ms
+
+def get_x_plot_values(data, x_column):
+    """绘图用的X值：datetime 列转换为毫秒时间戳数组，其余列原样使用"""
+    x_series = data[x_column]
+    if pd.api.types.is_datetime64_any_dtype(x_series):
+        return datetime_to_epoch_ms(x_series)
+    return x_series
+
+FLOAT32_EXACT_LIMIT = 2 ** 23  # float32 相邻可表示值间距不超过1的上限（半个单位误差内才能保证舍入后不变）
+
+
+def compact_plot_array(series, decimal_places, col_stats=None):
+    """
+    缩小发送给前端的数值数组：按显示的小数位数判断 float32 是否足够，整数能放进 int32 时用 int32
+    
+    Plotly 把 numpy 数组序列化为 base64 类型数组，元素越窄载荷越小、序列化越快。
+    最大绝对值 × 10^小数位数 小于 2^23 时才可能用 float32；转换后再逐值校验按显示的小数位数舍入
+    与原值一致，不一致时保留 float64，悬浮框和刻度显示的数值不会因为变窄而改变。
+    
+    Args:
+        series: Y列数据
+        decimal_places: 图表显示的小数位数
+        col_stats: 该列在列统计目录中的条目，有 min/max 时不再扫描数据
+    
+    Returns:
+        紧凑的 numpy 数组；非数值列原样返回
+    """
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series
+    values = series.to_numpy()
+    if values.dtype.kind not in 'iuf' or values.dtype.itemsize <= 4 or values.size == 0:
+        return values
+    if col_stats is not None and col_stats.get('min') is not None and col_stats.get('max') is not None:
+        max_abs = max(abs(col_stats['min']), abs(col_stats['max']))
+    else:
+        with np.errstate(invalid='ignore'):
+            max_abs = np.nanmax(np.abs(values)) if not np.isnan(values).all() else 0
+    if values.dtype.kind == 'f':
+        if np.isfinite(max_abs) and max_abs * 10 ** decimal_places < FLOAT32_EXACT_LIMIT:
+            narrowed = values.astype(np.float32)
+            if np.array_equal(np.round(narrowed.astype(np.float64), decimal_places), np.round(values, decimal_places),
+                              equal_nan=True):
+                return narrowed
+    elif max_abs < 2 ** 31:
+        return values.astype(np.int32)
+    return values
+
+
+def figure_nbytes(fig):
+    """已构建图表持有的数组内存（图表缓存计入会话内存预算的依据）"""
+    return sum(value.nbytes for trace in fig.data for value in trace.to_plotly_json().values()
+               if isinstance(value, np.ndarray))
+
+
+def estimate_figure_payload_bytes(fig):
+    """估算图表发送给前端的字节数：数值数组按 base64 类型数组计算（JSON中 '/' 转义为 \\u002f），其余属性按JSON计算"""
+    total = len(json.dumps(fig.layout.to_plotly_json(), default=str))
+    for trace in fig.data:
+        for value in trace.to_plotly_json().values():
+            if isinstance(value, np.ndarray) and value.dtype.kind in 'iuf':
+                encoded = base64.b64encode(np.ascontiguousarray(value).tobytes())
+                total += len(encoded) + 5 * encoded.count(b'/')
+            elif isinstance(value, np.ndarray):
+                total += len(json.dumps(value.tolist(), default=str))
+            else:
+                total += len(json.dumps(value, default=str))
+    return total
+
+
 def convert_timestamp_to_beijing_time(series, ts_type):
     """
     将时间戳转换为北京时间 datetime
@@ -140,8 +323,10 @@ def convert_timestamp_to_beijing_time(series, ts_type):
         ts_type: '10digit', '10digit_ms' 或 '13digit'
     
     Returns:
-        pandas Series，datetime 类型（北京时间）
+        pandas Series，datetime 类型（北京时间）；已经是 datetime 类型时原样返回
     """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
     if ts_type == '13digit':
         # 毫秒级时间戳
         dt_series = pd.to_datetime(series, unit='ms', utc=True)
@@ -196,15 +381,202 @@ def get_timestamp_format(ts_type):
     
     return tickformat, hoverformat
 
+# ============ 列统计目录（加载时计算一次，各处复用） ============
+
+def to_python_scalar(value):
+    """把 numpy 标量转换为可写入 JSON 的 Python 标量，缺失值返回 None"""
+    if value is None or pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+QUANTILE_SKETCH_BLOCK_ROWS = 1000000  # 流式构建草图时每块的行数（逐块构建后合并，内存占用有界）
+QUANTILE_SKETCH_SAMPLE_SIZE = 65536  # 每块随机抽样的数值个数：块内数值不超过该数时直接精确排序
+# 草图保存的分位点：中间按 0.1% 等间隔，两端尾部按对数加密（最细到 1e-6），p0.1/p99.9 等尾部分位数更准确
+SKETCH_PROBABILITIES = np.unique(np.concatenate([
+    np.linspace(0, 1, 1001),
+    np.geomspace(1e-6, 1e-3, 31),
+    1 - np.geomspace(1e-6, 1e-3, 31)
+]))
+
+def sketch_from_sorted(sorted_values):
+    """从已排序的数值取各分位点，得到该段数据的分位数草图"""
+    positions = np.round(SKETCH_PROBABILITIES * (len(sorted_values) - 1)).astype(np.int64)
+    return {'count': len(sorted_values), 'quantiles': sorted_values[positions]}
+
+def sketch_from_block(values):
+    """
+    单块数值（已去掉缺失值）的分位数草图：数值多于 QUANTILE_SKETCH_SAMPLE_SIZE 时只排序随机抽取的样本，
+    不排序整块；样本数和最小/最大值按整块精确记录
+    """
+    if len(values) <= QUANTILE_SKETCH_SAMPLE_SIZE:
+        return sketch_from_sorted(np.sort(values))
+    rng = np.random.default_rng(len(values))  # 固定种子：同一份数据构建出的草图相同
+    sketch = sketch_from_sorted(np.sort(values[rng.integers(0, len(values), QUANTILE_SKETCH_SAMPLE_SIZE)]))
+    sketch['count'] = len(values)
+    sketch['quantiles'][0], sketch['quantiles'][-1] = values.min(), values.max()
+    return sketch
+
+def merge_quantile_sketches(sketches):
+    """
+    合并多个分位数草图（可合并：分块构建、跟随模式追加都用它）
+    
+    各草图的经验分布函数按样本数加权混合，再在混合分布上反查各分位点；
+    最小/最大值精确保留，其余分位点的误差取决于相邻分位点的间距。
+    
+    Returns:
+        dict: {'count': 样本数, 'quantiles': 分位点数组}，全部为空时返回 None
+    """
+    sketches = [sketch for sketch in sketches if sketch is not None and sketch['count'] > 0]
+    if not sketches:
+        return None
+    quantile_arrays = [np.asarray(sketch['quantiles'], dtype=np.float64) for sketch in sketches]
+    if len(sketches) == 1:
+        return {'count': int(sketches[0]['count']), 'quantiles': quantile_arrays[0]}
+    total = sum(sketch['count'] for sketch in sketches)
+    points = np.unique(np.concatenate(quantile_arrays))
+    cdf = sum(sketch['count'] * np.interp(points, quantiles, SKETCH_PROBABILITIES)
+              for sketch, quantiles in zip(sketches, quantile_arrays)) / total
+    quantiles = np.interp(SKETCH_PROBABILITIES, cdf, points)
+    quantiles[0], quantiles[-1] = points[0], points[-1]
+    return {'count': int(total), 'quantiles': quantiles}
+
+def build_quantile_sketch(series):
+    """
+    流式构建数值列的分位数草图：逐块（每块最多 QUANTILE_SKETCH_BLOCK_ROWS 行）抽样建草图再合并，
+    不排序整列，缺失值不计入
+    """
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    sketches = []
+    for start in range(0, len(values), QUANTILE_SKETCH_BLOCK_ROWS):
+        block = values[start:start + QUANTILE_SKETCH_BLOCK_ROWS]
+        sketches.append(sketch_from_block(block[~np.isnan(block)]))
+    return merge_quantile_sketches(sketches)
+
+def compute_column_sketches(df):
+    """
+    加载时为每个数值列流式构建分位数草图（直方图按百分位数截取分箱范围、百分位数汇总表使用）
+    
+    Returns:
+        dict: {列名: {'count', 'quantiles'}}，没有有效数值的列不包含在内
+    """
+    sketches = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            sketch = build_quantile_sketch(series)
+            if sketch is not None:
+                sketches[col] = sketch
+    return sketches
+
+def sketch_to_array(sketch):
+    """草图存为一个 float64 数组 [样本数, 各分位点]（写入磁盘缓存的 .npy）"""
+    return np.concatenate([[sketch['count']], sketch['quantiles']]).astype(np.float64)
+
+def sketch_from_array(values):
+    """由 sketch_to_array 的数组还原草图"""
+    return {'count': int(values[0]), 'quantiles': np.asarray(values[1:], dtype=np.float64)}
+
+def sketch_percentiles(sketch, percentiles):
+    """从分位数草图读取百分位数（percentiles 为 0~100），无需排序原始数据"""
+    return np.interp(np.asarray(percentiles, dtype=np.float64) / 100, SKETCH_PROBABILITIES, sketch['quantiles'])
+
+def compute_column_stats(df):
+    """
+    逐列计算统计信息（数值列的最小/最大值一次向量化归约得到）
+    
+    Returns:
+        dict: {列名: {'dtype', 'min', 'max', 'null_count', 'monotonic', 'first', 'last', 'ts_type', 'datetime_format'}}
+              非数值列的 min/max/first/last 为 None（分位数草图另见 compute_column_sketches）
+    """
+    numeric_cols = [col for col in df.columns
+                    if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+    if numeric_cols and len(df) > 0:
+        mins = df[numeric_cols].min()
+        maxs = df[numeric_cols].max()
+    
+    stats = {}
+    for col in df.columns:
+        series = df[col]
+        col_stats = {
+            'dtype': str(series.dtype),
+            'min': None,
+            'max': None,
+            'null_count': int(series.isna().sum()),
+            'monotonic': False,
+            'first': None,
+            'last': None
+        }
+        if col in numeric_cols and len(df) > 0:
+            col_stats['min'] = to_python_scalar(mins[col])
+            col_stats['max'] = to_python_scalar(maxs[col])
+            col_stats['monotonic'] = bool(series.is_monotonic_increasing)
+            col_stats['first'] = to_python_scalar(series.iat[0])
+            col_stats['last'] = to_python_scalar(series.iat[-1])
+        col_stats['ts_type'] = detect_timestamp_type(series, col_stats)
+        col_stats['datetime_format'] = None
+        if col_stats['ts_type'] in DATETIME_STRING_TYPES and not pd.api.types.is_datetime64_any_dtype(series):
+            col_stats['datetime_format'] = infer_datetime_format(series)
+        stats[col] = col_stats
+    return stats
+
+def merge_column_stats(stats, new_stats, df):
+    """
+    把新追加行的统计信息合并到已有统计（跟随模式增量追加时使用）
+    
+    Args:
+        stats: 已有行的统计
+        new_stats: 新追加行的统计
+        df: 追加后的完整DataFrame（用于更新列类型）
+    """
+    merged = {}
+    for col, col_stats in stats.items():
+        new_col_stats = new_stats.get(col)
+        if new_col_stats is None:
+            merged[col] = col_stats
+            continue
+        combined = dict(col_stats)
+        combined['dtype'] = str(df[col].dtype)
+        combined['null_count'] = col_stats['null_count'] + new_col_stats['null_count']
+        if new_col_stats['min'] is not None:
+            combined['min'] = new_col_stats['min'] if col_stats['min'] is None else min(col_stats['min'], new_col_stats['min'])
+            combined['max'] = new_col_stats['max'] if col_stats['max'] is None else max(col_stats['max'], new_col_stats['max'])
+        # 追加后仍单调：两段各自单调，且新段首值不小于旧段末值
+        combined['monotonic'] = (
+            col_stats['monotonic'] and new_col_stats['monotonic'] and
+            col_stats['last'] is not None and new_col_stats['first'] is not None and
+            new_col_stats['first'] >= col_stats['last']
+        )
+        if new_col_stats['last'] is not None:
+            combined['last'] = new_col_stats['last']
+        if combined['ts_type'] is None:
+            combined['ts_type'] = new_col_stats['ts_type']
+            combined['datetime_format'] = new_col_stats['datetime_format']
+        merged[col] = combined
+    return merged
+
+def get_column_stats(data_source, column):
+    """读取数据源某一列的统计信息，没有时返回 None"""
+    file_info = st.session_state.files_data.get(data_source) if data_source else None
+    if not file_info or not file_info.get('column_stats'):
+        return None
+    return file_info['column_stats'].get(column)
+
 # ============ 大文件阈值配置 ============
 LARGE_FILE_THRESHOLD = 500000  # 超过50万行视为大文件
 DOWNSAMPLE_TARGET_POINTS = 10000  # 降采样目标点数
+FOLLOW_POLL_INTERVAL = 2  # 跟随模式轮询间隔（秒）
+MAX_INGEST_WORKERS = 4  # 并行加载文件的最大线程数
+DEFAULT_SESSION_MEMORY_BUDGET_MB = 2048  # 每个会话默认的内存预算
+OBJECT_NBYTES_SAMPLE_SIZE = 1000  # 估算 object 列内存时抽样的行数
+CHARTS_PER_PAGE_OPTIONS = [5, 10, 20, 50]  # 图表列表每页显示的图表数
+DEFAULT_WEBGL_LINE_THRESHOLD = 100000  # 折线图总点数超过此值时改用WebGL渲染
+DENSITY_PIXEL_SIZE = 2  # 密度图每个网格单元对应的屏幕像素边长
 
 # 初始化session state
 if 'charts' not in st.session_state:
     st.session_state.charts = []
 if 'files_data' not in st.session_state:
-    st.session_state.files_data = {}  # {filename: {'data': DataFrame, 'list_columns_info': dict, 'is_large': bool, 'downsampled': DataFrame}}
+    st.session_state.files_data = {}  # {filename: {'data': DataFrame, 'list_columns_info': dict, 'is_large': bool, ...}}
 if 'edit_mode' not in st.session_state:
     st.session_state.edit_mode = {}  # 记录每个图表是否处于编辑模式
 if 'confirm_clear' not in st.session_state:
@@ -213,6 +585,16 @@ if 'expanded_list_columns' not in st.session_state:
     st.session_state.expanded_list_columns = {}  # 缓存已展开的列表列数据
 if 'parsed_list_columns' not in st.session_state:
     st.session_state.parsed_list_columns = {} # 缓存已解析的列表列
+if 'figure_cache' not in st.session_state:
+    st.session_state.figure_cache = OrderedDict()  # 已构建图表的LRU缓存 {缓存键: {'fig', 'config', 'num_points', 'nbytes', 'data_source', ...}}
+if 'x_time_columns' not in st.session_state:
+    st.session_state.x_time_columns = {}  # 缓存转换为北京时间的时间戳X列 {f"{文件}_{列}": datetime64数组}
+if 'histogram_values' not in st.session_state:
+    st.session_state.histogram_values = {}  # 缓存直方图用的升序数值 {f"{文件}_{数据选择}_{列}": float64数组}
+if 'time_buckets' not in st.session_state:
+    st.session_state.time_buckets = {}  # 缓存时间桶聚合结果 {f"{文件}_{X列}_{间隔毫秒}": {'num_rows', 'bucket_ms', 'first_row', 'columns'}}
+if 'x_range_indices' not in st.session_state:
+    st.session_state.x_range_indices = {}  # 缓存数值X列的有序索引 {f"{文件}_{列}": {'monotonic', 'order', 'sorted_values'}}
 if 'chart_range_mode' not in st.session_state:
     st.session_state.chart_range_mode = {}  # 记录每个图表的显示模式：'downsampled' 或 'original'
 if 'chart_range_selection' not in st.session_state:
@@ -225,11 +607,25 @@ if 'downsample_ratio' not in st.session_state:
     st.session_state.downsample_ratio = 100  # 默认降采样倍数
 if 'histogram_bins' not in st.session_state:
     st.session_state.histogram_bins = {}  # 记录每个直方图的bin数量
+if 'density_windows' not in st.session_state:
+    st.session_state.density_windows = {}  # 记录每个密度图框选的视窗 {图表索引: {'x': (起, 止), 'y': (起, 止), 'yref': Y轴名}}
+if 'density_last_box' not in st.session_state:
+    st.session_state.density_last_box = {}  # 记录每个密度图最近处理过的框选，避免重置视窗后旧框选再次生效
+if 'cache_last_used' not in st.session_state:
+    st.session_state.cache_last_used = {}  # {(缓存类型, 键): 最近使用时间}，会话内存预算的LRU依据
+if 'memory_budget_mb' not in st.session_state:
+    st.session_state.memory_budget_mb = DEFAULT_SESSION_MEMORY_BUDGET_MB  # 会话内存预算（MB）
+if 'webgl_line_threshold' not in st.session_state:
+    st.session_state.webgl_line_threshold = DEFAULT_WEBGL_LINE_THRESHOLD  # 折线图切换为WebGL（Scattergl）的点数阈值
+if 'chart_page' not in st.session_state:
+    st.session_state.chart_page = 0  # 图表列表当前页（从0开始），不在当前页的图表不准备数据也不发送图表
+if 'charts_per_page' not in st.session_state:
+    st.session_state.charts_per_page = 10  # 图表列表每页显示的图表数
 
 # Fragment 函数：原始数据模式的范围选择输入控件
 # 使用 @st.fragment 使输入变化时只刷新输入部分，不影响图表
 @st.fragment
-def render_range_input_controls(idx: int, total_rows: int, downsampled_rows: int, x_col: str, original_data):
+def render_range_input_controls(idx: int, total_rows: int, downsampled_rows: int, x_col: str, original_data, data_source=None):
     """渲染范围选择输入控件（三向联动）- 作为 fragment，修改时不触发整个页面刷新"""
     """渲染范围选择输入控件（三向联动）"""
     
@@ -238,24 +634,19 @@ def render_range_input_controls(idx: int, total_rows: int, downsampled_rows: int
         # 获取当前范围（原始数据行号）
         current_range = st.session_state.chart_range_selection.get(idx)
         if current_range:
-            is_numeric_x = pd.api.types.is_numeric_dtype(original_data[x_col])
-            if is_numeric_x:
-                # 数值型X轴，current_range是X轴值，需要转换为行号
-                x_min = float(original_data[x_col].min())
-                x_max = float(original_data[x_col].max())
-                x_range = x_max - x_min
-                if x_range > 0:
-                    default_start_pct = ((float(current_range[0]) - x_min) / x_range * 100)
-                    default_end_pct = ((float(current_range[1]) - x_min) / x_range * 100)
-                    default_start_row = int(default_start_pct / 100 * total_rows)
-                    default_end_row = int(default_end_pct / 100 * total_rows)
+            if is_monotonic_numeric_x(original_data, x_col, data_source):
+                # 单调数值X轴，current_range是X轴值，在有序索引上二分定位行号
+                rows = x_range_to_rows(get_x_range_index(original_data, x_col, data_source), current_range[0], current_range[1])
+                if rows.stop > rows.start:
+                    default_start_row = rows.start
+                    default_end_row = rows.stop - 1
                 else:
-                    default_start_pct = 40.0
-                    default_end_pct = 60.0
                     default_start_row = int(total_rows * 0.4)
                     default_end_row = int(total_rows * 0.6)
+                default_start_pct = (default_start_row / total_rows * 100) if total_rows > 0 else 40.0
+                default_end_pct = (default_end_row / total_rows * 100) if total_rows > 0 else 60.0
             else:
-                # 非数值型X轴，current_range就是行号
+                # 其他X轴，current_range就是行号
                 default_start_row = int(current_range[0])
                 default_end_row = int(current_range[1])
                 default_start_pct = (default_start_row / total_rows * 100) if total_rows > 0 else 40.0
@@ -411,8 +802,12 @@ def render_range_input_controls(idx: int, total_rows: int, downsampled_rows: int
         has_error = True
     
     if not has_error:
-        # 更新chart_range_selection
-        st.session_state.chart_range_selection[idx] = (current_row_start, current_row_end)
+        # 更新chart_range_selection：单调数值X轴保存对应的X值（文件追加后范围仍然有效），否则保存行号
+        if is_monotonic_numeric_x(original_data, x_col, data_source):
+            x_values = original_data[x_col]
+            st.session_state.chart_range_selection[idx] = (x_values.iat[current_row_start], x_values.iat[current_row_end])
+        else:
+            st.session_state.chart_range_selection[idx] = (current_row_start, current_row_end)
         
         # 计算并显示范围内的数据量
         range_data_count = current_row_end - current_row_start + 1
@@ -460,9 +855,9 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
             old_columns = set()
             new_columns = set()
             if old_data_source and old_data_source in st.session_state.files_data:
-                old_columns = set(st.session_state.files_data[old_data_source]['data'].columns.tolist())
+                old_columns = set(get_file_info(old_data_source)['data'].columns.tolist())
             if new_data_source and new_data_source in st.session_state.files_data:
-                new_data = st.session_state.files_data[new_data_source]['data']
+                new_data = get_file_info(new_data_source)['data']
                 new_columns = set(new_data.columns.tolist())
             
             # 更新数据源
@@ -518,7 +913,7 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
         st.error(f"❌ 数据文件 '{data_source}' 不存在！")
         return
     
-    file_info = st.session_state.files_data[data_source]
+    file_info = get_file_info(data_source)
     data = file_info['data']
     list_columns_info = file_info['list_columns_info']
     is_large_file = file_info.get('is_large', False)
@@ -592,7 +987,7 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
     # 首先选择图表类型（放在最前面，因为后续选项依赖于此）
     st.markdown("---")
     st.markdown("### 📈 图表类型")
-    chart_types = ['折线图', '散点图', '直方图']
+    chart_types = ['折线图', '散点图', '直方图', '密度图', '通道分布图']
     current_type = chart_config['chart_type']
     if current_type not in chart_types:
         current_type = '折线图'
@@ -604,7 +999,7 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
     )
     
     # 重叠模式开关（仅折线图和散点图显示）
-    if new_chart_type != '直方图':
+    if new_chart_type in ('折线图', '散点图'):
         st.markdown("---")
         st.markdown("### 🎨 绘图模式")
         overlay_mode = st.checkbox(
@@ -629,12 +1024,21 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
             )
         else:
             axis_placement = 'alternate'
+        
+        # 降采样预览的包络显示：只保留部分点时看不到每段内的峰峰值
+        downsample_envelope = st.checkbox(
+            "📉 降采样预览显示最小/最大值包络",
+            value=chart_config.get('downsample_envelope', False),
+            key=f"downsample_envelope_{idx}",
+            help="降采样预览时把数据按行均分成与降采样点数相同的块，画出每块的均值曲线，并用同色半透明带显示块内的最小值~最大值，点数不变但不会漏掉尖峰"
+        )
     else:
-        # 直方图模式下不使用重叠模式
+        # 直方图和密度图模式下不使用重叠模式
         overlay_mode = False
         axis_placement = 'alternate'
-        
-        # 直方图特有设置
+    
+    if new_chart_type in ('直方图', '通道分布图'):
+        # 直方图特有设置（通道分布图同样按分箱计数）
         st.markdown("---")
         st.markdown("### 📊 直方图设置")
         
@@ -660,6 +1064,49 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
             key=f"hist_normalize_{idx}",
             help="勾选后显示概率密度而非频数"
         )
+        
+        if new_chart_type == '直方图':
+            # 分箱范围：按百分位数截去两端的离群值
+            range_labels = list(HIST_RANGE_OPTIONS.keys())
+            current_range = chart_config.get('hist_range_percentiles')
+            range_label = st.selectbox(
+                "分箱范围",
+                options=range_labels,
+                index=list(HIST_RANGE_OPTIONS.values()).index(current_range) if current_range in HIST_RANGE_OPTIONS.values() else 0,
+                key=f"hist_range_{idx}",
+                help="个别离群值会把整个分布压缩到少数几个分箱里；按百分位数截取时范围外的样本不计入直方图"
+            )
+            hist_range_percentiles = HIST_RANGE_OPTIONS[range_label]
+        else:
+            hist_range_percentiles = chart_config.get('hist_range_percentiles')
+            # 共享分箱便于比较各通道的取值，按通道分箱便于看清每个通道自身的分布形状
+            bin_modes = list(CHANNEL_BIN_MODES.keys())
+            channel_bin_mode = st.radio(
+                "分箱方式",
+                options=bin_modes,
+                format_func=lambda mode: CHANNEL_BIN_MODES[mode],
+                index=bin_modes.index(chart_config.get('channel_bin_mode', 'shared')),
+                key=f"channel_bin_mode_{idx}",
+                horizontal=True,
+                help="共用分箱：所有通道使用相同的数值范围，便于横向比较；单独分箱：每个通道按自身的最小值~最大值分箱，量纲不同的通道也能看清分布形状"
+            )
+    elif new_chart_type == '密度图':
+        # 密度图特有设置
+        st.markdown("---")
+        st.markdown("### 🌌 密度图设置")
+        density_log_color = st.checkbox(
+            "对数色阶",
+            value=chart_config.get('density_log_color', True),
+            key=f"density_log_color_{idx}",
+            help="点数在网格间相差几个数量级时，对数色阶能同时看清稀疏区域和密集区域"
+        )
+    
+    if new_chart_type != '密度图':
+        density_log_color = chart_config.get('density_log_color', True)
+    if new_chart_type != '通道分布图':
+        channel_bin_mode = chart_config.get('channel_bin_mode', 'shared')
+    if new_chart_type not in ('折线图', '散点图'):
+        downsample_envelope = chart_config.get('downsample_envelope', False)
     
     st.markdown("---")
     
@@ -674,12 +1121,17 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
         )
         
         # 非直方图模式才设置直方图默认值
-        if new_chart_type != '直方图':
+        if new_chart_type not in ('直方图', '通道分布图'):
             histogram_bins = chart_config.get('histogram_bins', 50)
             hist_normalize = chart_config.get('hist_normalize', False)
+            hist_range_percentiles = chart_config.get('hist_range_percentiles')
         
-        # 直方图模式下不需要选择X轴
-        if new_chart_type != '直方图':
+        # 时间重采样默认关闭（仅时间X列的折线图和散点图可选）
+        time_resample_interval = None
+        time_resample_agg = chart_config.get('time_resample_agg', 'mean')
+        
+        # 直方图和通道分布图模式下不需要选择X轴
+        if new_chart_type not in ('直方图', '通道分布图'):
             # 使用索引作为X轴的选项
             use_index_as_x = st.checkbox(
                 "使用索引作为X轴 (0, 1, 2, ...)",
@@ -696,13 +1148,40 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
                     index=columns.index(chart_config['x_column']) if chart_config['x_column'] in columns else 0,
                     key=f"x_{idx}"
                 )
-                # 按X轴排序选项
-                sort_by_x = st.checkbox(
-                    "按X轴排序",
-                    value=chart_config.get('sort_by_x', False),
-                    key=f"sort_by_x_{idx}",
-                    help="勾选后将按X轴值升序排列数据"
-                )
+                # 按X轴排序选项（密度图按网格计数，与点的顺序无关）
+                if new_chart_type != '密度图':
+                    sort_by_x = st.checkbox(
+                        "按X轴排序",
+                        value=chart_config.get('sort_by_x', False),
+                        key=f"sort_by_x_{idx}",
+                        help="勾选后将按X轴值升序排列数据"
+                    )
+                else:
+                    sort_by_x = False
+                
+                # 时间X列：折线图和散点图可按固定时间间隔聚合（代替降采样）
+                if new_chart_type in ('折线图', '散点图') and is_time_x_column(data_source, new_x_column):
+                    interval_labels = list(TIME_RESAMPLE_INTERVALS.keys())
+                    interval_values = list(TIME_RESAMPLE_INTERVALS.values())
+                    current_interval = chart_config.get('time_resample_interval')
+                    interval_label = st.selectbox(
+                        "⏱️ 时间重采样",
+                        interval_labels,
+                        index=interval_values.index(current_interval) if current_interval in interval_values else 0,
+                        key=f"time_resample_{idx}",
+                        help="按固定时间间隔聚合每个特征，代替降采样；聚合结果按（文件、列、间隔）缓存，切换到用过的间隔时即时生效"
+                    )
+                    time_resample_interval = TIME_RESAMPLE_INTERVALS[interval_label]
+                    if time_resample_interval:
+                        agg_options = list(TIME_RESAMPLE_AGGS.keys())
+                        time_resample_agg = st.selectbox(
+                            "聚合方式",
+                            agg_options,
+                            format_func=lambda agg: TIME_RESAMPLE_AGGS[agg],
+                            index=agg_options.index(chart_config.get('time_resample_agg', 'mean')),
+                            key=f"time_resample_agg_{idx}",
+                            help="均值 + 最小/最大值带：画出每个时间桶的均值曲线，并用同色半透明带显示桶内的最小值~最大值"
+                        )
             else:
                 # 使用索引时，x_column保持默认值但不影响绘图
                 new_x_column = chart_config.get('x_column', columns[0] if columns else '')
@@ -727,6 +1206,36 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
             )
             # 直方图模式下Y2为空
             y2_selections = {'normal': [], 'list_columns': {}}
+        elif new_chart_type == '通道分布图':
+            # 通道分布图模式：选择一个列表列，统计其全部通道（绘图时直接使用解析缓存，不展开通道）
+            if list_columns_info:
+                list_column_names = list(list_columns_info.keys())
+                current_list_col = (chart_config.get('y1_selected_columns') or [None])[0]
+                channel_list_col = st.selectbox(
+                    "📊 选择列表列（统计全部通道）",
+                    list_column_names,
+                    index=list_column_names.index(current_list_col) if current_list_col in list_column_names else 0,
+                    key=f"channel_list_col_{idx}"
+                )
+                st.caption(f"共 {list_columns_info[channel_list_col]['num_channels']} 个通道")
+                y1_selections = {'normal': [channel_list_col], 'list_columns': {}}
+            else:
+                st.warning("⚠️ 当前数据源没有列表列，通道分布图需要列表列")
+                y1_selections = {'normal': [], 'list_columns': {}}
+            y2_selections = {'normal': [], 'list_columns': {}}
+        elif new_chart_type == '密度图':
+            # 密度图模式：每个特征单独画一行密度图，共享X轴
+            y1_default = chart_config.get('y1_selected_columns', [])
+            y1_selections = render_column_selector_v2(
+                "Y轴特征（每个特征一行密度图）",
+                columns,
+                y1_default,
+                f"y1_{idx}",
+                list_columns_info,
+                data
+            )
+            # 密度图模式下Y2为空
+            y2_selections = {'normal': [], 'list_columns': {}}
         elif overlay_mode:
             # 重叠模式：不区分Y1/Y2，统一选择
             y1_default = chart_config.get('y1_selected_columns', [])
@@ -780,8 +1289,8 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
             key=f"decimal_{idx}"
         )
         
-        # 普通模式下显示Y2轴选择器（直方图和重叠模式下不显示）
-        if not overlay_mode and new_chart_type != '直方图':
+        # 普通模式下显示Y2轴选择器（直方图、密度图、通道分布图和重叠模式下不显示）
+        if not overlay_mode and new_chart_type not in ('直方图', '密度图', '通道分布图'):
             y2_default = chart_config.get('y2_selected_columns', [])
             y2_selections = render_column_selector_v2(
                 "Y2轴 (右侧纵坐标)",
@@ -845,6 +1354,12 @@ def render_chart_properties_fragment(idx: int, chart_config: dict):
                 'axis_placement': axis_placement,  # 保存轴排布策略
                 'histogram_bins': histogram_bins,  # 保存直方图分箱数
                 'hist_normalize': hist_normalize,  # 保存直方图归一化设置
+                'hist_range_percentiles': hist_range_percentiles,  # 保存直方图分箱范围（百分位数，None为全部数据）
+                'density_log_color': density_log_color,  # 保存密度图是否使用对数色阶
+                'channel_bin_mode': channel_bin_mode,  # 保存通道分布图的分箱方式（'shared' 或 'per_channel'）
+                'time_resample_interval': time_resample_interval,  # 保存时间重采样间隔（毫秒，None为不重采样）
+                'time_resample_agg': time_resample_agg,  # 保存时间重采样的聚合方式
+                'downsample_envelope': downsample_envelope,  # 保存降采样预览是否显示最小/最大值包络
                 'is_configured': True
             })
             st.success("✅ 配置已更新！")
@@ -938,7 +1453,7 @@ def lttb_downsample(data, x_col, y_cols, threshold):
         降采样后的DataFrame
     """
     if len(data) <= threshold:
-        return data.copy()
+        return data
     
     # 检查X轴是否为数值类型
     if x_col not in data.columns:
@@ -949,7 +1464,7 @@ def lttb_downsample(data, x_col, y_cols, threshold):
         return simple_downsample(data, threshold)
     
     # 对每个y列分别进行LTTB降采样，然后合并索引
-    all_indices = set()
+    all_indices = []
     
     for y_col in y_cols:
         if y_col not in data.columns:
@@ -962,7 +1477,7 @@ def lttb_downsample(data, x_col, y_cols, threshold):
         # 提取x和y数据，移除NaN
         temp_df = data[[x_col, y_col]].dropna()
         if len(temp_df) <= threshold:
-            all_indices.update(temp_df.index)
+            all_indices.append(temp_df.index.to_numpy())
             continue
         
         # 确保数据是数值类型
@@ -1031,18 +1546,17 @@ def lttb_downsample(data, x_col, y_cols, threshold):
             sampled_indices.append(len(temp_df) - 1)
             
             # 将局部索引转换为原始DataFrame索引
-            original_indices = temp_df.iloc[sampled_indices].index
-            all_indices.update(original_indices)
+            all_indices.append(temp_df.index.to_numpy()[np.asarray(sampled_indices)])
         except Exception as e:
             # LTTB算法失败，使用该列的所有索引
-            all_indices.update(temp_df.index)
+            all_indices.append(temp_df.index.to_numpy())
     
     # 合并所有y列的采样点，去重并排序
     if len(all_indices) == 0:
         # 如果LTTB没有采样到任何点，回退到简单降采样
         return simple_downsample(data, threshold)
     
-    selected_indices = sorted(list(all_indices))
+    selected_indices = np.unique(np.concatenate(all_indices))
     
     # 如果采样点太少，补充一些点
     if len(selected_indices) < threshold // 2:
@@ -1064,15 +1578,22 @@ def simple_downsample(data, threshold):
     if len(data) <= threshold:
         return data.copy()
     
+    return data.iloc[simple_downsample_positions(len(data), threshold)].reset_index(drop=True)
+
+def simple_downsample_positions(num_rows, threshold):
+    """均匀降采样选中的行号（包含最后一行）"""
+    if num_rows <= threshold:
+        return np.arange(num_rows)
+    
     # 均匀采样
-    step = len(data) // threshold
-    indices = list(range(0, len(data), step))
+    step = num_rows // threshold
+    indices = np.arange(0, num_rows, step)
     
     # 确保包含最后一个点
-    if indices[-1] != len(data) - 1:
-        indices.append(len(data) - 1)
+    if indices[-1] != num_rows - 1:
+        indices = np.append(indices, num_rows - 1)
     
-    return data.iloc[indices].reset_index(drop=True)
+    return indices
 
 def parse_list_string(s):
     """尝试将字符串解析为列表"""
@@ -1118,6 +1639,104 @@ def detect_list_columns(df):
     
     return list_columns_info
 
+def parse_list_column_to_array(values, min_length=0):
+    """
+    将列表字符串列解析为二维 NumPy 数组（行 × 通道），缺失位置填充 NaN
+    
+    Args:
+        values: pandas Series，列表字符串数据
+        min_length: 最少通道数（追加数据时保持与已有缓存的宽度一致）
+    
+    Returns:
+        np.ndarray，形状为 (len(values), 通道数)
+    """
+    # 1. 向量化解析字符串
+    # 使用 apply 比 for 循环略快，并能更好地处理 Series
+    def parse_row(val):
+        if isinstance(val, str):
+            val = val.strip()
+            if val.startswith('[') and val.endswith(']'):
+                try:
+                    # 使用更快的ujson（如果安装了），否则回退到ast
+                    return ast.literal_eval(val)
+                except (ValueError, SyntaxError):
+                    return None
+        return None
+
+    # parsed_values is now a Series of lists or None
+    parsed_values = values.reset_index(drop=True).apply(parse_row)
+
+    # 2. 转换为高效的 NumPy 数组
+    # 计算最大长度
+    max_length = parsed_values.dropna().apply(len).max()
+    if pd.isna(max_length):
+        max_length = 0
+    max_length = max(int(max_length), min_length)
+    
+    num_rows = len(parsed_values)
+    parsed_data_np = np.full((num_rows, max_length), np.nan, dtype=float)
+
+    # 过滤掉None值以加速填充
+    valid_rows = parsed_values.dropna()
+
+    # 填充 NumPy 数组
+    for i, row_list in valid_rows.items():
+        if isinstance(row_list, list):
+            len_row = len(row_list)
+            try:
+                # 尝试直接转换，如果失败则逐个元素转换
+                parsed_data_np[i, :len_row] = row_list
+            except ValueError: # Happens if list contains non-numeric strings
+                for j, item in enumerate(row_list):
+                    if j < max_length:
+                        try:
+                            parsed_data_np[i, j] = float(item)
+                        except (ValueError, TypeError):
+                            pass # Keep as NaN
+    
+    return parsed_data_np
+
+def get_parsed_list_array(df, col_name, data_source=None):
+    """
+    获取列表列解析后的二维数组（行 × 通道），第一次使用时解析整列并缓存
+    
+    依次查找会话缓存、跨会话共享数组，都没有时解析并写入磁盘缓存和共享注册表。
+    
+    Args:
+        df: DataFrame
+        col_name: 列表列名
+        data_source: 数据源文件名（用于区分不同文件中的同名列）
+    """
+    # 生成缓存键（包含数据源以区分不同文件）
+    cache_key = f"{data_source}_{col_name}" if data_source else col_name
+    
+    # 其他会话已解析过同一文件的该列：直接引用共享数组
+    file_info = st.session_state.files_data.get(data_source, {})
+    if cache_key not in st.session_state.parsed_list_columns and file_info.get('shared'):
+        shared_array = get_shared_list_array(file_info['content_key'], col_name)
+        if shared_array is not None:
+            st.session_state.parsed_list_columns[cache_key] = shared_array
+    
+    # 检查是否已解析并缓存为numpy数组
+    touch_session_cache('parsed', cache_key)
+    if cache_key in st.session_state.parsed_list_columns:
+        return st.session_state.parsed_list_columns[cache_key]
+    
+    # --- 昂贵的解析步骤，仅在首次需要时执行 ---
+    with st.spinner(f"⏳ 正在首次解析列表列 '{col_name}'... 这可能需要一些时间，请稍候。"):
+        parsed_data_np = parse_list_column_to_array(df[col_name])
+
+        # 存入 session state 缓存
+        st.session_state.parsed_list_columns[cache_key] = parsed_data_np
+        
+        # 同时写入磁盘缓存和跨会话注册表，下次打开同一文件时无需重新解析
+        if file_info.get('cache_key'):
+            save_list_array_to_disk_cache(file_info['cache_key'], col_name, parsed_data_np)
+        if file_info.get('shared'):
+            publish_shared_list_array(file_info['content_key'], col_name, parsed_data_np)
+    st.success(f"✅ 列表列 '{col_name}' 解析完成并已缓存！")
+    return parsed_data_np
+
 def expand_list_column_lazy(df, col_name, channel_indices=None, data_source=None):
     """
     按需展开列表列（高效缓存版本）
@@ -1132,63 +1751,8 @@ def expand_list_column_lazy(df, col_name, channel_indices=None, data_source=None
     if col_name not in df.columns:
         return pd.DataFrame()
 
-    # 生成缓存键（包含数据源以区分不同文件）
-    cache_key = f"{data_source}_{col_name}" if data_source else col_name
-    
-    # 检查是否已解析并缓存为numpy数组
-    if cache_key in st.session_state.parsed_list_columns:
-        parsed_data_np = st.session_state.parsed_list_columns[cache_key]
-        max_length = parsed_data_np.shape[1]
-    else:
-        # --- 昂贵的解析步骤，仅在首次需要时执行 ---
-        with st.spinner(f"⏳ 正在首次解析列表列 '{col_name}'... 这可能需要一些时间，请稍候。"):
-            
-            # 1. 向量化解析字符串
-            # 使用 apply 比 for 循环略快，并能更好地处理 Series
-            def parse_row(val):
-                if isinstance(val, str):
-                    val = val.strip()
-                    if val.startswith('[') and val.endswith(']'):
-                        try:
-                            # 使用更快的ujson（如果安装了），否则回退到ast
-                            return ast.literal_eval(val)
-                        except (ValueError, SyntaxError):
-                            return None
-                return None
-
-            # parsed_values is now a Series of lists or None
-            parsed_values = df[col_name].apply(parse_row)
-
-            # 2. 转换为高效的 NumPy 数组
-            # 计算最大长度
-            max_length = parsed_values.dropna().apply(len).max()
-            if pd.isna(max_length):
-                max_length = 0
-            
-            num_rows = len(df)
-            parsed_data_np = np.full((num_rows, int(max_length)), np.nan, dtype=float)
-
-            # 过滤掉None值以加速填充
-            valid_rows = parsed_values.dropna()
-
-            # 填充 NumPy 数组
-            for i, row_list in valid_rows.items():
-                if isinstance(row_list, list):
-                    len_row = len(row_list)
-                    try:
-                        # 尝试直接转换，如果失败则逐个元素转换
-                        parsed_data_np[i, :len_row] = row_list
-                    except ValueError: # Happens if list contains non-numeric strings
-                        for j, item in enumerate(row_list):
-                            if j < max_length:
-                                try:
-                                    parsed_data_np[i, j] = float(item)
-                                except (ValueError, TypeError):
-                                    pass # Keep as NaN
-
-            # 存入 session state 缓存
-            st.session_state.parsed_list_columns[cache_key] = parsed_data_np
-        st.success(f"✅ 列表列 '{col_name}' 解析完成并已缓存！")
+    parsed_data_np = get_parsed_list_array(df, col_name, data_source)
+    max_length = parsed_data_np.shape[1]
 
     # --- 从缓存中快速提取数据 ---
     if channel_indices is None:
@@ -1236,74 +1800,1181 @@ def clear_chart_states(chart_idx, preserve_column_selections=False):
         if key in st.session_state:
             del st.session_state[key]
 
-def load_data(uploaded_file, downsample_ratio=100):
-    """加载CSV或Excel文件（不立即展开列表列）"""
+# ============ 压缩文件流式解压 ============
+
+CSV_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig', 'latin-1']
+CSV_CHUNK_ROWS = 200000  # 分块解析CSV时每块的行数
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.zst', '.zip')
+
+class ThroughputReader(io.RawIOBase):
+    """包装解压流，统计解压输出字节数和花在读取/解压上的时间"""
+    
+    mode = 'rb'
+    
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        data = self.stream.read(len(buffer))
+        self.read_seconds += time.perf_counter() - start
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        return n
+
+def open_decompressed_stream(fileobj, filename):
+    """
+    根据文件扩展名打开流式解压器（不在内存中生成完整的解压副本）
+    
+    Returns:
+        tuple: (解压后的二进制流, 内部文件名)
+    """
+    fileobj.seek(0)
+    name = filename.lower()
+    if name.endswith('.gz'):
+        return gzip.GzipFile(fileobj=fileobj, mode='rb'), filename[:-3]
+    if name.endswith('.bz2'):
+        return bz2.BZ2File(fileobj, mode='rb'), filename[:-4]
+    if name.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("读取 .zst 文件需要安装 zstandard：pip install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj), filename[:-4]
+    if name.endswith('.zip'):
+        archive = zipfile.ZipFile(fileobj)
+        members = [m for m in archive.namelist() if m.lower().endswith('.csv') and not m.endswith('/')]
+        if not members:
+            raise ValueError("压缩包中没有CSV文件")
+        return archive.open(members[0]), members[0]
+    return fileobj, filename
+
+def read_csv_stream(uploaded_file, filename):
+    """
+    流式读取（可能压缩的）CSV：边解压边分块解析，依次尝试多种编码
+    
+    Returns:
+        tuple: (DataFrame 或 None, 吞吐统计dict)
+    """
+    for encoding in CSV_ENCODINGS:
+        stream, inner_name = open_decompressed_stream(uploaded_file, filename)
+        reader = ThroughputReader(stream)
+        start = time.perf_counter()
+        try:
+            chunks = pd.read_csv(io.BufferedReader(reader, buffer_size=1 << 20), encoding=encoding, chunksize=CSV_CHUNK_ROWS)
+            df = pd.concat(chunks, ignore_index=True)
+        except UnicodeDecodeError:
+            continue
+        total_seconds = time.perf_counter() - start
+        stats = {
+            'inner_name': inner_name,
+            'compressed': filename.lower().endswith(COMPRESSED_SUFFIXES),
+            'input_bytes': getattr(uploaded_file, 'size', None) or uploaded_file.seek(0, io.SEEK_END),
+            'output_bytes': reader.bytes_read,
+            'decompress_seconds': reader.read_seconds,
+            'parse_seconds': max(total_seconds - reader.read_seconds, 0.0),
+            'total_seconds': total_seconds
+        }
+        return df, stats
+    return None, None
+
+def format_ingest_stats(stats):
+    """格式化读取吞吐信息，用于判断瓶颈在解压还是解析"""
+    if stats.get('from_cache'):
+        return f"⚡ 从磁盘缓存加载，用时 {stats['cache_seconds']:.2f}s"
+    mb_out = stats['output_bytes'] / 1e6
+    parse_rate = mb_out / stats['parse_seconds'] if stats['parse_seconds'] > 0 else float('inf')
+    text = f"⏱️ 解析 {mb_out:,.1f} MB 用时 {stats['parse_seconds']:.2f}s（{parse_rate:,.1f} MB/s）"
+    if stats['compressed']:
+        mb_in = stats['input_bytes'] / 1e6
+        decompress_rate = mb_out / stats['decompress_seconds'] if stats['decompress_seconds'] > 0 else float('inf')
+        text = (f"🗜️ {mb_in:,.1f} MB → {mb_out:,.1f} MB，解压用时 {stats['decompress_seconds']:.2f}s"
+                f"（{decompress_rate:,.1f} MB/s）；" + text)
+    return text
+
+# ============ 磁盘列式缓存（按内容指纹，重复打开同一文件时秒级加载） ============
+
+DISK_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data_cache')
+DISK_CACHE_MAX_BYTES = 5 * 1024 ** 3  # 磁盘缓存上限，超过后按最近最少使用淘汰
+DISK_CACHE_VERSION = 4  # 缓存格式版本，格式变化时递增使旧缓存失效
+
+def fingerprint_upload(uploaded_file):
+    """
+    计算上传内容的指纹：对整个文件做 blake2b 哈希（直接哈希内存视图，不复制）
+    
+    磁盘缓存和跨会话共享都以指纹为键，必须覆盖全部内容，大小不变的局部修改也会得到不同的指纹；
+    哈希速度远快于解析，几百MB的文件也不到一秒。
+    """
+    buffer = uploaded_file.getbuffer()
     try:
-        if uploaded_file.name.endswith('.csv'):
-            # 尝试多种编码读取CSV
-            df = None
-            encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig', 'latin-1']
-            for encoding in encodings:
-                try:
-                    uploaded_file.seek(0)  # 重置文件指针
-                    df = pd.read_csv(uploaded_file, encoding=encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            if df is None:
-                st.error("无法识别文件编码，请检查文件格式")
-                return None, None, False, None
-        elif uploaded_file.name.endswith('.xlsx'):
-            df = pd.read_excel(uploaded_file, engine='openpyxl')
-        elif uploaded_file.name.endswith('.xls'):
-            df = pd.read_excel(uploaded_file, engine='xlrd')
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(f"v{DISK_CACHE_VERSION}:{len(buffer)}".encode())
+        hasher.update(buffer)
+        return hasher.hexdigest()
+    finally:
+        buffer.release()
+
+def save_to_disk_cache(cache_key, entry):
+    """
+    将解析结果写入磁盘缓存：数值列存为 .npy（可内存映射），其余列用 pickle
+    
+    先写入临时目录再重命名，避免并发写入时读到半成品。
+    """
+    df = entry['data']
+    final_dir = os.path.join(DISK_CACHE_DIR, cache_key)
+    if os.path.isdir(final_dir):
+        return
+    tmp_dir = f"{final_dir}.tmp{os.getpid()}_{threading.get_ident()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+            np.save(os.path.join(tmp_dir, f"col_{i}.npy"), series.to_numpy())
+            columns.append({'name': col, 'file': f"col_{i}.npy"})
         else:
-            st.error("不支持的文件格式，请上传CSV或Excel文件")
-            return None, None, False, None
-        
-        # 只检测列表列，不展开
-        list_columns_info = detect_list_columns(df)
+            series.reset_index(drop=True).to_pickle(os.path.join(tmp_dir, f"col_{i}.pkl"))
+            columns.append({'name': col, 'file': f"col_{i}.pkl"})
+    
+    manifest = {
+        'columns': columns,
+        'num_rows': len(df),
+        'list_columns_info': entry['list_columns_info'],
+        'column_stats': entry.get('column_stats'),
+        'list_arrays': {},
+        'sketches': {},
+        'ingest_stats': entry.get('ingest_stats')
+    }
+    # 分位数草图各存一个 .npy，manifest 中只记录文件名
+    for col, sketch in (entry.get('column_sketches') or {}).items():
+        sketch_file = column_cache_filename('sketch', col)
+        np.save(os.path.join(tmp_dir, sketch_file), sketch_to_array(sketch))
+        manifest['sketches'][col] = sketch_file
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    
+    try:
+        os.rename(tmp_dir, final_dir)
+    except OSError:
+        # 其他会话已经写入了同一份缓存
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    enforce_disk_cache_limit()
+
+@st.cache_resource
+def get_disk_cache_lock():
+    """进程级磁盘缓存写锁（所有会话共用），保护 manifest.json 的读-改-写"""
+    return threading.Lock()
+
+def write_json_atomic(path, data):
+    """先写入同目录的临时文件再 os.replace 替换，读者不会读到写了一半的 JSON"""
+    tmp_path = f"{path}.tmp{os.getpid()}_{threading.get_ident()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def save_npy_atomic(path, array):
+    """先写入同目录的临时 .npy 文件再 os.replace 替换"""
+    tmp_path = f"{path}.tmp{os.getpid()}_{threading.get_ident()}.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def column_cache_filename(prefix, col_name):
+    """按列缓存的数组文件名：由列名哈希得到，不同列不会写到同一个文件"""
+    return f"{prefix}_{hashlib.blake2b(col_name.encode('utf-8'), digest_size=8).hexdigest()}.npy"
+
+def save_list_array_to_disk_cache(cache_key, col_name, parsed_array):
+    """
+    把已解析的列表列数组追加到该文件的磁盘缓存中
+    
+    数组先写临时文件再替换；manifest 的读-改-写在进程级锁内完成并原子替换，
+    多个会话同时解析同一文件的不同列表列时不会丢失条目。
+    """
+    cache_dir = os.path.join(DISK_CACHE_DIR, cache_key)
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.isfile(manifest_path):
+        return
+    list_file = column_cache_filename('list', col_name)
+    try:
+        save_npy_atomic(os.path.join(cache_dir, list_file), parsed_array)
+        with get_disk_cache_lock():
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest['list_arrays'][col_name] = list_file
+            write_json_atomic(manifest_path, manifest)
+    except OSError:
+        # 缓存目录已被淘汰：下次打开时重新解析即可
+        pass
+
+def load_from_disk_cache(cache_key):
+    """
+    从磁盘缓存加载：数值列和列表列数组以内存映射方式打开，不读入内存
+    
+    Returns:
+        dict: files_data 条目（含 'cached_list_arrays'），缓存不存在或损坏时返回 None
+    """
+    cache_dir = os.path.join(DISK_CACHE_DIR, cache_key)
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.isfile(manifest_path):
+        return None
+    try:
+        start = time.perf_counter()
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
         
-        # 检查是否为大文件
-        is_large = len(df) > LARGE_FILE_THRESHOLD
+        columns = {}
+        for column in manifest['columns']:
+            path = os.path.join(cache_dir, column['file'])
+            if column['file'].endswith('.npy'):
+                columns[column['name']] = np.load(path, mmap_mode='r')
+            else:
+                columns[column['name']] = pd.read_pickle(path)
+        df = pd.DataFrame(columns, copy=False)
         
-        # 如果是大文件，生成降采样版本（使用简单降采样，因为还不知道要画哪些列）
-        downsampled_df = None
-        if is_large:
-            target_points = max(1000, len(df) // downsample_ratio)  # 根据倍数计算目标点数，最少1000点
-            with st.spinner(f"⏳ 检测到大文件 ({len(df):,} 行)，正在生成预览数据（{downsample_ratio}倍降采样到约{target_points:,}点）..."):
-                downsampled_df = simple_downsample(df, target_points)
-            st.success(f"✅ 预览数据已生成 ({len(downsampled_df):,} 点)")
+        ingest_stats = dict(manifest.get('ingest_stats') or {})
+        ingest_stats['from_cache'] = True
+        ingest_stats['cache_seconds'] = time.perf_counter() - start
         
-        return df, list_columns_info, is_large, downsampled_df
-    except Exception as e:
-        st.error(f"读取文件出错: {str(e)}")
-        return None, None, False, None
+        # 更新访问时间，用于最近最少使用淘汰
+        os.utime(manifest_path)
+        return {
+            'data': df,
+            'list_columns_info': manifest['list_columns_info'],
+            'column_stats': manifest.get('column_stats') or compute_column_stats(df),
+            'column_sketches': {col: sketch_from_array(np.load(os.path.join(cache_dir, sketch_file)))
+                                for col, sketch_file in manifest['sketches'].items()},
+            'is_large': len(df) > LARGE_FILE_THRESHOLD,
+            'ingest_stats': ingest_stats,
+            'cache_key': cache_key,
+            'content_key': cache_key,
+            'cached_list_arrays': {col: np.load(os.path.join(cache_dir, list_file), mmap_mode='r')
+                                   for col, list_file in manifest['list_arrays'].items()}
+        }
+    except Exception:
+        # 缓存损坏：删除后按未缓存处理
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return None
 
-def render_column_selector_v2(label, all_columns, default_selected, key_prefix, list_columns_info, original_df):
+def get_disk_cache_usage():
+    """统计磁盘缓存中每个条目的大小和最近访问时间"""
+    usage = []
+    if not os.path.isdir(DISK_CACHE_DIR):
+        return usage
+    for name in os.listdir(DISK_CACHE_DIR):
+        cache_dir = os.path.join(DISK_CACHE_DIR, name)
+        manifest_path = os.path.join(cache_dir, 'manifest.json')
+        if not os.path.isfile(manifest_path):
+            continue
+        size = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+        usage.append((os.path.getmtime(manifest_path), size, cache_dir))
+    return usage
+
+def enforce_disk_cache_limit(max_bytes=DISK_CACHE_MAX_BYTES):
+    """缓存总大小超过上限时，按最近最少使用顺序删除条目"""
+    usage = sorted(get_disk_cache_usage())
+    total = sum(size for _, size, _ in usage)
+    for _, size, cache_dir in usage:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        total -= size
+
+def build_file_entry(df, ingest_stats=None):
     """
-    渲染优化的列选择器（虚拟滚动、二级菜单、按需展开）
+    由解析好的DataFrame构建 files_data 条目（检测列表列、计算列统计、流式构建数值列的分位数草图）
     
-    Args:
-        label: 选择器标签
-        all_columns: 所有原始列名
-        default_selected: 默认已选中的列（可能包含通道名）
-        key_prefix: key前缀
-        list_columns_info: 列表列信息字典
-        original_df: 原始DataFrame（用于按需展开）
+    降采样预览在绘图时按所选列从整列数据生成，这里不再预先保存一份降采样数据。
     
     Returns:
-        dict: {'normal': [...], 'list_columns': {'col': [channel_indices, ...]}}
+        dict: {'data', 'list_columns_info', 'column_stats', 'column_sketches', 'is_large', 'ingest_stats'}
     """
-    st.write(label)
+    # 只检测列表列，不展开
+    list_columns_info = detect_list_columns(df)
+    
+    return {
+        'data': df,
+        'list_columns_info': list_columns_info,
+        'column_stats': compute_column_stats(df),
+        'column_sketches': compute_column_sketches(df),
+        'is_large': len(df) > LARGE_FILE_THRESHOLD,
+        'ingest_stats': ingest_stats
+    }
+
+def load_data(uploaded_file, use_disk_cache=True, content_key=None):
+    """
+    加载CSV（支持 .gz/.bz2/.zst/.zip 压缩）或Excel文件（不立即展开列表列）
     
-    # 分离普通列和列表列
-    normal_columns = [col for col in all_columns if col not in list_columns_info]
-    list_columns = [col for col in all_columns if col in list_columns_info]
+    不调用任何 Streamlit 界面函数，可在后台线程中并行执行；出错时抛出异常。
+    启用磁盘缓存时，先按内容指纹查找已解析的结果，命中则直接内存映射加载。
     
-    # 初始化选择状态的session state key
-    selection_key = f"{key_prefix}_selections"
-    if selection_key not in st.session_state:
+    Args:
+        uploaded_file: 上传的文件
+        use_disk_cache: 是否使用磁盘列式缓存
+        content_key: 调用方已计算的内容指纹（为 None 时在此计算）
+    
+    Returns:
+        dict: {数据源名称: files_data 条目}；xlsx 每个工作表一个数据源（延迟解析）
+    """
+    if content_key is None:
+        content_key = fingerprint_upload(uploaded_file)
+    name = uploaded_file.name.lower()
+    if name.endswith('.xlsx'):
+        # 只列出工作表，等图表选中时再流式解析
+        return list_excel_sheets(uploaded_file, content_key, use_disk_cache)
+    
+    if use_disk_cache:
+        cached_entry = load_from_disk_cache(content_key)
+        if cached_entry is not None:
+            return {uploaded_file.name: cached_entry}
+    
+    ingest_stats = None
+    if name.endswith('.csv') or name.endswith(COMPRESSED_SUFFIXES):
+        # 流式解压 + 分块解析，尝试多种编码读取CSV
+        df, ingest_stats = read_csv_stream(uploaded_file, uploaded_file.name)
+        if df is None:
+            raise ValueError("无法识别文件编码，请检查文件格式")
+    elif name.endswith('.xls'):
+        df = pd.read_excel(uploaded_file, engine='xlrd')
+    else:
+        raise ValueError("不支持的文件格式，请上传CSV或Excel文件")
+    
+    entry = build_file_entry(df, ingest_stats)
+    entry['content_key'] = content_key
+    if use_disk_cache:
+        save_to_disk_cache(content_key, entry)
+        entry['cache_key'] = content_key
+    return {uploaded_file.name: entry}
+
+# ============ Excel 只读流式读取（按工作表延迟解析） ============
+
+EXCEL_BLOCK_ROWS = 50000  # 流式读取Excel时每批构建DataFrame的行数
+
+def list_excel_sheets(uploaded_file, content_key, use_disk_cache=True):
+    """
+    以只读模式打开xlsx，只列出工作表名称，为每个工作表生成一个待解析的数据源
+    
+    Args:
+        content_key: 工作簿的内容指纹（每个工作表的缓存键在此基础上加工作表名）
+        use_disk_cache: 工作表解析后是否使用磁盘缓存
+    
+    Returns:
+        dict: {数据源名称: 未解析的 files_data 条目}
+    """
+    workbook_bytes = uploaded_file.getvalue()
+    workbook = openpyxl.load_workbook(io.BytesIO(workbook_bytes), read_only=True, data_only=True)
+    try:
+        sheet_names = workbook.sheetnames
+    finally:
+        workbook.close()
+    
+    entries = {}
+    for sheet_name in sheet_names:
+        # 只有一个工作表时直接使用文件名
+        source_name = uploaded_file.name if len(sheet_names) == 1 else f"{uploaded_file.name} [{sheet_name}]"
+        entries[source_name] = {
+            'data': None,
+            'list_columns_info': {},
+            'is_large': False,
+            'ingest_stats': None,
+            'source_file': uploaded_file.name,
+            'excel': {
+                'workbook_bytes': workbook_bytes,
+                'sheet': sheet_name,
+                'content_key': hashlib.blake2b(f"{content_key}:{sheet_name}".encode(), digest_size=16).hexdigest(),
+                'use_disk_cache': use_disk_cache
+            }
+        }
+    return entries
+
+def read_excel_sheet_streaming(workbook_bytes, sheet_name):
+    """
+    使用 openpyxl 只读 + values_only 模式逐行读取单个工作表，分批构建DataFrame
+    
+    Returns:
+        DataFrame，首行为列名
+    """
+    workbook = openpyxl.load_workbook(io.BytesIO(workbook_bytes), read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        
+        # 处理空列名和重复列名（与 pandas 的命名规则一致）
+        columns = []
+        for i, name in enumerate(header):
+            name = f"Unnamed: {i}" if name is None else str(name)
+            base, dup = name, 1
+            while name in columns:
+                name = f"{base}.{dup}"
+                dup += 1
+            columns.append(name)
+        
+        blocks = []
+        block = []
+        for row in rows:
+            block.append(row[:len(columns)])
+            if len(block) >= EXCEL_BLOCK_ROWS:
+                blocks.append(pd.DataFrame.from_records(block, columns=columns))
+                block = []
+        if block or not blocks:
+            blocks.append(pd.DataFrame.from_records(block, columns=columns))
+    finally:
+        workbook.close()
+    
+    df = pd.concat(blocks, ignore_index=True) if len(blocks) > 1 else blocks[0]
+    # 去掉末尾的全空行（只读模式下格式化过的空单元格也会被读出）
+    non_empty = df.notna().any(axis=1).to_numpy()
+    if len(df) > 0 and not non_empty[-1]:
+        last_row = np.flatnonzero(non_empty)
+        df = df.iloc[:last_row[-1] + 1 if len(last_row) else 0]
+    return df.infer_objects()
+
+def get_file_info(data_source):
+    """
+    获取数据源条目；xlsx 工作表在首次被使用时才解析
+    
+    Returns:
+        dict: files_data 条目（'data' 已就绪）
+    """
+    file_info = st.session_state.files_data[data_source]
+    if file_info['data'] is None and 'excel' in file_info:
+        excel = file_info['excel']
+        
+        # 其他会话已经解析过同一工作表：直接挂载共享数据
+        entry = attach_shared_dataset(excel['content_key'])
+        if entry is None:
+            if excel['use_disk_cache']:
+                entry = load_from_disk_cache(excel['content_key'])
+            if entry is None:
+                entry = parse_excel_sheet_entry(excel)
+            entry = publish_shared_dataset(entry)
+        file_info.update(entry)
+    elif file_info['data'] is None and file_info.get('evicted'):
+        # 源数据因内存预算被释放：优先重新挂载共享数据，否则从磁盘缓存重新加载
+        entry = attach_shared_dataset(file_info.get('content_key'))
+        if entry is None:
+            entry = load_from_disk_cache(file_info['cache_key'])
+            if entry is None:
+                raise ValueError(f"'{data_source}' 已从内存释放且磁盘缓存已被清除，请重新上传该文件")
+            entry = publish_shared_dataset(entry)
+        file_info.update(entry)
+        file_info.pop('evicted')
+    if file_info['data'] is not None:
+        touch_session_cache('source', data_source)
+    return file_info
+
+def parse_excel_sheet_entry(excel):
+    """流式解析单个工作表并生成 files_data 条目（启用时同时写入磁盘缓存）"""
+    with st.spinner(f"⏳ 正在流式读取工作表 '{excel['sheet']}'..."):
+        start = time.perf_counter()
+        df = read_excel_sheet_streaming(excel['workbook_bytes'], excel['sheet'])
+        entry = build_file_entry(df)
+        entry['ingest_stats'] = {
+            'inner_name': excel['sheet'],
+            'compressed': False,
+            'input_bytes': len(excel['workbook_bytes']),
+            'output_bytes': len(excel['workbook_bytes']),
+            'decompress_seconds': 0.0,
+            'parse_seconds': time.perf_counter() - start,
+            'total_seconds': time.perf_counter() - start
+        }
+        entry['content_key'] = excel['content_key']
+        if excel['use_disk_cache']:
+            save_to_disk_cache(excel['content_key'], entry)
+            entry['cache_key'] = excel['content_key']
+    return entry
+
+# ============ 跨会话共享数据集（同一文件在所有会话中只保留一份） ============
+
+SHARED_STORE_BUDGET_BYTES = 8 * 1024 ** 3  # 共享数据集的内存预算，超出后按最近最少使用淘汰
+
+class SharedDatasetLease:
+    """会话持有的共享数据集租约；会话结束、session state 被回收时自动释放该会话挂载的数据集"""
+    
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+@st.cache_resource
+def get_shared_dataset_store():
+    """
+    进程级数据集注册表（所有会话共享），按内容指纹索引
+    
+    datasets: {content_key: {'payload': 条目, 'list_arrays': {列名: 数组},
+                             'sessions': {会话ID: 挂载次数}, 'nbytes': int, 'last_used': float}}
+    """
+    return {'lock': threading.RLock(), 'datasets': {}}
+
+def get_session_id():
+    """获取当前会话ID，并确保会话持有共享数据集租约"""
+    if 'shared_dataset_lease' not in st.session_state:
+        ctx = get_script_run_ctx()
+        session_id = ctx.session_id if ctx is not None else 'local'
+        lease = SharedDatasetLease(session_id)
+        weakref.finalize(lease, release_session_datasets, get_shared_dataset_store(), session_id)
+        st.session_state.shared_dataset_lease = lease
+    return st.session_state.shared_dataset_lease.session_id
+
+def estimate_entry_nbytes(entry):
+    """估算条目占用的内存字节数（内存映射的列不计入）"""
+    return frame_nbytes(entry.get('data'))
+
+def session_entry_from_payload(content_key, payload):
+    """
+    由共享载荷生成本会话的 files_data 条目
+    
+    DataFrame 等数据对象只读共享；统计信息和列表列信息等嵌套字典按会话复制，
+    本会话对它们的修改（跟随追加、补算统计等）不会影响其他会话
+    """
+    entry = dict(payload)
+    for key in ('column_stats', 'list_columns_info'):
+        if entry.get(key) is not None:
+            entry[key] = {col: dict(info) for col, info in entry[key].items()}
+    if entry.get('column_sketches') is not None:
+        entry['column_sketches'] = dict(entry['column_sketches'])
+    if entry.get('ingest_stats') is not None:
+        entry['ingest_stats'] = dict(entry['ingest_stats'])
+    entry['content_key'] = content_key
+    entry['shared'] = True
+    return entry
+
+def attach_shared_dataset(content_key):
+    """
+    挂载已在注册表中的数据集
+    
+    Returns:
+        dict: 本会话的 files_data 条目；注册表中没有时返回 None
+    """
+    if not content_key:
+        return None
+    session_id = get_session_id()
+    store = get_shared_dataset_store()
+    with store['lock']:
+        dataset = store['datasets'].get(content_key)
+        if dataset is None:
+            return None
+        dataset['sessions'][session_id] = dataset['sessions'].get(session_id, 0) + 1
+        dataset['last_used'] = time.time()
+        return session_entry_from_payload(content_key, dataset['payload'])
+
+def publish_shared_dataset(entry):
+    """
+    把新解析的数据集登记到注册表并挂载到当前会话；其他会话已登记同一内容时改用已有的那份
+    
+    Returns:
+        dict: 本会话的 files_data 条目
+    """
+    content_key = entry.get('content_key')
+    if not content_key:
+        return entry
+    list_arrays = entry.pop('cached_list_arrays', {})
+    session_id = get_session_id()
+    store = get_shared_dataset_store()
+    with store['lock']:
+        dataset = store['datasets'].get(content_key)
+        if dataset is None:
+            payload = {key: value for key, value in entry.items() if key not in ('content_key', 'shared')}
+            dataset = {
+                'payload': payload,
+                'list_arrays': dict(list_arrays),
+                'sessions': {},
+                'nbytes': estimate_entry_nbytes(payload),
+                'last_used': time.time()
+            }
+            store['datasets'][content_key] = dataset
+        dataset['sessions'][session_id] = dataset['sessions'].get(session_id, 0) + 1
+        dataset['last_used'] = time.time()
+        evict_shared_datasets(store)
+        return session_entry_from_payload(content_key, dataset['payload'])
+
+def detach_shared_dataset(content_key, session_id=None):
+    """当前会话不再使用该数据集；最后一个会话释放后数据集转为空闲，可被预算淘汰"""
+    session_id = session_id or get_session_id()
+    store = get_shared_dataset_store()
+    with store['lock']:
+        dataset = store['datasets'].get(content_key)
+        if dataset is None or session_id not in dataset['sessions']:
+            return
+        dataset['sessions'][session_id] -= 1
+        if dataset['sessions'][session_id] <= 0:
+            del dataset['sessions'][session_id]
+        evict_shared_datasets(store)
+
+def release_session_datasets(store, session_id):
+    """会话结束时释放它挂载的所有数据集（由租约的 finalize 回调调用）"""
+    with store['lock']:
+        for dataset in store['datasets'].values():
+            dataset['sessions'].pop(session_id, None)
+        evict_shared_datasets(store)
+
+def evict_shared_datasets(store, budget=SHARED_STORE_BUDGET_BYTES):
+    """
+    超出内存预算时按最近最少使用淘汰：先淘汰没有会话挂载的空闲数据集，
+    仍超出时再从注册表移除挂载中的数据集（已挂载的会话继续持有各自的引用）
+    """
+    datasets = store['datasets']
+    total = sum(dataset['nbytes'] for dataset in datasets.values())
+    candidates = sorted(datasets.items(), key=lambda item: (len(item[1]['sessions']) > 0, item[1]['last_used']))
+    for content_key, dataset in candidates:
+        if total <= budget:
+            break
+        total -= dataset['nbytes']
+        del datasets[content_key]
+
+def get_shared_list_array(content_key, col_name):
+    """从注册表获取其他会话已解析的列表列数组"""
+    store = get_shared_dataset_store()
+    with store['lock']:
+        dataset = store['datasets'].get(content_key)
+        return dataset['list_arrays'].get(col_name) if dataset else None
+
+def publish_shared_list_array(content_key, col_name, parsed_array):
+    """把本会话解析的列表列数组共享给其他会话（共享后只读）"""
+    parsed_array.flags.writeable = False
+    store = get_shared_dataset_store()
+    with store['lock']:
+        dataset = store['datasets'].get(content_key)
+        if dataset is not None and col_name not in dataset['list_arrays']:
+            dataset['list_arrays'][col_name] = parsed_array
+            dataset['nbytes'] += array_nbytes(parsed_array)
+
+# ============ 会话内存预算（按最近最少使用淘汰可重算的缓存） ============
+
+# 淘汰优先级：数值越小越先淘汰（可重算的缓存优先于源数据）
+CACHE_EVICTION_PRIORITY = {'figure': 0, 'expanded': 1, 'histogram': 2, 'time_bucket': 3, 'x_time': 4, 'x_index': 5,
+                           'parsed': 6, 'source': 7}
+CACHE_KIND_LABELS = {'source': '源数据', 'parsed': '列表列解析', 'expanded': '通道展开',
+                     'x_index': 'X有序索引', 'x_time': '时间转换', 'histogram': '直方图排序', 'time_bucket': '时间桶聚合',
+                     'figure': '已构建图表'}
+
+def array_nbytes(values):
+    """数组占用的内存字节数；内存映射（磁盘缓存）的数组由操作系统按页换入换出，不计入"""
+    base = values
+    while base is not None:
+        if isinstance(base, np.memmap):
+            return 0
+        base = getattr(base, 'base', None)
+    return int(values.nbytes)
+
+def object_values_nbytes(values):
+    """
+    object 数组中 Python 对象（字符串等）占用的字节数：按等间隔抽取的行估算，
+    避免每次统计内存都逐个遍历整列
+    """
+    if len(values) == 0:
+        return 0
+    sample = values[::max(1, len(values) // OBJECT_NBYTES_SAMPLE_SIZE)]
+    sample_nbytes = int(pd.Series(sample, dtype=object, copy=False).memory_usage(index=False, deep=True)) - sample.nbytes
+    return int(sample_nbytes / len(sample) * len(values))
+
+def frame_nbytes(df):
+    """DataFrame 占用的内存字节数（不含索引，内存映射的列不计入；object 列含其中 Python 对象的估算大小）"""
+    if df is None:
+        return 0
+    nbytes = 0
+    for col in df.columns:
+        values = df[col].array
+        values = getattr(values, '_ndarray', values)
+        if isinstance(values, np.ndarray):
+            nbytes += array_nbytes(values)
+            if values.dtype == object:
+                nbytes += object_values_nbytes(values)
+        else:
+            nbytes += int(df[col].memory_usage(index=False, deep=False))
+    return nbytes
+
+def touch_session_cache(kind, key):
+    """记录缓存项的最近使用时间，供LRU淘汰使用"""
+    st.session_state.cache_last_used[(kind, key)] = time.time()
+
+def shared_dataset_session_count(content_key):
+    """共享数据集当前被多少个会话挂载"""
+    store = get_shared_dataset_store()
+    with store['lock']:
+        dataset = store['datasets'].get(content_key)
+        return max(1, len(dataset['sessions'])) if dataset else 1
+
+def collect_session_cache_items():
+    """
+    汇总本会话持有的所有缓存项
+    
+    Returns:
+        list: [{'kind', 'key', 'nbytes', 'last_used', 'evictable'}]
+              共享数据集的源数据按挂载会话数分摊
+    """
+    last_used = st.session_state.cache_last_used
+    items = []
+    
+    def add(kind, key, nbytes, evictable=True):
+        items.append({'kind': kind, 'key': key, 'nbytes': nbytes,
+                      'last_used': last_used.get((kind, key), 0.0), 'evictable': evictable})
+    
+    for filename, file_info in st.session_state.files_data.items():
+        if file_info['data'] is None:
+            continue
+        # 只有能从磁盘缓存重新加载的源数据才允许淘汰
+        source_evictable = bool(file_info.get('cache_key')) and 'follow' not in file_info and not file_info.get('shards')
+        if file_info.get('shared'):
+            nbytes = estimate_entry_nbytes(file_info) // shared_dataset_session_count(file_info['content_key'])
+            add('source', filename, nbytes, source_evictable)
+        else:
+            add('source', filename, frame_nbytes(file_info['data']), source_evictable)
+    for key, parsed_array in st.session_state.parsed_list_columns.items():
+        add('parsed', key, array_nbytes(parsed_array))
+    for key, expanded_df in st.session_state.expanded_list_columns.items():
+        add('expanded', key, frame_nbytes(expanded_df))
+    for key, cached_figure in st.session_state.figure_cache.items():
+        add('figure', key, cached_figure['nbytes'])
+    for key, time_values in st.session_state.x_time_columns.items():
+        add('x_time', key, array_nbytes(time_values))
+    for key, sorted_values in st.session_state.histogram_values.items():
+        add('histogram', key, sorted_values.nbytes)
+    for key, buckets in st.session_state.time_buckets.items():
+        add('time_bucket', key, buckets['bucket_ms'].nbytes + buckets['first_row'].nbytes
+            + sum(values.nbytes for aggregates in buckets['columns'].values() for values in aggregates.values()))
+    for key, x_index in st.session_state.x_range_indices.items():
+        nbytes = 0 if x_index['monotonic'] else x_index['order'].nbytes + x_index['sorted_values'].nbytes
+        add('x_index', key, nbytes)
+    
+    # 清理已不存在的缓存项的使用记录
+    live_keys = {(item['kind'], item['key']) for item in items}
+    for stale_key in [k for k in last_used if k not in live_keys]:
+        del last_used[stale_key]
+    return items
+
+def evict_session_cache_item(kind, key):
+    """从会话中移除一个缓存项（被淘汰的内容在下次使用时重新计算或重新加载）"""
+    if kind == 'expanded':
+        st.session_state.expanded_list_columns.pop(key, None)
+    elif kind == 'parsed':
+        st.session_state.parsed_list_columns.pop(key, None)
+    elif kind == 'x_index':
+        st.session_state.x_range_indices.pop(key, None)
+    elif kind == 'x_time':
+        st.session_state.x_time_columns.pop(key, None)
+    elif kind == 'histogram':
+        st.session_state.histogram_values.pop(key, None)
+    elif kind == 'time_bucket':
+        st.session_state.time_buckets.pop(key, None)
+    elif kind == 'figure':
+        st.session_state.figure_cache.pop(key, None)
+    elif kind == 'source':
+        file_info = st.session_state.files_data[key]
+        if file_info.get('shared'):
+            detach_shared_dataset(file_info['content_key'])
+        file_info.update({'data': None, 'shared': False, 'evicted': True})
+        clear_file_derived_caches(key)
+    st.session_state.cache_last_used.pop((kind, key), None)
+
+def enforce_session_memory_budget():
+    """
+    会话内存超出预算时，先淘汰可重算的缓存（已构建图表 → 通道展开 → 直方图排序 → 时间桶聚合 → 时间转换 → X有序索引 → 列表列解析），
+    最后才释放可从磁盘缓存重新加载的源数据；每类内部按最近最少使用顺序淘汰
+    
+    Returns:
+        tuple: (当前缓存项列表, 本次淘汰的缓存项数量)
+    """
+    budget = st.session_state.memory_budget_mb * 1024 ** 2
+    items = collect_session_cache_items()
+    total = sum(item['nbytes'] for item in items)
+    evicted = 0
+    if total > budget:
+        candidates = sorted((item for item in items if item['evictable'] and item['nbytes'] > 0),
+                            key=lambda item: (CACHE_EVICTION_PRIORITY[item['kind']], item['last_used']))
+        for item in candidates:
+            if total <= budget:
+                break
+            evict_session_cache_item(item['kind'], item['key'])
+            total -= item['nbytes']
+            evicted += 1
+        items = collect_session_cache_items()
+    return items, evicted
+
+def merge_shard_entries(shard_names, entries, sort_column=None):
+    """
+    将列结构相同的多个分片合并为一个逻辑数据源
+    
+    Args:
+        shard_names: 分片文件名列表（按合并顺序）
+        entries: {文件名: files_data 条目}
+        sort_column: 合并后按该列稳定排序（None 表示保持分片顺序）
+    
+    Returns:
+        tuple: (合并后的数据源名称, files_data 条目)
+    """
+    merged_df = pd.concat([entries[name]['data'] for name in shard_names], ignore_index=True)
+    for name in shard_names:
+        # 分片各自的列表列缓存与合并后的行号不对应，不再使用
+        entries[name].pop('cached_list_arrays', None)
+    if sort_column is not None and sort_column in merged_df.columns:
+        merged_df = merged_df.sort_values(sort_column, kind='stable').reset_index(drop=True)
+    
+    # 汇总各分片的吞吐统计
+    ingest_stats = None
+    shard_stats = [entries[name]['ingest_stats'] for name in shard_names if entries[name].get('ingest_stats')]
+    if shard_stats:
+        ingest_stats = {key: sum(stats[key] for stats in shard_stats)
+                        for key in ('input_bytes', 'output_bytes', 'decompress_seconds', 'parse_seconds', 'total_seconds')}
+        ingest_stats['compressed'] = any(stats['compressed'] for stats in shard_stats)
+        ingest_stats['inner_name'] = shard_names[0]
+    
+    entry = build_file_entry(merged_df, ingest_stats)
+    entry['shards'] = list(shard_names)
+    
+    # 名称：分片文件名的公共前缀 + 分片数
+    prefix = os.path.commonprefix(shard_names).rstrip('_-. ') or os.path.splitext(shard_names[0])[0]
+    return f"{prefix}* ({len(shard_names)}个分片)", entry
+
+def ingest_uploaded_files(uploaded_files, merge_shards=False, sort_merged=False, use_disk_cache=True):
+    """
+    在有界线程池中并行解析新上传的文件，并显示每个文件的进度
+    
+    Args:
+        uploaded_files: 待解析的上传文件列表
+        merge_shards: 是否把列结构相同的分片合并为一个数据源
+        sort_merged: 合并后是否按X轴（首列）排序
+        use_disk_cache: 是否使用磁盘列式缓存
+    
+    Returns:
+        dict: {数据源名称: files_data 条目}
+    """
+    entries = {}
+    
+    # 其他会话已加载过相同内容的文件：直接挂载共享数据，无需解析；
+    # 计算过的内容指纹传给 load_data，每个文件只哈希一次
+    files_to_parse = []
+    content_keys = {}
+    for uploaded_file in uploaded_files:
+        shared_entry = None
+        if not uploaded_file.name.lower().endswith('.xlsx'):
+            content_keys[uploaded_file.name] = fingerprint_upload(uploaded_file)
+            shared_entry = attach_shared_dataset(content_keys[uploaded_file.name])
+        if shared_entry is not None:
+            entries[uploaded_file.name] = shared_entry
+            st.caption(f"🤝 {uploaded_file.name} 已由其他会话加载，直接共享")
+        else:
+            files_to_parse.append(uploaded_file)
+    
+    workers = max(1, min(MAX_INGEST_WORKERS, len(files_to_parse), os.cpu_count() or 1))
+    progress_bars = {f.name: st.progress(0.0, text=f"⏳ {f.name} 排队中...") for f in files_to_parse}
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(load_data, f, use_disk_cache, content_keys.get(f.name)): f for f in files_to_parse}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                uploaded_file = futures[future]
+                try:
+                    entries.update(future.result())
+                    progress_bars[uploaded_file.name].progress(1.0, text=f"✅ {uploaded_file.name} 已加载")
+                except Exception as e:
+                    progress_bars[uploaded_file.name].empty()
+                    st.error(f"读取文件 '{uploaded_file.name}' 出错: {str(e)}")
+            # 按已消耗的（压缩）输入字节估算进度
+            for future in pending:
+                uploaded_file = futures[future]
+                if future.running() and uploaded_file.size:
+                    fraction = min(uploaded_file.tell() / uploaded_file.size, 0.99)
+                    progress_bars[uploaded_file.name].progress(fraction, text=f"📥 {uploaded_file.name} 解析中 {fraction:.0%}")
+    
+    # 新解析的数据集登记到跨会话共享注册表
+    for name, entry in entries.items():
+        if entry['data'] is not None and not entry.get('shared'):
+            entries[name] = publish_shared_dataset(entry)
+    
+    if not merge_shards:
+        return entries
+    
+    # 按列结构分组，同结构且多于1个的分片合并为一个数据源（未解析的工作表不参与合并）
+    groups = {}
+    for name, entry in entries.items():
+        if entry['data'] is not None:
+            groups.setdefault(tuple(entry['data'].columns), []).append(name)
+    
+    result = dict(entries)
+    for schema, shard_names in groups.items():
+        if len(shard_names) == 1:
+            continue
+        for name in shard_names:
+            del result[name]
+            # 合并后的数据源是本会话独有的，分片不再挂载共享数据
+            if entries[name].get('shared'):
+                detach_shared_dataset(entries[name]['content_key'])
+        with st.spinner(f"⏳ 正在合并 {len(shard_names)} 个同结构分片..."):
+            merged_name, merged_entry = merge_shard_entries(
+                sorted(shard_names), entries,
+                sort_column=schema[0] if sort_merged and schema else None
+            )
+        result[merged_name] = merged_entry
+    return result
+
+# 按文件派生的会话缓存（键均以 f"{文件名}_" 开头），文件删除、重载或追加时失效
+FILE_DERIVED_CACHES = ('parsed_list_columns', 'expanded_list_columns', 'x_range_indices', 'x_time_columns', 'histogram_values',
+                       'time_buckets')
+
+def clear_file_derived_caches(filename, cache_names=FILE_DERIVED_CACHES):
+    """清理指定文件的派生缓存"""
+    for cache_name in cache_names:
+        cache = st.session_state[cache_name]
+        for key in [k for k in cache if k.startswith(f"{filename}_")]:
+            del cache[key]
+
+def remove_file_data(filename):
+    """删除已加载的文件，并清理该文件相关的所有缓存和图表状态"""
+    if filename in st.session_state.files_data:
+        file_info = st.session_state.files_data.pop(filename)
+        if file_info.get('shared'):
+            detach_shared_dataset(file_info['content_key'])
+    
+    # 1. 清理解析、展开等按列派生的缓存
+    clear_file_derived_caches(filename)
+    
+    # 2. 清理使用该文件的图表配置和相关状态
+    charts_to_reset = []
+    for idx, chart in enumerate(st.session_state.charts):
+        if chart.get('data_source') == filename:
+            charts_to_reset.append(idx)
+    
+    for idx in charts_to_reset:
+        # 重置图表配置
+        st.session_state.charts[idx]['data_source'] = None
+        st.session_state.charts[idx]['is_configured'] = False
+        st.session_state.charts[idx]['y1_columns'] = []
+        st.session_state.charts[idx]['y2_columns'] = []
+        
+        # 清理该图表的所有相关状态
+        clear_chart_states(idx)
+
+# ============ 跟随模式（增量读取持续增长的CSV日志） ============
+
+def read_complete_lines(path, offset):
+    """
+    从指定字节偏移读取文件中新增的完整行（末尾未写完的半行留到下次读取）
+    
+    Returns:
+        tuple: (新增的字节内容, 新的字节偏移)
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        chunk = f.read()
+    last_newline = chunk.rfind(b'\n')
+    if last_newline < 0:
+        return b'', offset
+    return chunk[:last_newline + 1], offset + last_newline + 1
+
+def append_to_buffer(buffer, used, values):
+    """
+    把新值写入预分配缓冲区 buffer[used:]，容量不足时按两倍扩容（均摊后每次追加只与新增行数成正比）
+    
+    Args:
+        buffer: 预分配的数组（首维为行）
+        used: 已使用的行数
+        values: 新追加的值（除首维外形状与 buffer 相同）
+    
+    Returns:
+        ndarray: 写入后的缓冲区（扩容或类型提升时为新分配的数组）
+    """
+    needed = used + len(values)
+    dtype = np.result_type(buffer.dtype, values.dtype)
+    if needed > len(buffer) or dtype != buffer.dtype:
+        grown = np.empty((max(needed, 2 * len(buffer)),) + buffer.shape[1:], dtype=dtype)
+        grown[:used] = buffer[:used]
+        buffer = grown
+    buffer[used:needed] = values
+    return buffer
+
+def start_follow_file(path):
+    """
+    以跟随模式加载本地CSV文件，记录已读取的字节偏移
+    
+    Returns:
+        dict: files_data 条目（含 'follow' 状态），失败时返回 None
+    """
+    if not os.path.isfile(path):
+        st.error(f"❌ 文件不存在: {path}")
+        return None
+    if not path.lower().endswith('.csv'):
+        st.error("跟随模式仅支持CSV文件")
+        return None
+    
+    raw, offset = read_complete_lines(path, 0)
+    if not raw:
+        st.error("文件中还没有完整的数据行")
+        return None
+    
+    df = None
+    used_encoding = None
+    for encoding in CSV_ENCODINGS:
+        try:
+            df = pd.read_csv(io.BytesIO(raw), encoding=encoding)
+            used_encoding = encoding
+            break
+        except UnicodeDecodeError:
+            continue
+    if df is None:
+        st.error("无法识别文件编码，请检查文件格式")
+        return None
+    
+    entry = build_file_entry(df)
+    entry['follow'] = {
+        'path': path,
+        'offset': offset,
+        'encoding': used_encoding,
+        'columns': df.columns.tolist(),
+        'sketch_rows': len(df),  # 分位数草图已覆盖的行数
+        'buffers': None,  # 各列的预分配缓冲区（首次追加时创建），DataFrame 是其前 N 行的视图
+        'list_buffers': {},  # 列表列解析数组的预分配缓冲区
+        'enabled': True,
+        'last_appended': 0
+    }
+    return entry
+
+def append_followed_rows(filename):
+    """
+    读取跟随文件新增的行，增量追加到内存数据和列表列缓存
+    
+    Returns:
+        int: 新追加的行数
+    """
+    file_info = st.session_state.files_data[filename]
+    follow = file_info['follow']
+    
+    # 文件被截断或轮转时从头重新加载
+    if os.path.getsize(follow['path']) < follow['offset']:
+        new_info = start_follow_file(follow['path'])
+        if new_info is None:
+            return 0
+        st.session_state.files_data[filename] = new_info
+        clear_file_derived_caches(filename)
+        return len(new_info['data'])
+    
+    raw, new_offset = read_complete_lines(follow['path'], follow['offset'])
+    if not raw:
+        follow['last_appended'] = 0
+        return 0
+    
+    new_rows = pd.read_csv(io.BytesIO(raw), header=None, names=follow['columns'], encoding=follow['encoding'])
+    follow['offset'] = new_offset
+    follow['last_appended'] = len(new_rows)
+    if len(new_rows) == 0:
+        return 0
+    
+    # 追加写入各列的预分配缓冲区后重建 DataFrame 视图（不复制已有行；整表 pd.concat 每次轮询都要复制全部数据）
+    old_len = len(file_info['data'])
+    new_len = old_len + len(new_rows)
+    if follow['buffers'] is None:
+        follow['buffers'] = {col: file_info['data'][col].to_numpy() for col in follow['columns']}
+    for col in follow['columns']:
+        follow['buffers'][col] = append_to_buffer(follow['buffers'][col], old_len, new_rows[col].to_numpy())
+    file_info['data'] = pd.DataFrame(
+        {col: pd.Series(follow['buffers'][col][:new_len], dtype=follow['buffers'][col].dtype, copy=False)
+         for col in follow['columns']},
+        copy=False
+    )
+    new_rows.index = pd.RangeIndex(old_len, new_len)
+    file_info['column_stats'] = merge_column_stats(file_info['column_stats'], compute_column_stats(new_rows), file_info['data'])
+    file_info['is_large'] = len(file_info['data']) > LARGE_FILE_THRESHOLD
+    
+    # 列表列：只解析新增行并拼接到已缓存的数组
+    for col_name, info in file_info['list_columns_info'].items():
+        cache_key = f"{filename}_{col_name}"
+        if cache_key in st.session_state.parsed_list_columns:
+            cached = st.session_state.parsed_list_columns[cache_key]
+            new_array = parse_list_column_to_array(new_rows[col_name], min_length=cached.shape[1])
+            # 缓存被淘汰后重新解析过时，缓冲区从新的解析结果开始
+            buffer = follow['list_buffers'].get(col_name)
+            if buffer is None or cached.base is not buffer:
+                buffer = cached
+            if new_array.shape[1] > buffer.shape[1]:
+                padding = np.full((buffer.shape[0], new_array.shape[1] - buffer.shape[1]), np.nan)
+                buffer = np.hstack([buffer, padding])
+            buffer = append_to_buffer(buffer, old_len, new_array)
+            follow['list_buffers'][col_name] = buffer
+            st.session_state.parsed_list_columns[cache_key] = buffer[:new_len]
+            info['num_channels'] = max(info['num_channels'], new_array.shape[1])
+    
+    # 分位数草图：新增行累计满一块后才一次并入（每行只参与一次合并，插值误差不随轮询次数累积），
+    # 尚未并入的尾部行在读取时现建草图（见 get_column_sketch）
+    if len(file_info['data']) - follow['sketch_rows'] >= QUANTILE_SKETCH_BLOCK_ROWS:
+        sketches = {col: get_column_sketch(file_info, col) for col in file_info['data'].columns
+                    if pd.api.types.is_numeric_dtype(file_info['data'][col])
+                    and not pd.api.types.is_bool_dtype(file_info['data'][col])}
+        file_info['column_sketches'] = {col: sketch for col, sketch in sketches.items() if sketch is not None}
+        follow['sketch_rows'] = len(file_info['data'])
+    
+    # 已展开的通道、X有序索引和时间转换缓存是整列结果，追加后失效（已解析的列表列上面已增量拼接）
+    clear_file_derived_caches(filename, [name for name in FILE_DERIVED_CACHES if name != 'parsed_list_columns'])
+    
+    return len(new_rows)
+
+@st.fragment(run_every=FOLLOW_POLL_INTERVAL)
+def render_follow_poller():
+    """定时轮询跟随中的文件 - 作为 fragment 定时运行，有新数据时才刷新页面"""
+    followed = [name for name, info in st.session_state.files_data.items()
+                if info.get('follow', {}).get('enabled')]
+    if not followed:
+        return
+    
+    changed_files = set()
+    for filename in followed:
+        try:
+            appended = append_followed_rows(filename)
+        except Exception as e:
+            st.error(f"跟随文件 '{filename}' 读取出错: {str(e)}")
+            st.session_state.files_data[filename]['follow']['enabled'] = False
+            continue
+        if appended > 0:
+            changed_files.add(filename)
+        rows = len(st.session_state.files_data[filename]['data'])
+        st.caption(f"📡 {filename}: {rows:,} 行 (+{appended:,})")
+    
+    if not changed_files:
+        return
+    # 只丢弃有新数据的文件的图表缓存，其他图表在刷新时直接命中缓存
+    for key in [key for key, cached_figure in st.session_state.figure_cache.items()
+                if cached_figure.get('data_source') in changed_files]:
+        del st.session_state.figure_cache[key]
+    # fragment 只能重跑自身或整页：仅当当前页有使用这些文件的展开图表时才整页刷新
+    if changed_files & visible_chart_sources():
+        st.rerun(scope="app")
+
+def visible_chart_sources():
+    """当前页未折叠的图表所使用的数据源文件名集合"""
+    per_page = st.session_state.charts_per_page
+    page_start = st.session_state.chart_page * per_page
+    return {chart.get('data_source') for chart in st.session_state.charts[page_start:page_start + per_page]
+            if not chart.get('collapsed', False)}
+
+def render_column_selector_v2(label, all_columns, default_selected, key_prefix, list_columns_info, original_df):
+    """
+    渲染优化的列选择器（虚拟滚动、二级菜单、按需展开）
+    
+    Args:
+        label: 选择器标签
+        all_columns: 所有原始列名
+        default_selected: 默认已选中的列（可能包含通道名）
+        key_prefix: key前缀
+        list_columns_info: 列表列信息字典
+        original_df: 原始DataFrame（用于按需展开）
+    
+    Returns:
+        dict: {'normal': [...], 'list_columns': {'col': [channel_indices, ...]}}
+    """
+    st.write(label)
+    
+    # 分离普通列和列表列
+    normal_columns = [col for col in all_columns if col not in list_columns_info]
+    list_columns = [col for col in all_columns if col in list_columns_info]
+    
+    # 初始化选择状态的session state key
+    selection_key = f"{key_prefix}_selections"
+    if selection_key not in st.session_state:
         st.session_state[selection_key] = {
             'normal': [],
             'list_columns': {}
@@ -1498,11 +3169,95 @@ def render_column_selector_v2(label, all_columns, default_selected, key_prefix,
     
     return st.session_state[selection_key]
 
+def get_x_range_index(df, x_column, data_source=None):
+    """
+    获取数值X列的有序索引（每个文件每列只构建一次）
+    
+    单调递增的X列直接以原列作为有序值；否则保存一次排序置换和排序后的值，
+    范围查询都通过 searchsorted 二分定位，无需整列扫描
+    
+    Returns:
+        dict: {'monotonic': bool, 'order': 排序置换或None, 'sorted_values': 有序的X值}
+    """
+    cache_key = f"{data_source}_{x_column}"
+    if data_source:
+        touch_session_cache('x_index', cache_key)
+        cached = st.session_state.x_range_indices.get(cache_key)
+        if cached is not None and len(cached['sorted_values']) == len(df):
+            return cached
+    
+    x_values = df[x_column].to_numpy()
+    col_stats = get_column_stats(data_source, x_column)
+    monotonic = col_stats['monotonic'] if col_stats is not None else df[x_column].is_monotonic_increasing
+    if monotonic:
+        x_index = {'monotonic': True, 'order': None, 'sorted_values': x_values}
+    else:
+        order = np.argsort(x_values, kind='stable')
+        x_index = {'monotonic': False, 'order': order, 'sorted_values': x_values[order]}
+    if data_source:
+        st.session_state.x_range_indices[cache_key] = x_index
+    return x_index
+
+def x_range_to_rows(x_index, range_start, range_end, sort_by_x=False):
+    """
+    把X值范围 [range_start, range_end] 转换为行选择
+    
+    Args:
+        sort_by_x: 为True时行号按X值排序返回（即排序置换的一段，无需再排序）
+    
+    Returns:
+        slice（X单调时为连续切片）或行号数组（默认按原始顺序排列）
+    """
+    lo = int(np.searchsorted(x_index['sorted_values'], range_start, side='left'))
+    hi = int(np.searchsorted(x_index['sorted_values'], range_end, side='right'))
+    hi = max(lo, hi)
+    if x_index['monotonic']:
+        return slice(lo, hi)
+    if sort_by_x:
+        return x_index['order'][lo:hi]
+    return np.sort(x_index['order'][lo:hi])
+
+def is_monotonic_numeric_x(df, x_column, data_source=None):
+    """X列是否为单调递增的数值列（此时范围选择按X值保存，否则按行号保存）"""
+    if x_column not in df.columns or not pd.api.types.is_numeric_dtype(df[x_column]) or pd.api.types.is_bool_dtype(df[x_column]):
+        return False
+    col_stats = get_column_stats(data_source, x_column)
+    if col_stats is not None:
+        return col_stats['monotonic']
+    return get_x_range_index(df, x_column, data_source)['monotonic']
+
+def range_to_rows(original_df, x_column, range_start, range_end, use_index_range=False, data_source=None, sort_by_x=False):
+    """
+    把已确认的数据范围转换为行选择
+    
+    Args:
+        use_index_range: 为True时 range_start/range_end 是行号，否则是数值X列的取值范围
+        sort_by_x: 按X值范围取行时，为True则行号按X值排序返回
+    
+    Returns:
+        slice 或行号数组；范围无效时为全部行
+    """
+    if use_index_range:
+        # 使用行索引范围
+        range_start = int(range_start)
+        range_end = int(range_end)
+        if range_start >= 0 and range_end < len(original_df) and range_start <= range_end:
+            return slice(range_start, range_end + 1)
+    elif x_column is not None and x_column in original_df.columns:
+        # 使用X轴值范围（数值型X轴）：在有序索引上二分定位，需要排序时直接按X顺序取行
+        return x_range_to_rows(get_x_range_index(original_df, x_column, data_source), range_start, range_end, sort_by_x)
+    return slice(None)
+
+def row_index_dtype(num_rows):
+    """行号数组的整数类型：能放下时用int32，序列化给前端的体积减半"""
+    return np.int32 if num_rows < np.iinfo(np.int32).max else np.int64
+
 def prepare_plot_data(original_df, selections, list_columns_info, data_source=None, 
                       use_downsample=False, x_column=None, y_columns=None,
-                      range_start=None, range_end=None, use_index_range=False, downsample_ratio=100):
+                      range_start=None, range_end=None, use_index_range=False, downsample_ratio=100,
+                      sort_by_x=False):
     """
-    准备绘图数据（按需展开列表列，支持降采样和范围过滤）
+    准备绘图数据（只投影X列和选中的Y列，按需展开列表列，支持降采样、范围过滤和按X排序）
     
     Args:
         original_df: 原始DataFrame
@@ -1515,56 +3270,62 @@ def prepare_plot_data(original_df, selections, list_columns_info, data_source=No
         range_start: 范围起始值（基于x_column的值或行索引）
         range_end: 范围结束值（基于x_column的值或行索引）
         use_index_range: 是否使用行索引范围（当X轴非数值型时）
+        sort_by_x: 是否按X轴排序（数值X列直接使用缓存的排序置换，X已单调时跳过）
     
     Returns:
-        tuple: (合并后的DataFrame，原始索引列表)
+        tuple: (合并后的DataFrame，原始行号数组（int32/int64）)
     """
-    # 如果指定了范围，先进行范围过滤
+    x_stats = get_column_stats(data_source, x_column)
+    x_is_numeric = (x_column is not None and x_column in original_df.columns and
+                    pd.api.types.is_numeric_dtype(original_df[x_column]) and
+                    not pd.api.types.is_bool_dtype(original_df[x_column]))
+    # X已单调递增时任何行子集都已有序，无需排序
+    x_sorted = x_stats is not None and x_stats['monotonic']
+    
+    # 如果指定了范围，先确定范围内的行（切片或行号数组），不复制整表
+    rows = slice(None)
     if range_start is not None and range_end is not None:
-        if use_index_range:
-            # 使用行索引范围
-            range_start = int(range_start)
-            range_end = int(range_end)
-            if range_start >= 0 and range_end < len(original_df) and range_start <= range_end:
-                result_df = original_df.iloc[range_start:range_end + 1].copy()
-                original_indices = list(range(range_start, range_end + 1))
-            else:
-                result_df = original_df.copy()
-                original_indices = list(range(len(original_df)))
-        elif x_column is not None and x_column in original_df.columns:
-            # 使用X轴值范围（数值型X轴）
-            mask = (original_df[x_column] >= range_start) & (original_df[x_column] <= range_end)
-            result_df = original_df[mask].copy()
-            original_indices = original_df[mask].index.tolist()
-        else:
-            result_df = original_df.copy()
-            original_indices = list(range(len(original_df)))
-    else:
-        result_df = original_df.copy()
-        original_indices = list(range(len(original_df)))
+        rows = range_to_rows(original_df, x_column, range_start, range_end, use_index_range, data_source, sort_by_x)
+        # 按X值范围取行时，需要排序的行已按X顺序返回
+        x_sorted = x_sorted or (sort_by_x and not use_index_range and x_column in original_df.columns)
+    elif sort_by_x and x_is_numeric and not use_downsample and not x_sorted:
+        # 整列按X排序：直接使用缓存的排序置换
+        rows = get_x_range_index(original_df, x_column, data_source)['order']
+        x_sorted = True
+    
+    # 只投影图表用到的列（X列 + 选中的普通Y列），先按行取再转换：切片为视图，行号数组只复制选中的行，不物化整列
+    needed_columns = [x_column] if x_column is not None else []
+    needed_columns += selections.get('normal', [])
+    needed_columns = [col for col in dict.fromkeys(needed_columns) if col in original_df.columns]
+    row_labels = original_df.index[rows]
+    result_df = pd.DataFrame(
+        {col: original_df[col].array[rows] for col in needed_columns},
+        index=row_labels,
+        copy=False
+    )
+    original_indices = row_labels.to_numpy().astype(row_index_dtype(len(original_df)), copy=False)
     
     # 按需展开选中的列表列通道
     for list_col, channel_indices in selections.get('list_columns', {}).items():
         if not channel_indices:
             continue
             
-        # 检查缓存（包含数据源信息）
+        # 检查缓存（包含数据源信息）；缓存的是整列展开结果，范围过滤时按行取出
         cache_key = f"{data_source}_{list_col}_{'_'.join(map(str, sorted(channel_indices)))}" if data_source else f"{list_col}_{'_'.join(map(str, sorted(channel_indices)))}"
+        touch_session_cache('expanded', cache_key)
         if cache_key not in st.session_state.expanded_list_columns:
             # 展开列表列
-            expanded_df = expand_list_column_lazy(result_df, list_col, channel_indices, data_source)
+            expanded_df = expand_list_column_lazy(original_df, list_col, channel_indices, data_source)
             st.session_state.expanded_list_columns[cache_key] = expanded_df
         else:
             expanded_df = st.session_state.expanded_list_columns[cache_key]
-            # 如果进行了范围过滤，需要重新提取对应行
-            if range_start is not None and range_end is not None:
-                expanded_df = expand_list_column_lazy(result_df, list_col, channel_indices, data_source)
         
         # 合并到结果DataFrame
         for col in expanded_df.columns:
-            result_df[col] = expanded_df[col]
+            result_df[col] = expanded_df[col].array[rows]
     
     # 如果使用降采样且数据量大（并且没有指定范围）
+    downsampled = False
     target_points = max(1000, len(result_df) // downsample_ratio)  # 根据倍数计算目标点数
     if use_downsample and len(result_df) > target_points and range_start is None and range_end is None:
         if x_column and y_columns:
@@ -1573,17 +3334,226 @@ def prepare_plot_data(original_df, selections, list_columns_info, data_source=No
                 # 使用LTTB算法降采样
                 result_df = lttb_downsample(result_df, x_column, y_columns, target_points)
                 # 更新原始索引以匹配降采样后的数据
-                original_indices = result_df.index.tolist()
+                original_indices = np.arange(len(result_df), dtype=row_index_dtype(len(result_df)))
             else:
                 # X轴不是数值类型，使用简单降采样
                 result_df = simple_downsample(result_df, target_points)
                 # 更新原始索引以匹配降采样后的数据
-                original_indices = result_df.index.tolist()
+                original_indices = np.arange(len(result_df), dtype=row_index_dtype(len(result_df)))
+            downsampled = True
+    
+    # 时间类X列（数值时间戳转北京时间、日期时间字符串按推断格式解析）转换为 datetime：
+    # 原始数据直接按行取整列转换缓存，降采样结果点数少，直接转换
+    if x_column in result_df.columns and needs_datetime_conversion(result_df[x_column], x_stats):
+        if downsampled:
+            result_df[x_column] = convert_x_to_datetime(result_df[x_column], x_stats)
+        else:
+            result_df[x_column] = get_time_x_column(original_df, x_column, x_stats, data_source)[rows]
+    
+    # 其余需要排序的情况（行号范围、降采样结果、非数值X）：只对已选出的少量行排序
+    if sort_by_x and not x_sorted and x_column in result_df.columns:
+        sort_order = result_df[x_column].argsort(kind='stable').to_numpy()
+        result_df = result_df.iloc[sort_order]
+        original_indices = original_indices[sort_order]
     
     return result_df, original_indices
 
-def create_plotly_chart_overlay(chart_config, data, original_indices=None):
-    """创建重叠模式的Plotly图表 - 多条曲线，每条独立Y轴"""
+TIME_RESAMPLE_INTERVALS = {  # 时间重采样的区间（毫秒），None 为不重采样
+    '不重采样': None,
+    '1秒': 1000,
+    '10秒': 10000,
+    '1分钟': 60000,
+    '10分钟': 600000,
+    '1小时': 3600000,
+    '1天': 86400000,
+}
+TIME_RESAMPLE_AGGS = {'mean': '均值', 'min': '最小值', 'max': '最大值', 'band': '均值 + 最小/最大值带'}
+
+def is_time_x_column(data_source, x_column):
+    """X列是否为时间列（数值时间戳或日期时间），时间列才能按时间桶重采样"""
+    x_stats = get_column_stats(data_source, x_column)
+    return x_stats is not None and x_stats.get('ts_type') is not None
+
+def get_full_column_values(original_df, column, data_source=None):
+    """整列数值：普通列直接取，列表列通道（'列名 #n'）从解析缓存中取对应的一列"""
+    if column in original_df.columns:
+        return original_df[column].to_numpy()
+    list_col, _, channel = column.rpartition(' #')
+    return get_parsed_list_array(original_df, list_col, data_source)[:, int(channel) - 1]
+
+def get_time_bucket_aggregates(original_df, x_column, y_columns, interval_ms, data_source=None):
+    """
+    按时间桶聚合Y列：X转换为毫秒时间戳后整除区间长度得到 int64 桶号，一次向量化 groupby 得到每桶的均值/最小值/最大值
+    
+    结果按（文件、X列、区间）缓存，已聚合过的Y列直接复用，切换回用过的区间时无需重新计算。
+    
+    Returns:
+        dict: {'num_rows', 'bucket_ms': 桶起点（毫秒时间戳）, 'first_row': 每桶第一行的行号,
+               'columns': {Y列: {'mean', 'min', 'max'}}}
+    """
+    cache_key = f"{data_source}_{x_column}_{interval_ms}"
+    entry = None
+    if data_source:
+        touch_session_cache('time_bucket', cache_key)
+        entry = st.session_state.time_buckets.get(cache_key)
+        if entry is not None and entry['num_rows'] != len(original_df):
+            entry = None
+    missing_columns = [col for col in y_columns if entry is None or col not in entry['columns']]
+    if entry is not None and not missing_columns:
+        return entry
+    
+    x_stats = get_column_stats(data_source, x_column)
+    times = get_time_x_column(original_df, x_column, x_stats, data_source).astype('datetime64[ms]')
+    valid = ~np.isnat(times)
+    codes, buckets = pd.factorize(times[valid].view(np.int64) // interval_ms, sort=True)
+    if entry is None:
+        entry = {
+            'num_rows': len(original_df),
+            'bucket_ms': buckets * interval_ms,
+            'first_row': pd.Series(np.flatnonzero(valid)).groupby(codes).min().to_numpy(),
+            'columns': {}
+        }
+    
+    if missing_columns:
+        values = pd.DataFrame({col: get_full_column_values(original_df, col, data_source)[valid] for col in missing_columns})
+        aggregates = values.groupby(codes).agg(['mean', 'min', 'max'])
+        for col in missing_columns:
+            entry['columns'][col] = {agg: aggregates[(col, agg)].to_numpy() for agg in ('mean', 'min', 'max')}
+    
+    if data_source:
+        st.session_state.time_buckets[cache_key] = entry
+    return entry
+
+def prepare_resampled_data(original_df, chart_config, data_source=None, range_start=None, range_end=None, use_index_range=False):
+    """
+    准备按时间桶重采样的绘图数据（代替降采样，点数 = 时间桶数）
+    
+    有已确认的数据范围时只保留范围内时间跨度上的桶。
+    
+    Returns:
+        tuple: (DataFrame（X为桶起点，Y为所选聚合值）, 每桶第一行的行号, 包络带 {Y列: (最小值, 最大值)} 或 None)
+    """
+    x_column = chart_config['x_column']
+    interval_ms = chart_config['time_resample_interval']
+    aggregation = chart_config.get('time_resample_agg', 'mean')
+    y_columns = [col for col in dict.fromkeys(chart_config.get('y1_columns', []) + chart_config.get('y2_columns', []))
+                 if col != x_column and (col not in original_df.columns or
+                                         (pd.api.types.is_numeric_dtype(original_df[col]) and
+                                          not pd.api.types.is_bool_dtype(original_df[col])))]
+    entry = get_time_bucket_aggregates(original_df, x_column, y_columns, interval_ms, data_source)
+    
+    keep = slice(None)
+    if range_start is not None and range_end is not None:
+        rows = range_to_rows(original_df, x_column, range_start, range_end, use_index_range, data_source)
+        x_stats = get_column_stats(data_source, x_column)
+        range_times = pd.Series(get_time_x_column(original_df, x_column, x_stats, data_source)[rows])
+        if range_times.notna().any():
+            low_ms = range_times.min().value // 1_000_000 // interval_ms * interval_ms
+            high_ms = range_times.max().value // 1_000_000
+            keep = (entry['bucket_ms'] >= low_ms) & (entry['bucket_ms'] <= high_ms)
+    
+    value_key = 'mean' if aggregation == 'band' else aggregation
+    plot_data = pd.DataFrame({x_column: entry['bucket_ms'][keep].astype('datetime64[ms]')})
+    for col in y_columns:
+        plot_data[col] = entry['columns'][col][value_key][keep]
+    envelopes = None
+    if aggregation == 'band':
+        envelopes = {col: (pd.Series(entry['columns'][col]['min'][keep]), pd.Series(entry['columns'][col]['max'][keep]))
+                     for col in y_columns}
+    original_indices = entry['first_row'][keep].astype(row_index_dtype(len(original_df)))
+    return plot_data, original_indices, envelopes
+
+def row_bucket_aggregates(values, starts):
+    """
+    按连续行块一次向量化求每块的均值、最小值和最大值（忽略NaN，整块缺失时为NaN）
+    
+    Args:
+        values: 一维数值数组
+        starts: 每块起始行号（升序）
+    """
+    values = values.astype(np.float64, copy=False)
+    missing = np.isnan(values)
+    counts = np.add.reduceat((~missing).astype(np.int64), starts)
+    sums = np.add.reduceat(np.where(missing, 0.0, values), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    return means, np.fmin.reduceat(values, starts), np.fmax.reduceat(values, starts)
+
+def prepare_envelope_data(original_df, chart_config, data_source=None, downsample_ratio=100):
+    """
+    准备带最小/最大值包络的降采样预览：整列按行均分为与降采样相同数量的块，每块取均值作为曲线、最小/最大值作为包络带
+    
+    与只保留部分点的降采样不同，每块内的峰峰值都会体现在包络带上。
+    
+    Returns:
+        tuple: (DataFrame（X为每块第一行的X值，Y为块均值）, 每块第一行的行号, 包络带 {Y列: (最小值, 最大值)})
+    """
+    num_rows = len(original_df)
+    num_buckets = min(num_rows, max(1000, num_rows // downsample_ratio))
+    starts = np.unique(np.linspace(0, num_rows, num_buckets, endpoint=False).astype(np.int64))
+    
+    x_column = chart_config['x_column']
+    plot_data = pd.DataFrame(index=pd.RangeIndex(len(starts)))
+    if not chart_config.get('use_index_as_x', False) and x_column in original_df.columns:
+        x_stats = get_column_stats(data_source, x_column)
+        if needs_datetime_conversion(original_df[x_column], x_stats):
+            plot_data[x_column] = get_time_x_column(original_df, x_column, x_stats, data_source)[starts]
+        else:
+            plot_data[x_column] = original_df[x_column].array[starts]
+    
+    envelopes = {}
+    for col in dict.fromkeys(chart_config.get('y1_columns', []) + chart_config.get('y2_columns', [])):
+        if col == x_column or (col in original_df.columns and (not pd.api.types.is_numeric_dtype(original_df[col])
+                                                              or pd.api.types.is_bool_dtype(original_df[col]))):
+            continue
+        means, lows, highs = row_bucket_aggregates(get_full_column_values(original_df, col, data_source), starts)
+        plot_data[col] = means
+        envelopes[col] = (pd.Series(lows), pd.Series(highs))
+    return plot_data, starts.astype(row_index_dtype(num_rows)), envelopes
+
+def line_trace_class(total_points):
+    """
+    选择折线的trace类型：总点数超过阈值时用WebGL（Scattergl），避免SVG路径在十万级点数下卡死浏览器
+    
+    Args:
+        total_points: 图表中所有曲线的点数之和
+    """
+    return go.Scattergl if total_points > st.session_state.webgl_line_threshold else go.Scatter
+
+
+def add_envelope_traces(fig, trace_class, x_data, envelope, color, yaxis, y_col, hover_format, decimal_places=2, col_stats=None):
+    """
+    在曲线下方添加最小/最大值包络带：先画下界，上界用 fill='tonexty' 填充到下界，两条边界线本身不可见
+    
+    Args:
+        trace_class: 与主曲线相同的trace类型（tonexty 只在同类型的相邻trace之间填充）
+        envelope: (下界, 上界) 两个 Series
+        color: 主曲线颜色（十六进制），包络带用同色半透明填充
+    """
+    red, green, blue = plotly.colors.hex_to_rgb(color)
+    fill_color = f'rgba({red}, {green}, {blue}, 0.25)'
+    for bound, label, fill in ((envelope[0], '最小值', 'none'), (envelope[1], '最大值', 'tonexty')):
+        fig.add_trace(trace_class(
+            x=x_data,
+            y=compact_plot_array(bound, decimal_places, col_stats),
+            mode='lines',
+            name=f'{y_col} {label}',
+            yaxis=yaxis,
+            line=dict(color=color, width=0),
+            fill=fill,
+            fillcolor=fill_color,
+            legendgroup=y_col,
+            showlegend=False,
+            hovertemplate=f'{y_col} {label}: %{{y{hover_format}}}<extra></extra>'
+        ))
+
+
+def create_plotly_chart_overlay(chart_config, data, original_indices=None, column_stats=None, envelopes=None):
+    """
+    创建重叠模式的Plotly图表 - 多条曲线，每条独立Y轴（column_stats 为数据源的列统计目录）
+    
+    envelopes 为 {Y列: (最小值, 最大值)} 时，在对应曲线下方绘制最小/最大值包络带
+    """
     
     # 获取所有Y列（不区分Y1和Y2）
     all_y_columns = chart_config.get('y1_columns', []) + chart_config.get('y2_columns', [])
@@ -1592,8 +3562,8 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
         # 没有Y列，返回空图
         return go.Figure(), {}
     
-    # 复制数据以避免修改原始数据
-    data = data.copy()
+    # 浅拷贝：只复制列容器，下面替换X列（时间戳转换、排序）时不影响调用方的数据
+    data = data.copy(deep=False)
     
     # 是否使用索引作为X轴
     use_index_as_x = chart_config.get('use_index_as_x', False)
@@ -1609,7 +3579,8 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
         # 使用索引作为X轴，不需要时间戳检测
         x_axis_title = 'Index'
     elif x_column in data.columns:
-        ts_type = detect_timestamp_type(data[x_column])
+        x_stats = (column_stats or {}).get(x_column)
+        ts_type = x_stats['ts_type'] if x_stats is not None else detect_timestamp_type(data[x_column])
         if ts_type:
             # 只有数值时间戳才需要转换为北京时间
             if ts_type in ('10digit', '10digit_ms', '13digit'):
@@ -1617,12 +3588,7 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
             x_tickformat, x_hoverformat = get_timestamp_format(ts_type)
         x_axis_title = x_column + (' (北京时间)' if ts_type else '')
     
-    # 按X轴排序（如果启用，且不使用索引作为X轴）
-    if not use_index_as_x and chart_config.get('sort_by_x', False) and x_column in data.columns:
-        sort_order = data[x_column].argsort()
-        data = data.iloc[sort_order].reset_index(drop=True)
-        if original_indices is not None:
-            original_indices = [original_indices[i] for i in sort_order]
+    # 按X轴排序（sort_by_x）已在 prepare_plot_data 中用缓存的排序置换完成
     
     # 获取配置
     decimal_places = chart_config.get('decimal_places', 4)
@@ -1637,7 +3603,11 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
     if original_indices is not None:
         row_indices = original_indices
     else:
-        row_indices = data.index.tolist()
+        row_indices = np.arange(len(data), dtype=row_index_dtype(len(data)))
+    
+    # 折线点数过多时改用WebGL渲染（每条曲线的独立Y轴同样适用，包络带的上下界各计一条）
+    envelopes = envelopes or {}
+    line_trace = line_trace_class(len(data) * (len([col for col in all_y_columns if col in data.columns]) + 2 * len(envelopes)))
     
     # 定义高辨识度的颜色序列（最多支持10条曲线）
     color_palette = [
@@ -1661,15 +3631,21 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
     tick_font_size = 9  # 刻度字号
     
     # 自适应轴间距：根据刻度数字最长位数计算
-    # 一次性筛选出所有数值型Y列，向量化计算最大绝对值
+    # 文件中的列直接用列统计目录的最小/最大值，其余列（展开的列表通道）向量化计算最大绝对值
     numeric_y_cols = [col for col in all_y_columns if col in data.columns and pd.api.types.is_numeric_dtype(data[col])]
-    if numeric_y_cols:
+    max_abs_value = 0
+    uncached_cols = []
+    for col in numeric_y_cols:
+        col_stats = (column_stats or {}).get(col)
+        if col_stats is not None and col_stats['min'] is not None:
+            max_abs_value = max(max_abs_value, abs(col_stats['min']), abs(col_stats['max']))
+        else:
+            uncached_cols.append(col)
+    if uncached_cols:
         # pandas 向量化操作：一次性计算所有列的绝对值最大值
-        max_abs_value = data[numeric_y_cols].abs().max().max()
-        if pd.isna(max_abs_value):
-            max_abs_value = 0
-    else:
-        max_abs_value = 0
+        uncached_max = data[uncached_cols].abs().max().max()
+        if not pd.isna(uncached_max):
+            max_abs_value = max(max_abs_value, uncached_max)
     
     # 计算整数位数
     if max_abs_value > 0:
@@ -1702,13 +3678,13 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
         
         # 准备数据
         if use_index_as_x:
-            x_data = list(range(len(data)))
+            x_data = np.arange(len(data), dtype=row_index_dtype(len(data)))
         else:
-            x_data = data[chart_config['x_column']]
-        y_data = data[y_col]
+            x_data = get_x_plot_values(data, chart_config['x_column'])
+        y_data = compact_plot_array(data[y_col], decimal_places, (column_stats or {}).get(y_col))
         
         # 检测数据类型
-        is_numeric = pd.api.types.is_numeric_dtype(y_data)
+        is_numeric = pd.api.types.is_numeric_dtype(data[y_col])
         if is_numeric:
             y_hover = f'%{{y{hover_format}}}'
         else:
@@ -1720,9 +3696,15 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
         else:
             hover_template = f'<b>{y_col}</b>: {y_hover}<extra></extra>'
         
+        # 包络带画在曲线下方
+        if y_col in envelopes:
+            add_envelope_traces(fig, line_trace if chart_config['chart_type'] == '折线图' else go.Scattergl, x_data,
+                                envelopes[y_col], color, yaxis_ref, y_col, hover_format, decimal_places,
+                                (column_stats or {}).get(y_col))
+        
         # 添加曲线
         if chart_config['chart_type'] == '折线图':
-            trace = go.Scatter(
+            trace = line_trace(
                 x=x_data,
                 y=y_data,
                 mode='lines',
@@ -1815,9 +3797,11 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
         'hoverformat': x_hoverformat,  # 时间戳用日期格式，否则用数字格式
         'domain': [domain_left, domain_right]  # 动态计算的作图区域
     }
-    # 如果是时间戳，添加 tickformat
+    # 如果是时间戳，添加 tickformat；X值以毫秒时间戳发送，坐标轴按日期显示
     if x_tickformat:
         xaxis_config['tickformat'] = x_tickformat
+    if ts_type:
+        xaxis_config['type'] = 'date'
     
     # 配置所有Y轴（设置空title避免"click to enter"提示）
     layout_update = {'xaxis': xaxis_config}
@@ -1928,11 +3912,15 @@ def create_plotly_chart_overlay(chart_config, data, original_indices=None):
     return fig, config
 
 
-def create_plotly_chart(chart_config, data, original_indices=None):
-    """根据配置创建Plotly图表"""
+def create_plotly_chart(chart_config, data, original_indices=None, column_stats=None, envelopes=None):
+    """
+    根据配置创建Plotly图表（column_stats 为数据源的列统计目录）
     
-    # 复制数据以避免修改原始数据
-    data = data.copy()
+    envelopes 为 {Y列: (最小值, 最大值)} 时，在对应曲线下方绘制同色的最小/最大值包络带
+    """
+    
+    # 浅拷贝：只复制列容器，下面替换X列（时间戳转换、排序）时不影响调用方的数据
+    data = data.copy(deep=False)
     
     # 是否使用索引作为X轴
     use_index_as_x = chart_config.get('use_index_as_x', False)
@@ -1948,7 +3936,8 @@ def create_plotly_chart(chart_config, data, original_indices=None):
         # 使用索引作为X轴，不需要时间戳检测
         x_axis_title = 'Index'
     elif x_column in data.columns:
-        ts_type = detect_timestamp_type(data[x_column])
+        x_stats = (column_stats or {}).get(x_column)
+        ts_type = x_stats['ts_type'] if x_stats is not None else detect_timestamp_type(data[x_column])
         if ts_type:
             # 只有数值时间戳才需要转换为北京时间
             if ts_type in ('10digit', '10digit_ms', '13digit'):
@@ -1956,12 +3945,7 @@ def create_plotly_chart(chart_config, data, original_indices=None):
             x_tickformat, x_hoverformat = get_timestamp_format(ts_type)
         x_axis_title = x_column + (' (北京时间)' if ts_type else '')
     
-    # 按X轴排序（如果启用，且不使用索引作为X轴）
-    if not use_index_as_x and chart_config.get('sort_by_x', False) and x_column in data.columns:
-        sort_order = data[x_column].argsort()
-        data = data.iloc[sort_order].reset_index(drop=True)
-        if original_indices is not None:
-            original_indices = [original_indices[i] for i in sort_order]
+    # 按X轴排序（sort_by_x）已在 prepare_plot_data 中用缓存的排序置换完成
     
     # 判断是否有双y轴
     y1_columns = chart_config.get('y1_columns', [])
@@ -1986,7 +3970,15 @@ def create_plotly_chart(chart_config, data, original_indices=None):
     if original_indices is not None:
         row_indices = original_indices
     else:
-        row_indices = data.index.tolist()
+        row_indices = np.arange(len(data), dtype=row_index_dtype(len(data)))
+    
+    # 折线点数过多时改用WebGL渲染（包络带的上下界各计一条）
+    envelopes = envelopes or {}
+    line_trace = line_trace_class(len(data) * (len([col for col in y1_columns + y2_columns if col in data.columns]) + 2 * len(envelopes)))
+    point_trace = line_trace if chart_config['chart_type'] == '折线图' else go.Scattergl
+    # 有包络带时显式指定曲线颜色（按默认配色顺序），包络带与曲线同色
+    colorway = plotly.colors.qualitative.Plotly
+    series_count = 0
     
     # 添加Y1轴的曲线
     is_first_trace = True
@@ -1996,13 +3988,13 @@ def create_plotly_chart(chart_config, data, original_indices=None):
         
         # 根据配置获取X轴数据
         if use_index_as_x:
-            x_data = list(range(len(data)))
+            x_data = np.arange(len(data), dtype=row_index_dtype(len(data)))
         else:
-            x_data = data[chart_config['x_column']]
-        y_data = data[y_col]
+            x_data = get_x_plot_values(data, chart_config['x_column'])
+        y_data = compact_plot_array(data[y_col], decimal_places, (column_stats or {}).get(y_col))
         
         # 检测y数据类型，如果是字符串类型则不使用数值格式化
-        is_numeric = pd.api.types.is_numeric_dtype(y_data)
+        is_numeric = pd.api.types.is_numeric_dtype(data[y_col])
         if is_numeric:
             y_hover = f'%{{y{hover_format}}}'
         else:
@@ -2015,8 +4007,15 @@ def create_plotly_chart(chart_config, data, original_indices=None):
         else:
             hover_template = f'<b>{y_col}</b>: {y_hover}<extra></extra>'
         
+        # 包络带画在曲线下方
+        color = colorway[series_count % len(colorway)]
+        series_count += 1
+        if y_col in envelopes:
+            add_envelope_traces(fig, point_trace, x_data, envelopes[y_col], color, 'y', y_col, hover_format,
+                                decimal_places, (column_stats or {}).get(y_col))
+        
         if chart_config['chart_type'] == '折线图':
-            trace = go.Scatter(
+            trace = line_trace(
                 x=x_data,
                 y=y_data,
                 mode='lines',
@@ -2035,6 +4034,8 @@ def create_plotly_chart(chart_config, data, original_indices=None):
                 customdata=row_indices,
                 hovertemplate=hover_template
             )
+        if y_col in envelopes:
+            trace.update(line_color=color, marker_color=color, legendgroup=y_col)
         
         fig.add_trace(trace)
     
@@ -2045,13 +4046,13 @@ def create_plotly_chart(chart_config, data, original_indices=None):
         
         # 根据配置获取X轴数据
         if use_index_as_x:
-            x_data = list(range(len(data)))
+            x_data = np.arange(len(data), dtype=row_index_dtype(len(data)))
         else:
-            x_data = data[chart_config['x_column']]
-        y_data = data[y_col]
+            x_data = get_x_plot_values(data, chart_config['x_column'])
+        y_data = compact_plot_array(data[y_col], decimal_places, (column_stats or {}).get(y_col))
         
         # 检测y数据类型，如果是字符串类型则不使用数值格式化
-        is_numeric = pd.api.types.is_numeric_dtype(y_data)
+        is_numeric = pd.api.types.is_numeric_dtype(data[y_col])
         if is_numeric:
             y_hover = f'%{{y{hover_format}}}'
         else:
@@ -2064,8 +4065,15 @@ def create_plotly_chart(chart_config, data, original_indices=None):
         else:
             hover_template = f'<b>{y_col}</b>: {y_hover}<extra></extra>'
         
+        # 包络带画在曲线下方
+        color = colorway[series_count % len(colorway)]
+        series_count += 1
+        if y_col in envelopes:
+            add_envelope_traces(fig, point_trace, x_data, envelopes[y_col], color, 'y2', y_col, hover_format,
+                                decimal_places, (column_stats or {}).get(y_col))
+        
         if chart_config['chart_type'] == '折线图':
-            trace = go.Scatter(
+            trace = line_trace(
                 x=x_data,
                 y=y_data,
                 mode='lines',
@@ -2084,6 +4092,8 @@ def create_plotly_chart(chart_config, data, original_indices=None):
                 customdata=row_indices,
                 hovertemplate=hover_template
             )
+        if y_col in envelopes:
+            trace.update(line_color=color, marker_color=color, legendgroup=y_col)
         
         fig.add_trace(trace)
     
@@ -2103,9 +4113,11 @@ def create_plotly_chart(chart_config, data, original_indices=None):
         'separatethousands': True,  # 千位分隔符
         'hoverformat': x_hoverformat  # 时间戳用日期格式，否则用数字格式
     }
-    # 如果是时间戳，添加 tickformat
+    # 如果是时间戳，添加 tickformat；X值以毫秒时间戳发送，坐标轴按日期显示
     if x_tickformat:
         xaxis_config['tickformat'] = x_tickformat
+    if ts_type:
+        xaxis_config['type'] = 'date'
     
     layout_config = {
         'title': {
@@ -2170,10 +4182,107 @@ def create_plotly_chart(chart_config, data, original_indices=None):
         }
     }
     
-    return fig, config
+    return fig, config
+
+def get_sorted_histogram_values(series, cache_key=None):
+    """
+    直方图用的升序数值（已去掉缺失值），排序一次后改变分箱数只需二分查找
+    
+    Args:
+        series: 数值列
+        cache_key: 缓存键 f"{文件}_{数据选择}_{列}"，为None时不缓存
+    """
+    if cache_key is not None and cache_key in st.session_state.histogram_values:
+        touch_session_cache('histogram', cache_key)
+        return st.session_state.histogram_values[cache_key]
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    sorted_values = np.sort(values[~np.isnan(values)])
+    if cache_key is not None:
+        st.session_state.histogram_values[cache_key] = sorted_values
+        touch_session_cache('histogram', cache_key)
+    return sorted_values
+
+def bin_sorted_values(sorted_values, edges):
+    """已排序数值的分箱计数：每条分箱边界二分定位，O(分箱数 × log n)；最后一个分箱包含右端点（与 np.histogram 一致）"""
+    positions = np.searchsorted(sorted_values, edges, side='left')
+    positions[-1] = np.searchsorted(sorted_values, edges[-1], side='right')
+    return np.diff(positions)
+
+HIST_RANGE_OPTIONS = {  # 直方图分箱范围：全部数据，或按百分位数截去两端的离群值
+    '全部数据（最小值 ~ 最大值）': None,
+    'p0.1 ~ p99.9': [0.1, 99.9],
+    'p1 ~ p99': [1, 99],
+    'p5 ~ p95': [5, 95],
+}
+PERCENTILE_TABLE_POINTS = [0.1, 1, 5, 25, 50, 75, 95, 99, 99.9]  # 百分位数汇总表的列
+
+def sorted_percentiles(sorted_values, percentiles):
+    """已排序数值的精确百分位数（线性插值，与 np.percentile 一致），O(1) 取值"""
+    positions = np.asarray(percentiles, dtype=np.float64) / 100 * (len(sorted_values) - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (positions - lower)
+
+def get_column_sketch(file_info, column):
+    """
+    整列的分位数草图（加载时构建）；跟随模式追加、尚未并入草图的尾部行在这里现建草图后合并
+    
+    Returns:
+        dict: {'count', 'quantiles'}，该列没有草图（列表列通道、非数值列等）时返回 None
+    """
+    data = file_info['data']
+    if column not in data.columns:
+        return None
+    sketch = (file_info.get('column_sketches') or {}).get(column)
+    sketch_rows = file_info.get('follow', {}).get('sketch_rows', len(data))
+    if sketch_rows < len(data):
+        sketch = merge_quantile_sketches([sketch, build_quantile_sketch(data[column].iloc[sketch_rows:])])
+    return sketch
+
+def column_percentiles(y_col, data, percentiles, values_cache_key=None, sketch_source=None):
+    """
+    某列的百分位数：sketch_source 为数据源名称时读整列的分位数草图（大文件或降采样视图，无需排序），
+    该列没有草图或只绘制部分范围时用排序数值缓存精确计算
+    
+    Returns:
+        tuple: (百分位数数组, 样本数)，没有有效数值时返回 (None, 0)
+    """
+    if sketch_source is not None:
+        sketch = get_column_sketch(st.session_state.files_data[sketch_source], y_col)
+        if sketch is not None:
+            return sketch_percentiles(sketch, percentiles), sketch['count']
+    sorted_values = get_sorted_histogram_values(
+        data[y_col], f"{values_cache_key}_{y_col}" if values_cache_key is not None else None
+    )
+    if len(sorted_values) == 0:
+        return None, 0
+    return sorted_percentiles(sorted_values, percentiles), len(sorted_values)
+
+def compute_percentile_table(chart_config, data, values_cache_key=None, sketch_source=None):
+    """直方图各特征的百分位数汇总表（最小值、PERCENTILE_TABLE_POINTS、最大值）"""
+    rows = []
+    for y_col in chart_config.get('y1_columns', []) + chart_config.get('y2_columns', []):
+        if y_col not in data.columns or not pd.api.types.is_numeric_dtype(data[y_col]):
+            continue
+        values, count = column_percentiles(y_col, data, [0] + PERCENTILE_TABLE_POINTS + [100], values_cache_key, sketch_source)
+        if values is None:
+            continue
+        row = {'特征': y_col, '样本数': count, '最小值': values[0]}
+        row.update({f'p{point:g}': value for point, value in zip(PERCENTILE_TABLE_POINTS, values[1:-1])})
+        row['最大值'] = values[-1]
+        rows.append(row)
+    return pd.DataFrame(rows)
 
-def create_plotly_histogram(chart_config, data, chart_idx):
-    """创建直方图，支持多特征叠加显示"""
+def create_plotly_histogram(chart_config, data, chart_idx, values_cache_key=None, sketch_source=None):
+    """
+    创建直方图，支持多特征叠加显示
+    
+    分箱计数在服务端完成，只把每个分箱的柱子发送给前端，不再发送全部样本。
+    
+    Args:
+        values_cache_key: 排序数值缓存键的前缀（文件名 + 数据选择），为None时不缓存
+        sketch_source: 大文件或降采样视图未限定范围时传入数据源名称，按百分位数截取分箱范围时读整列的分位数草图
+    """
     
     # 获取所有Y列（直方图模式下不区分Y1和Y2）
     all_y_columns = chart_config.get('y1_columns', []) + chart_config.get('y2_columns', [])
@@ -2222,66 +4331,77 @@ def create_plotly_histogram(chart_config, data, chart_idx):
     # 创建图表
     fig = go.Figure()
     
-    # 收集所有数据的范围，用于统一bin范围
+    # 收集所有数据的范围，用于统一bin范围（排序后首尾即最小/最大值）
     all_data_min = float('inf')
     all_data_max = float('-inf')
-    valid_columns = []
+    sorted_columns = {}
     
     for y_col in all_y_columns:
         if y_col not in data.columns:
             continue
-        y_data = data[y_col].dropna()
-        if len(y_data) == 0:
+        if not pd.api.types.is_numeric_dtype(data[y_col]):
             continue
-        if not pd.api.types.is_numeric_dtype(y_data):
+        sorted_values = get_sorted_histogram_values(
+            data[y_col], f"{values_cache_key}_{y_col}" if values_cache_key is not None else None
+        )
+        if len(sorted_values) == 0:
             continue
-        valid_columns.append(y_col)
-        all_data_min = min(all_data_min, y_data.min())
-        all_data_max = max(all_data_max, y_data.max())
+        sorted_columns[y_col] = sorted_values
+        all_data_min = min(all_data_min, sorted_values[0])
+        all_data_max = max(all_data_max, sorted_values[-1])
     
-    if len(valid_columns) == 0:
+    if len(sorted_columns) == 0:
         st.warning("⚠️ 没有可绘制的数值型列")
         return go.Figure(), {}
     
-    # 计算bin大小
-    data_range = all_data_max - all_data_min
-    if data_range == 0:
-        data_range = 1
-    bin_size = data_range / num_bins
+    # 按百分位数截取分箱范围，避免个别离群值把分布压缩到少数几个分箱里（范围外的样本不计入）
+    range_percentiles = chart_config.get('hist_range_percentiles')
+    if range_percentiles:
+        column_ranges = [column_percentiles(y_col, data, range_percentiles, values_cache_key, sketch_source)[0]
+                         for y_col in sorted_columns]
+        all_data_min = min(low for low, _ in column_ranges)
+        all_data_max = max(high for _, high in column_ranges)
+    
+    # 计算bin大小和所有特征共用的分箱边界
+    if all_data_max == all_data_min:
+        all_data_max = all_data_min + 1
+    bin_size = (all_data_max - all_data_min) / num_bins
+    # 最后一条边界直接取最大值（不用 最小值 + 范围，避免舍入后略小于最大值而漏掉最大值本身）
+    edges = np.linspace(all_data_min, all_data_max, num_bins + 1)
+    bin_centers = (edges[:-1] + edges[1:]) / 2
+    bin_ranges = np.column_stack([edges[:-1], edges[1:]])
+    range_hover = f'%{{customdata[0]{hover_format}}} ~ %{{customdata[1]{hover_format}}}'
     
     # 添加每个特征的直方图
-    for idx, y_col in enumerate(valid_columns):
+    for idx, (y_col, sorted_values) in enumerate(sorted_columns.items()):
         color = color_palette[idx % len(color_palette)]
-        y_data = data[y_col].dropna()
+        counts = bin_sorted_values(sorted_values, edges)
         
-        # 归一化模式
-        histnorm = 'probability density' if hist_normalize else None
-        
-        # Hover模板
+        # 归一化模式：概率密度 = 频数 / (样本数 × bin宽度)
         if hist_normalize:
-            hover_template = f'<b>{y_col}</b><br>范围: %{{x}}<br>概率密度: %{{y{hover_format}}}<extra></extra>'
+            bar_values = counts / (len(sorted_values) * bin_size)
+            hover_template = f'<b>{y_col}</b><br>范围: {range_hover}<br>概率密度: %{{y{hover_format}}}<extra></extra>'
         else:
-            hover_template = f'<b>{y_col}</b><br>范围: %{{x}}<br>频数: %{{y}}<extra></extra>'
+            bar_values = counts.astype(np.int32)
+            hover_template = f'<b>{y_col}</b><br>范围: {range_hover}<br>频数: %{{y}}<extra></extra>'
         
-        fig.add_trace(go.Histogram(
-            x=y_data,
+        fig.add_trace(go.Bar(
+            x=bin_centers,
+            y=bar_values,
+            width=bin_size,
             name=y_col,
             opacity=opacity,
             marker=dict(color=color, line=dict(color='white', width=0.5)),
-            xbins=dict(
-                start=all_data_min,
-                end=all_data_max,
-                size=bin_size
-            ),
-            histnorm=histnorm,
+            customdata=bin_ranges,
             hovertemplate=hover_template
         ))
     
     # 多特征时使用overlay模式
-    barmode = 'overlay' if len(valid_columns) > 1 else 'relative'
+    barmode = 'overlay' if len(sorted_columns) > 1 else 'relative'
     
     # Y轴标题
     y_title = '概率密度' if hist_normalize else '频数'
+    x_title = '数值范围' if not range_percentiles else f'数值范围（p{range_percentiles[0]:g} ~ p{range_percentiles[1]:g}）'
     
     # 设置布局
     fig.update_layout(
@@ -2291,7 +4411,7 @@ def create_plotly_histogram(chart_config, data, chart_idx):
             'x': 0
         },
         xaxis=dict(
-            title=dict(text='数值范围'),
+            title=dict(text=x_title),
             showgrid=chart_config.get('show_grid', True),
             showline=True,
             zeroline=True,
@@ -2340,58 +4460,474 @@ def create_plotly_histogram(chart_config, data, chart_idx):
     
     return fig, config
 
+CHANNEL_HIST_BLOCK_ROWS = 200000  # 通道分布图分块计数时每块的行数
+CHANNEL_BIN_MODES = {'shared': '所有通道共用分箱', 'per_channel': '每个通道单独分箱'}
+
+
+def bin_channel_values(values, lows, highs, num_bins):
+    """
+    把（行 × 通道）数组的所有通道一起分箱计数，得到（通道 × 分箱）计数矩阵
+    
+    每个值的分箱号加上所在通道的偏移后统一做 bincount；按行分块处理，临时数组不随行数增长。
+    共享分箱和按通道分箱使用同一套边界规则，与 np.histogram 一致：按比例算出的分箱号再与
+    实际边界比较修正舍入误差，落在内部边界上的值归入上一个分箱，最后一个分箱包含右端点。
+    
+    Args:
+        values: 二维数组（行 × 通道），缺失值为NaN
+        lows: 分箱下界，共享分箱时为标量，按通道分箱时为每个通道一个值的数组
+        highs: 分箱上界（需大于 lows），形状同 lows
+        num_bins: 分箱数
+    """
+    num_channels = values.shape[1]
+    lows = np.broadcast_to(np.asarray(lows, dtype=np.float64), (num_channels,))
+    highs = np.broadcast_to(np.asarray(highs, dtype=np.float64), (num_channels,))
+    edges = np.linspace(lows, highs, num_bins + 1, axis=1)  # （通道 × 边界）
+    flat_edges = edges.ravel()
+    edge_offsets = np.arange(num_channels, dtype=np.int64) * (num_bins + 1)
+    offsets = np.arange(num_channels, dtype=np.int64) * num_bins
+    scale = num_bins / (highs - lows)
+    counts = np.zeros(num_channels * num_bins, dtype=np.int64)
+    for start in range(0, values.shape[0], CHANNEL_HIST_BLOCK_ROWS):
+        block = values[start:start + CHANNEL_HIST_BLOCK_ROWS]
+        # NaN 和范围外的值不计数
+        valid = (block >= edges[:, 0]) & (block <= edges[:, -1])
+        block = block[valid]
+        channels = np.nonzero(valid)[1]
+        bins = np.minimum(((block - lows[channels]) * scale[channels]).astype(np.int64), num_bins - 1)
+        # 与实际边界比较，修正浮点舍入造成的分箱号偏差
+        bins -= block < flat_edges[bins + edge_offsets[channels]]
+        bins += (block >= flat_edges[bins + edge_offsets[channels] + 1]) & (bins != num_bins - 1)
+        counts += np.bincount(bins + offsets[channels], minlength=num_channels * num_bins)
+    return counts.reshape(num_channels, num_bins)
+
+
+def create_plotly_channel_histogram(chart_config, parsed_array, rows=slice(None)):
+    """
+    创建列表列的通道分布图：所有通道一次分箱成（通道 × 分箱）计数矩阵，用一张热力图显示
+    
+    代替为每个通道各画一条叠加的直方图；发送的只是计数矩阵，与行数无关。
+    
+    Args:
+        parsed_array: 列表列解析后的二维数组（行 × 通道）
+        rows: 参与统计的行（已确认的数据范围或降采样的行号），默认全部行
+    """
+    list_col = chart_config['y1_columns'][0]
+    values = parsed_array[rows]
+    num_channels = values.shape[1]
+    if values.shape[0] == 0 or num_channels == 0:
+        st.warning("⚠️ 列表列在所选范围内没有数据")
+        return go.Figure(), {}
+    
+    decimal_places = chart_config.get('decimal_places', 4)
+    num_bins = chart_config.get('histogram_bins', 50)
+    hist_normalize = chart_config.get('hist_normalize', False)
+    per_channel = chart_config.get('channel_bin_mode', 'shared') == 'per_channel'
+    hover_format = ':.0f' if decimal_places == 0 else f':.{decimal_places}f'
+    
+    # 分箱范围：共享分箱取全部通道的最小/最大值，按通道分箱时每个通道取自身的最小/最大值（fmin/fmax 忽略NaN）
+    lows = np.fmin.reduce(values, axis=0)
+    highs = np.fmax.reduce(values, axis=0)
+    if not per_channel:
+        lows = np.fmin.reduce(lows)
+        highs = np.fmax.reduce(highs)
+    lows = np.nan_to_num(lows, nan=0.0)
+    highs = np.where(np.nan_to_num(highs, nan=lows) > lows, highs, lows + 1.0)
+    spans = highs - lows
+    
+    counts = bin_channel_values(values, lows, highs, num_bins)
+    bin_widths = np.broadcast_to(spans / num_bins, (num_channels,))
+    
+    # 归一化：每个通道各自换算为概率密度 = 频数 / (样本数 × 分箱宽度)
+    if hist_normalize:
+        totals = counts.sum(axis=1, keepdims=True)
+        z = (counts / np.maximum(totals, 1) / bin_widths[:, None]).astype(np.float32)
+        value_hover = f'概率密度: %{{z{hover_format}}}'
+    else:
+        z = counts.astype(np.float32)
+        value_hover = '频数: %{z:,.0f}'
+    z[counts == 0] = np.nan
+    
+    # 每个格子对应的数值范围（悬浮框显示）
+    left_edges = np.broadcast_to(lows, (num_channels,))[:, None] + bin_widths[:, None] * np.arange(num_bins)
+    bin_ranges = np.stack([left_edges, left_edges + bin_widths[:, None]], axis=-1).astype(np.float32)
+    
+    if per_channel:
+        # 各通道的分箱范围不同，X轴为分箱序号
+        x0, dx = 1, 1
+        x_title = '分箱序号（每个通道按自身的最小值 ~ 最大值分箱）'
+    else:
+        x0, dx = float(lows) + float(bin_widths[0]) / 2, float(bin_widths[0])
+        x_title = '数值范围'
+    
+    fig = go.Figure(go.Heatmap(
+        z=z,
+        x0=x0,
+        dx=dx,
+        y0=1,
+        dy=1,
+        customdata=bin_ranges,
+        colorscale='Viridis',
+        colorbar=dict(title=dict(text='概率密度' if hist_normalize else '频数')),
+        hovertemplate=(f'<b>{list_col} #%{{y}}</b><br>范围: %{{customdata[0]{hover_format}}} ~ '
+                       f'%{{customdata[1]{hover_format}}}<br>{value_hover}<extra></extra>')
+    ))
+    
+    fig.update_layout(
+        title={
+            'text': chart_config['title'],
+            'xanchor': 'left',
+            'x': 0
+        },
+        xaxis=dict(
+            title=dict(text=x_title),
+            showgrid=chart_config.get('show_grid', True),
+            exponentformat='none',
+            separatethousands=True
+        ),
+        yaxis=dict(
+            title=dict(text=f'{list_col} 通道'),
+            showgrid=False,
+            exponentformat='none'
+        ),
+        width=chart_config.get('width', 1200),
+        height=chart_config['height'],
+        dragmode='zoom',
+        hovermode='closest'
+    )
+    
+    config = {
+        'displayModeBar': True,
+        'displaylogo': False,
+        'editable': True,
+        'edits': {
+            'titleText': True,
+            'axisTitleText': True,
+        }
+    }
+    
+    return fig, config
+
+
+def density_axis_range(values, window_range=None):
+    """密度图一个坐标轴的分箱范围：有框选视窗时用视窗，否则用数据的最小/最大值；范围为零时向两侧各扩0.5"""
+    if window_range is not None:
+        low, high = sorted(window_range)
+    else:
+        finite = values[np.isfinite(values)]
+        if finite.size == 0:
+            return None
+        low, high = float(finite.min()), float(finite.max())
+    if high <= low:
+        low, high = low - 0.5, high + 0.5
+    return low, high
+
+
+def bin_density_grid(x_values, y_values, x_range, y_range, num_x, num_y):
+    """
+    把 (x, y) 点对分到 num_y × num_x 的网格中计数（向量化，一次 bincount）
+    
+    Returns:
+        二维计数数组，行对应Y、列对应X
+    """
+    inside = ((x_values >= x_range[0]) & (x_values <= x_range[1])
+              & (y_values >= y_range[0]) & (y_values <= y_range[1]))
+    x_values = x_values[inside]
+    y_values = y_values[inside]
+    ix = ((x_values - x_range[0]) * (num_x / (x_range[1] - x_range[0]))).astype(np.int64)
+    iy = ((y_values - y_range[0]) * (num_y / (y_range[1] - y_range[0]))).astype(np.int64)
+    # 落在右/上边界上的点归入最后一个网格
+    np.minimum(ix, num_x - 1, out=ix)
+    np.minimum(iy, num_y - 1, out=iy)
+    return np.bincount(iy * num_x + ix, minlength=num_x * num_y).reshape(num_y, num_x)
+
+
+def density_colorscale(max_count, log_color=True, base_colors=None):
+    """
+    密度图的色阶：对数色阶时按 count = max^t 放置色标，热力图的 z 仍是实际计数，悬浮框显示真实点数
+    """
+    base_colors = base_colors or plotly.colors.sequential.Viridis
+    if not log_color or max_count <= 1:
+        return plotly.colors.make_colorscale(base_colors)
+    steps = np.linspace(0, 1, 16)
+    positions = (max_count ** steps - 1) / (max_count - 1)
+    positions[-1] = 1.0
+    colors = plotly.colors.sample_colorscale(base_colors, steps.tolist())
+    return [[float(position), color] for position, color in zip(positions, colors)]
+
+
+def create_plotly_density(chart_config, data, window=None, column_stats=None):
+    """
+    创建二维密度图：在服务端把 (x, y) 点对分到与屏幕像素对应的网格中，每个特征只发送一张计数图像
+    
+    载荷只与图表像素数有关，与数据行数无关。框选视窗后按新视窗重新分箱，放大后网格依然对应屏幕像素。
+    
+    Args:
+        window: 框选的视窗 {'x': (起, 止), 'y': (起, 止), 'yref': Y轴名}，为None时显示全部数据
+        column_stats: 数据源的列统计目录
+    """
+    y_columns = [col for col in chart_config.get('y1_columns', []) + chart_config.get('y2_columns', [])
+                 if col in data.columns and pd.api.types.is_numeric_dtype(data[col])]
+    if len(y_columns) == 0:
+        st.warning("⚠️ 没有可绘制的数值型列")
+        return go.Figure(), {}
+    
+    # X轴数据：索引或X列（时间类X列已在 prepare_plot_data 中转换为 datetime，这里转为毫秒时间戳）
+    x_column = chart_config['x_column']
+    ts_type = None
+    if chart_config.get('use_index_as_x', False):
+        x_values = np.arange(len(data), dtype=np.float64)
+        x_axis_title = 'Index'
+    elif x_column in data.columns:
+        x_stats = (column_stats or {}).get(x_column)
+        ts_type = x_stats['ts_type'] if x_stats is not None else detect_timestamp_type(data[x_column])
+        x_series = data[x_column]
+        if ts_type in NUMERIC_TIMESTAMP_TYPES and not pd.api.types.is_datetime64_any_dtype(x_series):
+            x_series = convert_timestamp_to_beijing_time(x_series, ts_type)
+        if pd.api.types.is_datetime64_any_dtype(x_series):
+            x_values = datetime_to_epoch_ms(x_series)
+        elif pd.api.types.is_numeric_dtype(x_series):
+            x_values = x_series.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            st.warning(f"⚠️ X轴列 {x_column} 不是数值或时间列，无法绘制密度图")
+            return go.Figure(), {}
+        x_axis_title = x_column + (' (北京时间)' if ts_type else '')
+    else:
+        return go.Figure(), {}
+    is_date_x = ts_type is not None and not chart_config.get('use_index_as_x', False)
+    
+    x_range = density_axis_range(x_values, window['x'] if window else None)
+    if x_range is None:
+        return go.Figure(), {}
+    
+    # 网格尺寸与绘图区像素对应（扣除坐标轴、标题和色条占用的边距）
+    num_rows = len(y_columns)
+    width = chart_config.get('width', 1200)
+    height = chart_config['height']
+    num_x = max(1, (width - 200) // DENSITY_PIXEL_SIZE)
+    num_y = max(1, (height - 160) // num_rows // DENSITY_PIXEL_SIZE)
+    
+    decimal_places = chart_config.get('decimal_places', 4)
+    hover_format = ':.0f' if decimal_places == 0 else f':.{decimal_places}f'
+    x_hover = '%{x|%Y-%m-%d %H:%M:%S}' if is_date_x else f'%{{x{hover_format}}}'
+    
+    fig = make_subplots(rows=num_rows, cols=1, shared_xaxes=True, vertical_spacing=0.04 if num_rows > 1 else 0)
+    grids = []
+    for row, y_col in enumerate(y_columns, start=1):
+        y_values = data[y_col].to_numpy(dtype=np.float64, na_value=np.nan)
+        # 框选的Y范围只作用于框选所在的那一行
+        yref = 'y' if row == 1 else f'y{row}'
+        y_window = window['y'] if window and window.get('yref') == yref else None
+        y_range = density_axis_range(y_values, y_window)
+        if y_range is None:
+            continue
+        counts = bin_density_grid(x_values, y_values, x_range, y_range, num_x, num_y)
+        grids.append((row, y_col, y_range, counts))
+    
+    if len(grids) == 0:
+        st.warning("⚠️ 没有可绘制的数值型列")
+        return go.Figure(), {}
+    
+    max_count = max(int(counts.max()) for _, _, _, counts in grids)
+    dx = (x_range[1] - x_range[0]) / num_x
+    for row, y_col, y_range, counts in grids:
+        dy = (y_range[1] - y_range[0]) / num_y
+        # 空网格设为NaN（透明），其余按 float32 发送
+        z = counts.astype(np.float32)
+        z[counts == 0] = np.nan
+        fig.add_trace(go.Heatmap(
+            z=z,
+            x0=x_range[0] + dx / 2,
+            dx=dx,
+            y0=y_range[0] + dy / 2,
+            dy=dy,
+            coloraxis='coloraxis',
+            name=y_col,
+            hovertemplate=f'<b>{y_col}</b>: %{{y{hover_format}}}<br>X: {x_hover}<br>点数: %{{z:,.0f}}<extra></extra>'
+        ), row=row, col=1)
+        # 热力图本身不能框选，加一条透明的两点曲线让该子图支持框选（用于按新视窗重新分箱）
+        fig.add_trace(go.Scatter(
+            x=[x_range[0], x_range[1]],
+            y=[y_range[0], y_range[1]],
+            mode='markers',
+            marker=dict(opacity=0),
+            hoverinfo='skip',
+            showlegend=False
+        ), row=row, col=1)
+        fig.update_yaxes(title_text=y_col, range=list(y_range), showgrid=chart_config.get('show_grid', True),
+                         exponentformat='none', row=row, col=1)
+    
+    fig.update_xaxes(range=list(x_range), showgrid=chart_config.get('show_grid', True), exponentformat='none',
+                     separatethousands=True)
+    if is_date_x:
+        fig.update_xaxes(type='date')
+    fig.update_xaxes(title_text=x_axis_title, row=num_rows, col=1)
+    
+    fig.update_layout(
+        title={
+            'text': chart_config['title'],
+            'xanchor': 'left',
+            'x': 0
+        },
+        coloraxis=dict(
+            colorscale=density_colorscale(max_count, chart_config.get('density_log_color', True)),
+            cmin=1,
+            cmax=max(max_count, 1),
+            colorbar=dict(title=dict(text='点数'))
+        ),
+        width=width,
+        height=height,
+        showlegend=False,
+        dragmode='select',
+        hovermode='closest'
+    )
+    
+    config = {
+        'displayModeBar': True,
+        'displaylogo': False,
+        'modeBarButtonsToRemove': ['lasso2d'],
+        'editable': True,
+        'edits': {
+            'titleText': True,
+            'axisTitleText': True,
+        }
+    }
+    
+    return fig, config
+
+
+def update_density_window(idx):
+    """
+    读取密度图的框选事件并更新该图的视窗
+    
+    框选的是数据坐标；时间X轴上前端返回日期字符串，转换为与绘图数据一致的毫秒时间戳。
+    """
+    chart_state = st.session_state.get(f"chart_{idx}")
+    boxes = chart_state.get('selection', {}).get('box', []) if chart_state else []
+    if not boxes:
+        return
+    box = boxes[0]
+    signature = json.dumps(box, sort_keys=True, default=str)
+    if st.session_state.density_last_box.get(idx) == signature:
+        return
+    st.session_state.density_last_box[idx] = signature
+    if len(box.get('x', [])) != 2 or len(box.get('y', [])) != 2:
+        return
+    x_window = tuple(pd.Timestamp(v).value / 1e6 if isinstance(v, str) else float(v) for v in box['x'])
+    st.session_state.density_windows[idx] = {
+        'x': tuple(sorted(x_window)),
+        'y': tuple(sorted(float(v) for v in box['y'])),
+        'yref': box.get('yref', 'y')
+    }
+
+
+# ============ 图表构建缓存（配置和数据都未变化的图表直接复用已构建的 Figure） ============
+
+FIGURE_CACHE_MAX_ENTRIES = 32  # 每个会话最多缓存的已构建图表数
+
+def get_data_fingerprint(data_source):
+    """
+    数据源的廉价指纹：内容指纹（没有时用数据对象身份）+ 行数 + 列名
+    
+    跟随模式追加、重新加载或替换数据后指纹随之变化
+    """
+    file_info = st.session_state.files_data[data_source]
+    data = file_info['data']
+    return [file_info.get('content_key') or f"id:{id(data)}", len(data), list(map(str, data.columns))]
+
+def figure_cache_key(chart_config, data_source, render_params):
+    """由图表配置、数据指纹和绘制参数（显示模式、范围等）生成稳定的缓存键"""
+    payload = json.dumps(
+        {'config': chart_config, 'data': get_data_fingerprint(data_source), 'render': render_params},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+def get_cached_figure(cache_key):
+    """查找已构建的图表，命中时更新为最近使用"""
+    cached = st.session_state.figure_cache.get(cache_key)
+    if cached is not None:
+        st.session_state.figure_cache.move_to_end(cache_key)
+        touch_session_cache('figure', cache_key)
+    return cached
+
+def store_cached_figure(cache_key, fig, config, num_points, nbytes, payload_bytes, percentile_table=None, data_source=None):
+    """缓存已构建的图表（直方图连同百分位数汇总表），超过条数上限时淘汰最久未使用的；记录数据源以便跟随追加时只失效对应图表"""
+    st.session_state.figure_cache[cache_key] = {'fig': fig, 'config': config, 'num_points': num_points,
+                                                'nbytes': nbytes, 'payload_bytes': payload_bytes,
+                                                'percentile_table': percentile_table, 'data_source': data_source}
+    touch_session_cache('figure', cache_key)
+    while len(st.session_state.figure_cache) > FIGURE_CACHE_MAX_ENTRIES:
+        st.session_state.figure_cache.popitem(last=False)
+
+
+def render_percentile_table(percentile_table, decimal_places):
+    """显示直方图各特征的百分位数汇总表"""
+    st.markdown("##### 📐 百分位数汇总")
+    number_format = f"%.{decimal_places}f"
+    st.dataframe(
+        percentile_table,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            col: st.column_config.NumberColumn(col, format="%d" if col == '样本数' else number_format)
+            for col in percentile_table.columns if col != '特征'
+        }
+    )
+
+
+def rerun_chart():
+    """只重新运行当前图表的片段；整页运行期间不能使用 scope="fragment"，此时退回整页刷新"""
+    ctx = get_script_run_ctx()
+    if ctx is not None and ctx.fragment_ids_this_run:
+        st.rerun(scope="fragment")
+    st.rerun()
+
 
 def render_histogram_bin_control(idx, chart_config):
     """渲染直方图的bin控制组件（放在图表下方）"""
     st.markdown("##### 🎚️ 直方图分箱控制")
     
+    slider_key = f"hist_bins_control_{idx}"
+    current_bins = st.session_state.histogram_bins.get(idx, chart_config.get('histogram_bins', 50))
+    # 分箱数可能在属性面板中被修改，创建滑块前同步其状态
+    if st.session_state.get(slider_key) != current_bins:
+        st.session_state[slider_key] = current_bins
+    
+    # 回调在图表片段重跑之前执行，重跑时直接用新的分箱数构建图表，无需再次刷新
+    def set_bins(new_val):
+        st.session_state.histogram_bins[idx] = new_val
+        # 同时更新图表配置
+        st.session_state.charts[idx]['histogram_bins'] = new_val
+        st.session_state[slider_key] = new_val
+    
     col1, col2, col3 = st.columns([2, 2, 1])
     
     with col1:
-        current_bins = st.session_state.histogram_bins.get(idx, chart_config.get('histogram_bins', 50))
-        new_bins = st.slider(
+        st.slider(
             "分箱数 (Bins)",
             min_value=5,
             max_value=500,
-            value=current_bins,
             step=1,
-            key=f"hist_bins_control_{idx}",
+            key=slider_key,
+            on_change=lambda: set_bins(st.session_state[slider_key]),
             help="调整直方图的分箱数量，数值越大柱子越细"
         )
-        
-        if new_bins != current_bins:
-            st.session_state.histogram_bins[idx] = new_bins
-            # 同时更新图表配置
-            st.session_state.charts[idx]['histogram_bins'] = new_bins
-            st.rerun()
     
     with col2:
         # 快捷按钮
         btn_col1, btn_col2, btn_col3, btn_col4 = st.columns(4)
         with btn_col1:
-            if st.button("➖", key=f"bins_dec_{idx}", help="减少分箱数"):
-                new_val = max(5, current_bins - 5)
-                st.session_state.histogram_bins[idx] = new_val
-                st.session_state.charts[idx]['histogram_bins'] = new_val
-                st.rerun()
+            st.button("➖", key=f"bins_dec_{idx}", help="减少分箱数",
+                      on_click=set_bins, args=(max(5, current_bins - 5),))
         with btn_col2:
-            if st.button("➕", key=f"bins_inc_{idx}", help="增加分箱数"):
-                new_val = min(500, current_bins + 5)
-                st.session_state.histogram_bins[idx] = new_val
-                st.session_state.charts[idx]['histogram_bins'] = new_val
-                st.rerun()
+            st.button("➕", key=f"bins_inc_{idx}", help="增加分箱数",
+                      on_click=set_bins, args=(min(500, current_bins + 5),))
         with btn_col3:
-            if st.button("½", key=f"bins_half_{idx}", help="分箱数减半"):
-                new_val = max(5, current_bins // 2)
-                st.session_state.histogram_bins[idx] = new_val
-                st.session_state.charts[idx]['histogram_bins'] = new_val
-                st.rerun()
+            st.button("½", key=f"bins_half_{idx}", help="分箱数减半",
+                      on_click=set_bins, args=(max(5, current_bins // 2),))
         with btn_col4:
-            if st.button("2×", key=f"bins_double_{idx}", help="分箱数加倍"):
-                new_val = min(500, current_bins * 2)
-                st.session_state.histogram_bins[idx] = new_val
-                st.session_state.charts[idx]['histogram_bins'] = new_val
-                st.rerun()
+            st.button("2×", key=f"bins_double_{idx}", help="分箱数加倍",
+                      on_click=set_bins, args=(min(500, current_bins * 2),))
     
     with col3:
         st.caption(f"当前: {current_bins} bins")
@@ -2407,130 +4943,63 @@ with st.sidebar:
     
     uploaded_files = st.file_uploader(
         "上传CSV或Excel文件（可多选）",
-        type=['csv', 'xlsx', 'xls'],
-        help="选择一个或多个数据文件，第一行应为列名",
+        type=['csv', 'xlsx', 'xls', 'gz', 'bz2', 'zst', 'zip'],
+        help="选择一个或多个数据文件，第一行应为列名；CSV可以是 .gz/.bz2/.zst/.zip 压缩格式，上传后边解压边解析",
         accept_multiple_files=True
     )
     
+    # 磁盘缓存：按内容指纹缓存解析结果，刷新页面后重新上传同一文件可秒级加载
+    use_disk_cache = st.checkbox(
+        "💾 使用磁盘缓存",
+        value=True,
+        key="use_disk_cache",
+        help="解析结果（列数据、列表列数组、列统计）按文件内容指纹缓存到本地磁盘，重复打开同一文件时直接内存映射加载"
+    )
+    
+    # 分片合并选项：列结构相同的多个文件作为一个逻辑数据源
+    merge_shards = st.checkbox(
+        "🧩 合并同结构分片为一个数据源",
+        key="merge_shards",
+        help="同一批上传的多个文件列名完全相同时，拼接成一个数据源（如按小时切分的日志分片）"
+    )
+    sort_merged = False
+    if merge_shards:
+        sort_merged = st.checkbox(
+            "合并后按X轴（首列）排序",
+            key="sort_merged_shards",
+            help="分片上传顺序不一定是时间顺序，勾选后按首列稳定排序"
+        )
+    
     if uploaded_files:
-        # 处理新上传的文件
+        # 处理新上传的文件（跟随模式的本地文件不受上传列表影响）
         current_filenames = {f.name for f in uploaded_files}
-        existing_filenames = set(st.session_state.files_data.keys())
-        
-        # 添加新文件
-        for uploaded_file in uploaded_files:
-            if uploaded_file.name not in existing_filenames:
-                data, list_columns_info, is_large, downsampled_df = load_data(uploaded_file, st.session_state.downsample_ratio)
-                if data is not None:
-                    st.session_state.files_data[uploaded_file.name] = {
-                        'data': data,
-                        'list_columns_info': list_columns_info,
-                        'is_large': is_large,
-                        'downsampled': downsampled_df
-                    }
+        uploaded_entries = {name: info.get('shards', [info.get('source_file', name)])
+                            for name, info in st.session_state.files_data.items() if 'follow' not in info}
         
-        # 删除已移除的文件
-        files_to_remove = existing_filenames - current_filenames
-        for filename in files_to_remove:
-            del st.session_state.files_data[filename]
-            
-            # 清理该文件相关的所有缓存
-            # 1. 清理解析缓存
-            keys_to_delete = [key for key in st.session_state.parsed_list_columns.keys() 
-                            if key.startswith(f"{filename}_")]
-            for key in keys_to_delete:
-                del st.session_state.parsed_list_columns[key]
-            
-            # 2. 清理展开缓存
-            keys_to_delete = [key for key in st.session_state.expanded_list_columns.keys() 
-                            if key.startswith(f"{filename}_")]
-            for key in keys_to_delete:
-                del st.session_state.expanded_list_columns[key]
-            
-            # 3. 清理使用该文件的图表配置和相关状态
-            charts_to_reset = []
-            for idx, chart in enumerate(st.session_state.charts):
-                if chart.get('data_source') == filename:
-                    charts_to_reset.append(idx)
-            
-            for idx in charts_to_reset:
-                # 重置图表配置
-                st.session_state.charts[idx]['data_source'] = None
-                st.session_state.charts[idx]['is_configured'] = False
-                st.session_state.charts[idx]['y1_columns'] = []
-                st.session_state.charts[idx]['y2_columns'] = []
-                
-                # 清理该图表的所有相关状态
-                clear_chart_states(idx)
+        # 删除已移除的文件（合并数据源的任一分片被移除时整体删除，其余分片重新加载）
+        for name, shards in uploaded_entries.items():
+            if not set(shards) <= current_filenames:
+                remove_file_data(name)
         
-        # 显示已加载的文件
-        if st.session_state.files_data:
-            st.success(f"✅ 已加载 {len(st.session_state.files_data)} 个文件")
-            
-            # 显示每个文件的信息
-            for filename, file_info in st.session_state.files_data.items():
-                # 为大文件添加标记
-                file_display = f"📄 {filename}"
-                if file_info.get('is_large', False):
-                    file_display = f"📦 {filename} (大文件)"
-                
-                with st.expander(file_display):
-                    data = file_info['data']
-                    list_columns_info = file_info['list_columns_info']
-                    is_large = file_info.get('is_large', False)
-                    
-                    if is_large:
-                        st.info(f"📊 数据形状: {data.shape[0]:,} 行 × {data.shape[1]} 列 (已启用降采样优化)")
-                    else:
-                        st.info(f"数据形状: {data.shape[0]:,} 行 × {data.shape[1]} 列")
-                    
-                    # 显示列表列信息
-                    if list_columns_info:
-                        st.markdown("**📊 列表列:**")
-                        for col_name, info in list_columns_info.items():
-                            st.write(f"- {col_name} → {info['num_channels']} 个通道")
-                    
-                    # 显示数据预览
-                    st.markdown("**📋 数据预览:**")
-                    st.dataframe(data.head(5), use_container_width=True)
-                    
-                    # 删除单个文件按钮
-                    if st.button(f"🗑️ 删除文件", key=f"delete_file_{filename}"):
-                        del st.session_state.files_data[filename]
-                        
-                        # 清理该文件相关的所有缓存
-                        # 1. 清理解析缓存
-                        keys_to_delete = [key for key in st.session_state.parsed_list_columns.keys() 
-                                        if key.startswith(f"{filename}_")]
-                        for key in keys_to_delete:
-                            del st.session_state.parsed_list_columns[key]
-                        
-                        # 2. 清理展开缓存
-                        keys_to_delete = [key for key in st.session_state.expanded_list_columns.keys() 
-                                        if key.startswith(f"{filename}_")]
-                        for key in keys_to_delete:
-                            del st.session_state.expanded_list_columns[key]
-                        
-                        # 3. 清理使用该文件的图表配置和相关状态
-                        charts_to_reset = []
-                        for idx, chart in enumerate(st.session_state.charts):
-                            if chart.get('data_source') == filename:
-                                charts_to_reset.append(idx)
-                        
-                        for idx in charts_to_reset:
-                            # 重置图表配置
-                            st.session_state.charts[idx]['data_source'] = None
-                            st.session_state.charts[idx]['is_configured'] = False
-                            st.session_state.charts[idx]['y1_columns'] = []
-                            st.session_state.charts[idx]['y2_columns'] = []
-                            
-                            # 清理该图表的所有相关状态
-                            clear_chart_states(idx)
-                        
-                        st.rerun()
+        # 并行加载新文件
+        known_filenames = {shard for name, info in st.session_state.files_data.items()
+                           for shard in info.get('shards', [info.get('source_file', name)])}
+        new_files = [f for f in uploaded_files if f.name not in known_filenames]
+        if new_files:
+            new_entries = ingest_uploaded_files(
+                new_files,
+                merge_shards=merge_shards, sort_merged=sort_merged,
+                use_disk_cache=use_disk_cache
+            )
+            st.session_state.files_data.update(new_entries)
     else:
         # 清空所有数据
-        if st.session_state.files_data:
+        followed_files = [name for name, info in st.session_state.files_data.items() if 'follow' in info]
+        if followed_files:
+            # 仍有跟随中的本地文件：只移除上传的文件
+            for filename in [name for name in st.session_state.files_data if name not in followed_files]:
+                remove_file_data(filename)
+        elif st.session_state.files_data:
             # 清理所有图表的状态
             for idx in range(len(st.session_state.charts)):
                 clear_chart_states(idx)
@@ -2540,7 +5009,159 @@ with st.sidebar:
             st.session_state.edit_mode = {}
             st.session_state.expanded_list_columns = {}
             st.session_state.parsed_list_columns = {}
+            st.session_state.x_range_indices = {}
+            st.session_state.x_time_columns = {}
+            st.session_state.histogram_values = {}
+            st.session_state.time_buckets = {}
+            st.session_state.figure_cache = OrderedDict()
             st.session_state.confirm_clear = False
+    
+    # 跟随模式：监控持续增长的本地CSV日志，只解析新追加的行
+    with st.expander("📡 跟随本地日志文件"):
+        follow_path = st.text_input(
+            "本地CSV文件路径",
+            key="follow_path_input",
+            help="输入运行中测试台架的CSV日志路径，文件增长时自动增量读取新追加的行"
+        )
+        if st.button("▶️ 开始跟随", key="start_follow_btn", disabled=not follow_path):
+            follow_name = os.path.basename(follow_path.strip())
+            if follow_name in st.session_state.files_data:
+                st.error(f"❌ 已存在同名数据文件 '{follow_name}'")
+            else:
+                follow_info = start_follow_file(follow_path.strip())
+                if follow_info is not None:
+                    st.session_state.files_data[follow_name] = follow_info
+                    st.rerun()
+        st.caption(f"💡 每 {FOLLOW_POLL_INTERVAL} 秒检查一次文件增长，有新数据时自动刷新图表")
+    
+    render_follow_poller()
+    
+    # 磁盘缓存占用
+    if use_disk_cache:
+        cache_usage = get_disk_cache_usage()
+        if cache_usage:
+            cache_col, clear_col = st.columns([3, 1])
+            with cache_col:
+                st.caption(f"💾 磁盘缓存: {len(cache_usage)} 个文件，{sum(size for _, size, _ in cache_usage) / 1e6:,.1f} MB"
+                           f" / {DISK_CACHE_MAX_BYTES / 1e9:.0f} GB")
+            with clear_col:
+                if st.button("🧹", key="clear_disk_cache", help="清空磁盘缓存"):
+                    shutil.rmtree(DISK_CACHE_DIR, ignore_errors=True)
+                    st.rerun()
+    
+    # 折线图WebGL渲染阈值
+    st.number_input(
+        "⚡ WebGL折线阈值（点）",
+        min_value=0,
+        step=10000,
+        key="webgl_line_threshold",
+        help="折线图所有曲线的总点数超过此值时改用WebGL（Scattergl）渲染，避免SVG在大量点数下卡顿；设为0则始终使用WebGL"
+    )
+    
+    # 会话内存预算：超出时按LRU淘汰缓存
+    st.number_input(
+        "🧠 会话内存预算 (MB)",
+        min_value=256,
+        step=256,
+        key="memory_budget_mb",
+        help="本会话缓存（已构建图表、通道展开、直方图排序、时间桶聚合、时间转换、X有序索引、列表列解析、源数据）的总内存上限，超出时先淘汰最久未使用的可重算缓存"
+    )
+    cache_items, evicted_count = enforce_session_memory_budget()
+    if cache_items:
+        usage_by_kind = {}
+        for item in cache_items:
+            usage_by_kind[item['kind']] = usage_by_kind.get(item['kind'], 0) + item['nbytes']
+        st.caption(
+            f"🧠 会话内存: {sum(usage_by_kind.values()) / 1e6:,.1f} MB / {st.session_state.memory_budget_mb:,} MB（"
+            + " · ".join(f"{CACHE_KIND_LABELS[kind]} {usage_by_kind[kind] / 1e6:,.1f} MB"
+                         for kind in CACHE_EVICTION_PRIORITY if kind in usage_by_kind)
+            + "）"
+        )
+    if evicted_count:
+        st.caption(f"♻️ 已按LRU释放 {evicted_count} 项缓存，使用时自动重新生成")
+    
+    # 显示已加载的文件
+    if st.session_state.files_data:
+        st.success(f"✅ 已加载 {len(st.session_state.files_data)} 个文件")
+        
+        # 显示每个文件的信息
+        for filename, file_info in st.session_state.files_data.items():
+            # 为大文件添加标记
+            file_display = f"📄 {filename}"
+            if file_info.get('is_large', False):
+                file_display = f"📦 {filename} (大文件)"
+            if file_info.get('shards'):
+                file_display = f"🧩 {filename}"
+            if file_info['data'] is None:
+                file_display = f"💤 {filename} (已释放)" if file_info.get('evicted') else f"📑 {filename} (未解析)"
+            if 'follow' in file_info:
+                file_display = f"📡 {filename} (跟随中)" if file_info['follow']['enabled'] else f"📡 {filename} (已暂停)"
+            
+            with st.expander(file_display):
+                if file_info['data'] is None:
+                    if file_info.get('evicted'):
+                        # 超出内存预算被释放的源数据
+                        st.info("💤 超出会话内存预算已从内存释放，图表使用时自动从缓存重新加载")
+                    else:
+                        # 尚未解析的Excel工作表
+                        st.info(f"📑 工作表 '{file_info['excel']['sheet']}' 尚未解析，图表选择该数据源时自动读取")
+                    if st.button("📥 立即读取", key=f"load_sheet_{filename}"):
+                        get_file_info(filename)
+                        st.rerun()
+                    if st.button(f"🗑️ 删除文件", key=f"delete_file_{filename}"):
+                        remove_file_data(filename)
+                        st.rerun()
+                    continue
+                
+                data = file_info['data']
+                list_columns_info = file_info['list_columns_info']
+                is_large = file_info.get('is_large', False)
+                
+                if is_large:
+                    st.info(f"📊 数据形状: {data.shape[0]:,} 行 × {data.shape[1]} 列 (已启用降采样优化)")
+                else:
+                    st.info(f"数据形状: {data.shape[0]:,} 行 × {data.shape[1]} 列")
+                
+                # 跨会话共享状态
+                if file_info.get('shared'):
+                    store = get_shared_dataset_store()
+                    with store['lock']:
+                        dataset = store['datasets'].get(file_info['content_key'])
+                        session_count = len(dataset['sessions']) if dataset else 1
+                    if session_count > 1:
+                        st.caption(f"🤝 与其他 {session_count - 1} 个会话共享同一份数据（只读）")
+                
+                # 合并的分片列表
+                if file_info.get('shards'):
+                    st.caption("🧩 分片: " + ", ".join(file_info['shards']))
+                
+                # 读取吞吐（解压 vs 解析）
+                if file_info.get('ingest_stats'):
+                    st.caption(format_ingest_stats(file_info['ingest_stats']))
+                
+                # 跟随状态与暂停/继续
+                if 'follow' in file_info:
+                    follow = file_info['follow']
+                    st.caption(f"📍 {follow['path']}（已读取 {follow['offset']:,} 字节）")
+                    toggle_label = "⏸️ 暂停跟随" if follow['enabled'] else "▶️ 继续跟随"
+                    if st.button(toggle_label, key=f"toggle_follow_{filename}"):
+                        follow['enabled'] = not follow['enabled']
+                        st.rerun()
+                
+                # 显示列表列信息
+                if list_columns_info:
+                    st.markdown("**📊 列表列:**")
+                    for col_name, info in list_columns_info.items():
+                        st.write(f"- {col_name} → {info['num_channels']} 个通道")
+                
+                # 显示数据预览
+                st.markdown("**📋 数据预览:**")
+                st.dataframe(data.head(5), use_container_width=True)
+                
+                # 删除单个文件按钮
+                if st.button(f"🗑️ 删除文件", key=f"delete_file_{filename}"):
+                    remove_file_data(filename)
+                    st.rerun()
 
 # 添加图表到列表的回调函数
 def add_new_chart(position=None):
@@ -2552,7 +5173,7 @@ def add_new_chart(position=None):
     # 获取默认x_column
     default_x_column = ''
     if default_data_source:
-        data = st.session_state.files_data[default_data_source]['data']
+        data = get_file_info(default_data_source)['data']
         default_x_column = data.columns[0] if len(data.columns) > 0 else ''
     
     new_chart = {
@@ -2572,7 +5193,8 @@ def add_new_chart(position=None):
         'is_configured': False,  # 标记图表是否已配置
         'use_downsample': True,  # 默认使用降采样（如果是大文件）
         'range_start': None,  # 范围起始
-        'range_end': None  # 范围结束
+        'range_end': None,  # 范围结束
+        'collapsed': False  # 折叠的图表只显示标题栏，不准备数据也不发送图表
     }
     if position is None:
         st.session_state.charts.append(new_chart)
@@ -2581,19 +5203,29 @@ def add_new_chart(position=None):
         st.session_state.charts.insert(position + 1, new_chart)
         new_idx = position + 1
     st.session_state.edit_mode[new_idx] = True  # 新图表默认打开编辑模式
+    st.session_state.chart_page = new_idx // st.session_state.charts_per_page  # 翻到新图表所在页
     
     # 初始化图表的范围模式（根据数据源决定，大文件默认降采样，否则默认原始数据）
     # 注意：此时可能还没有选择数据源，所以先不初始化，等选择数据源后再初始化
     st.session_state.chart_range_selection[new_idx] = None
 
 # 渲染单个图表区域
+# 使用 @st.fragment 使每个图表独立刷新：绘制、分箱调整、重新配置只重跑该图表，不影响其他图表
+@st.fragment
 def render_chart_area(idx, chart_config):
     """渲染单个图表区域，包括属性面板和图表显示"""
     
     # 使用容器包裹整个图表区域
     with st.container():
         # 标题栏和操作按钮
-        col_title, col_edit, col_delete = st.columns([5, 1.5, 1.5])
+        collapsed = chart_config.get('collapsed', False)
+        col_fold, col_title, col_edit, col_delete = st.columns([0.5, 5, 1.5, 1.5])
+        with col_fold:
+            # 折叠/展开：折叠后保留配置，但跳过数据准备和图表发送
+            if st.button("▸" if collapsed else "▾", key=f"collapse_toggle_{idx}",
+                         help="展开图表" if collapsed else "折叠图表（保留配置，不再绘制）"):
+                chart_config['collapsed'] = not collapsed
+                rerun_chart()
         with col_title:
             # 显示图表标题和数据来源
             data_source_tag = f" [{chart_config.get('data_source', '未选择')}]" if len(st.session_state.files_data) > 1 else ""
@@ -2603,13 +5235,18 @@ def render_chart_area(idx, chart_config):
             edit_label = "收起属性" if st.session_state.edit_mode.get(idx, False) else "编辑属性"
             if st.button(f"⚙️ {edit_label}", key=f"edit_toggle_{idx}"):
                 st.session_state.edit_mode[idx] = not st.session_state.edit_mode.get(idx, False)
-                st.rerun()
+                rerun_chart()
         with col_delete:
             if st.button("🗑️ 删除该图", key=f"delete_{idx}"):
                 st.session_state.charts.pop(idx)
                 if idx in st.session_state.edit_mode:
                     del st.session_state.edit_mode[idx]
-                st.rerun()
+                st.rerun(scope="app")  # 删除图表会改变后续图表的序号，需要刷新整个页面
+        
+        if collapsed:
+            st.caption(f"📁 已折叠（{chart_config.get('chart_type', '折线图')}，"
+                       f"{len(chart_config.get('y1_columns', [])) + len(chart_config.get('y2_columns', []))} 条曲线），点击 ▸ 展开绘制")
+            return
         
         # 属性编辑面板（仅在编辑模式下显示）- 使用 fragment 避免属性修改时刷新整个页面
         if st.session_state.edit_mode.get(idx, False):
@@ -2628,7 +5265,7 @@ def render_chart_area(idx, chart_config):
             
             try:
                 # 获取对应的数据和列表列信息
-                file_info = st.session_state.files_data[data_source]
+                file_info = get_file_info(data_source)
                 original_data = file_info['data']
                 list_columns_info = file_info['list_columns_info']
                 is_large_file = file_info.get('is_large', False)
@@ -2647,6 +5284,9 @@ def render_chart_area(idx, chart_config):
                     ch2 = y2_selections.get('list_columns', {}).get(list_col, [])
                     all_selections['list_columns'][list_col] = list(set(ch1 + ch2))
                 
+                # 密度图在服务端分箱，载荷只与像素数有关，不使用降采样数据
+                is_density = chart_config.get('chart_type') == '密度图'
+                
                 # 原始数据模式下的范围选择（仅在大文件且选择原始数据模式时显示）
                 current_display_mode = st.session_state.chart_range_mode.get(idx, 'original')
                 if is_large_file and current_display_mode == 'original' and not st.session_state.chart_data_ready.get(idx, True):
@@ -2662,10 +5302,11 @@ def render_chart_area(idx, chart_config):
                         
                         # 如果还没有设置范围，使用默认值（中间20%）
                         if idx not in st.session_state.chart_range_selection or st.session_state.chart_range_selection[idx] is None:
-                            is_numeric_x = pd.api.types.is_numeric_dtype(original_data[x_col])
-                            if is_numeric_x:
-                                x_min = float(original_data[x_col].min())
-                                x_max = float(original_data[x_col].max())
+                            if is_monotonic_numeric_x(original_data, x_col, data_source):
+                                # 单调X列的最小/最大值直接取自列统计目录（即首尾值）
+                                x_stats = get_column_stats(data_source, x_col)
+                                x_min = float(x_stats['min'] if x_stats else original_data[x_col].iat[0])
+                                x_max = float(x_stats['max'] if x_stats else original_data[x_col].iat[-1])
                                 x_range = x_max - x_min
                                 range_start = x_min + x_range * 0.4
                                 range_end = x_min + x_range * 0.6
@@ -2675,7 +5316,7 @@ def render_chart_area(idx, chart_config):
                             st.session_state.chart_range_selection[idx] = (range_start, range_end)
                         
                         # 使用 fragment 渲染输入控件
-                        render_range_input_controls(idx, total_rows, downsampled_rows, x_col, original_data)
+                        render_range_input_controls(idx, total_rows, downsampled_rows, x_col, original_data, data_source)
                     
                     st.markdown("---")
                     
@@ -2685,12 +5326,15 @@ def render_chart_area(idx, chart_config):
                         if st.button("🎨 绘制原始数据图表", key=f"draw_original_{idx}", type="primary", use_container_width=True):
                             st.session_state.confirmed_chart_range[idx] = st.session_state.chart_range_selection.get(idx)
                             st.session_state.chart_data_ready[idx] = True
-                            st.rerun()
+                            rerun_chart()
                     with col_btn2:
                         st.caption("💡 点击按钮后将加载并绘制选定范围的原始数据")
                     
                     st.markdown("---")
-                    st.info("💡 下方仍显示降采样预览图，配置好范围后点击「绘制原始数据图表」按钮查看精确数据")
+                    if is_density:
+                        st.info("💡 下方显示整个文件的密度图，配置好范围后点击「绘制原始数据图表」按钮只对选定范围分箱")
+                    else:
+                        st.info("💡 下方仍显示降采样预览图，配置好范围后点击「绘制原始数据图表」按钮查看精确数据")
                 
                 # 确定应该显示哪种数据
                 show_downsampled = False  # 是否显示降采样数据
@@ -2707,6 +5351,12 @@ def render_chart_area(idx, chart_config):
                         # 大文件未确认范围：继续显示降采样图
                         show_downsampled = True
                 
+                # 密度图不降采样：降采样模式或尚未确认范围时直接对整个文件分箱
+                density_full_file = is_density and show_downsampled
+                if density_full_file:
+                    show_downsampled = False
+                    show_original = True
+                
                 if not show_downsampled and not show_original:
                     # 不应该发生，但作为安全措施
                     st.warning("⚠️ 无法确定显示模式")
@@ -2723,63 +5373,159 @@ def render_chart_area(idx, chart_config):
                     elif show_original:
                         # 显示原始数据
                         # 使用已确认的范围（点击绘制按钮时保存的），而不是当前输入框的值
-                        if is_large_file and idx in st.session_state.confirmed_chart_range and st.session_state.confirmed_chart_range[idx]:
+                        if (is_large_file and not density_full_file and idx in st.session_state.confirmed_chart_range
+                                and st.session_state.confirmed_chart_range[idx]):
                             # 大文件且有已确认的范围选择：使用范围过滤
                             range_start, range_end = st.session_state.confirmed_chart_range[idx]
                             
-                            # 检查X轴是否为数值类型，决定使用值范围还是索引范围
+                            # 单调数值X轴按X值范围（二分定位），其他X轴按行号范围
                             x_col = chart_config.get('x_column')
                             if x_col and x_col in original_data.columns:
-                                use_index_range = not pd.api.types.is_numeric_dtype(original_data[x_col])
+                                use_index_range = not is_monotonic_numeric_x(original_data, x_col, data_source)
                 
                     # 获取所有Y轴列名（用于LTTB降采样）
                     all_y_columns = chart_config.get('y1_columns', []) + chart_config.get('y2_columns', [])
                     
-                    # 准备完整的数据
-                    plot_data, original_indices = prepare_plot_data(
-                        original_data, 
-                        all_selections, 
-                        list_columns_info, 
-                        data_source,
-                        use_downsample=use_downsample,
-                        x_column=chart_config.get('x_column'),
-                        y_columns=all_y_columns,
-                        range_start=range_start,
-                        range_end=range_end,
-                        use_index_range=use_index_range,
-                        downsample_ratio=st.session_state.downsample_ratio
-                    )
+                    # 密度图：框选后按新视窗重新分箱（视窗是绘制参数的一部分）
+                    if is_density:
+                        update_density_window(idx)
+                    
+                    # 配置、数据和绘制参数都未变化时直接复用已构建的图表
+                    render_params = {
+                        'use_downsample': use_downsample,
+                        'range': [range_start, range_end],
+                        'use_index_range': use_index_range,
+                        'downsample_ratio': st.session_state.downsample_ratio,
+                        'webgl_line_threshold': st.session_state.webgl_line_threshold,
+                        'density_window': st.session_state.density_windows.get(idx) if is_density else None
+                    }
+                    fig_cache_key = figure_cache_key(chart_config, data_source, render_params)
+                    cached_figure = get_cached_figure(fig_cache_key)
+                    
+                    is_channel_hist = chart_config.get('chart_type') == '通道分布图'
+                    # 时间X列按时间桶重采样：代替降采样，点数为时间桶数
+                    use_time_resample = (chart_config.get('chart_type') in ('折线图', '散点图')
+                                         and chart_config.get('time_resample_interval')
+                                         and not chart_config.get('use_index_as_x', False)
+                                         and is_time_x_column(data_source, chart_config.get('x_column')))
+                    # 降采样预览按行块画均值曲线和最小/最大值包络
+                    use_envelope = (chart_config.get('chart_type') in ('折线图', '散点图') and use_downsample
+                                    and chart_config.get('downsample_envelope', False) and not use_time_resample)
+                    envelopes = None
+                    if cached_figure is None and is_channel_hist:
+                        # 通道分布图：直接统计列表列解析缓存中的全部通道，只取已确认范围（或降采样）的行，不展开为DataFrame
+                        list_col = chart_config['y1_columns'][0]
+                        if list_col not in original_data.columns:
+                            st.error(f"❌ 列表列 '{list_col}' 不存在！请重新配置图表。")
+                            return
+                        parsed_array = get_parsed_list_array(original_data, list_col, data_source)
+                        if range_start is not None and range_end is not None:
+                            channel_rows = range_to_rows(original_data, chart_config.get('x_column'), range_start, range_end,
+                                                         use_index_range, data_source)
+                        elif use_downsample:
+                            channel_rows = simple_downsample_positions(
+                                len(original_data), max(1000, len(original_data) // st.session_state.downsample_ratio))
+                        else:
+                            channel_rows = slice(None)
+                        num_points = len(range(len(original_data))[channel_rows]) if isinstance(channel_rows, slice) else len(channel_rows)
+                    elif cached_figure is None and use_envelope:
+                        plot_data, original_indices, envelopes = prepare_envelope_data(
+                            original_data, chart_config, data_source, st.session_state.downsample_ratio)
+                        num_points = len(plot_data)
+                    elif cached_figure is None and use_time_resample:
+                        plot_data, original_indices, envelopes = prepare_resampled_data(
+                            original_data, chart_config, data_source, range_start, range_end, use_index_range)
+                        num_points = len(plot_data)
+                    elif cached_figure is None:
+                        # 准备完整的数据
+                        plot_data, original_indices = prepare_plot_data(
+                            original_data, 
+                            all_selections, 
+                            list_columns_info, 
+                            data_source,
+                            use_downsample=use_downsample,
+                            x_column=chart_config.get('x_column'),
+                            y_columns=all_y_columns,
+                            range_start=range_start,
+                            range_end=range_end,
+                            use_index_range=use_index_range,
+                            downsample_ratio=st.session_state.downsample_ratio,
+                            sort_by_x=(chart_config.get('sort_by_x', False) and not chart_config.get('use_index_as_x', False)
+                                       and chart_config.get('chart_type') not in ('直方图', '密度图'))
+                        )
+                        num_points = len(plot_data)
+                    else:
+                        num_points = cached_figure['num_points']
                     
                     # 显示实际绘图数据量
                     if show_downsampled and is_large_file:
-                        st.success(f"✅ 已加载降采样数据：{len(plot_data):,} 点 (原始: {len(original_data):,} 行)")
+                        st.success(f"✅ 已加载降采样数据：{num_points:,} 点 (原始: {len(original_data):,} 行)")
                     elif show_original and is_large_file:
                         status_col, btn_col = st.columns([3, 1])
                         with status_col:
                             if range_start is not None and range_end is not None:
-                                st.success(f"✅ 已加载原始数据：{len(plot_data):,} 点 (范围内)")
+                                st.success(f"✅ 已加载原始数据：{num_points:,} 点 (范围内)")
                             else:
-                                st.success(f"✅ 已加载原始数据：{len(plot_data):,} 点 (全部)")
+                                st.success(f"✅ 已加载原始数据：{num_points:,} 点 (全部)")
                         with btn_col:
                             if st.button("🔄 重新配置", key=f"reconfig_{idx}", use_container_width=True):
                                 st.session_state.chart_data_ready[idx] = False
-                                st.rerun()
+                                rerun_chart()
                     
-                    # 创建图表（根据模式选择函数）
-                    if chart_config.get('chart_type') == '直方图':
-                        # 直方图模式
-                        fig, config = create_plotly_histogram(chart_config, plot_data, idx)
-                    elif chart_config.get('overlay_mode', False):
-                        # 重叠模式
-                        fig, config = create_plotly_chart_overlay(chart_config, plot_data, original_indices)
+                    # 创建图表（根据模式选择函数），命中缓存时跳过
+                    if cached_figure is not None:
+                        fig, config = cached_figure['fig'], cached_figure['config']
+                        payload_bytes = cached_figure['payload_bytes']
+                        percentile_table = cached_figure['percentile_table']
                     else:
-                        # 普通模式
-                        fig, config = create_plotly_chart(chart_config, plot_data, original_indices)
+                        percentile_table = None
+                        if chart_config.get('chart_type') == '直方图':
+                            # 直方图模式：排序数值按（文件、数据选择、列）缓存，改变分箱数时无需重新排序
+                            hist_values_key = (f"{data_source}_{len(original_data)}_{use_downsample}_{st.session_state.downsample_ratio}"
+                                               f"_{range_start}_{range_end}_{use_index_range}")
+                            # 大文件或降采样视图（未限定范围）的百分位数读加载时构建的整列分位数草图，
+                            # 小文件和已确认的范围用排序数值精确计算
+                            sketch_source = data_source if range_start is None and (use_downsample or is_large_file) else None
+                            fig, config = create_plotly_histogram(chart_config, plot_data, idx, hist_values_key, sketch_source)
+                            percentile_table = compute_percentile_table(chart_config, plot_data, hist_values_key, sketch_source)
+                        elif is_channel_hist:
+                            # 通道分布图模式：所有通道一次分箱，只发送（通道 × 分箱）计数矩阵
+                            fig, config = create_plotly_channel_histogram(chart_config, parsed_array, channel_rows)
+                        elif is_density:
+                            # 密度图模式：服务端按像素网格分箱，只发送计数图像
+                            fig, config = create_plotly_density(chart_config, plot_data, st.session_state.density_windows.get(idx),
+                                                                file_info.get('column_stats'))
+                        elif chart_config.get('overlay_mode', False):
+                            # 重叠模式
+                            fig, config = create_plotly_chart_overlay(chart_config, plot_data, original_indices, file_info.get('column_stats'),
+                                                                      envelopes)
+                        else:
+                            # 普通模式
+                            fig, config = create_plotly_chart(chart_config, plot_data, original_indices, file_info.get('column_stats'),
+                                                              envelopes)
+                        payload_bytes = estimate_figure_payload_bytes(fig)
+                        if fig.data:
+                            store_cached_figure(fig_cache_key, fig, config, num_points, figure_nbytes(fig), payload_bytes, percentile_table,
+                                                data_source)
+                            # 片段单独重跑时侧边栏不会执行，在此检查内存预算
+                            enforce_session_memory_budget()
                     
                     # 提示信息
                     if chart_config.get('chart_type') == '直方图':
                         # 直方图的提示
                         st.caption("💡 直方图提示：可框选区域放大；使用下方滑块或快捷按钮调整分箱数；多个特征会叠加显示并自动调整透明度。")
+                    elif is_channel_hist:
+                        st.caption("💡 通道分布图提示：每一行是一个通道的分布，颜色表示该分箱内的样本数；可框选区域放大；使用下方滑块或快捷按钮调整分箱数。")
+                    elif is_density:
+                        tip_col, reset_col = st.columns([4, 1])
+                        with tip_col:
+                            st.caption("💡 密度图提示：颜色表示每个网格内的点数；框选区域后将按新视窗在服务端重新分箱（放大后依然是像素级精度）；"
+                                       "多个特征时框选的Y范围只作用于所在的那一行。")
+                        with reset_col:
+                            if st.button("↩️ 重置视窗", key=f"density_reset_{idx}", use_container_width=True,
+                                         disabled=idx not in st.session_state.density_windows):
+                                st.session_state.density_windows.pop(idx, None)
+                                rerun_chart()
                     elif chart_config.get('overlay_mode', False):
                         # 重叠模式的提示
                         st.caption("💡 重叠模式提示：每条曲线使用独立的Y轴刻度（颜色关联）；可框选区域放大；鼠标悬停在Y轴上滚动滚轮可缩放该轴；双击Y轴自动适配；点击图例可隐藏/显示对应曲线。")
@@ -2791,12 +5537,31 @@ def render_chart_area(idx, chart_config):
                     elif show_original:
                         st.caption("💡 提示：可框选区域进行放大；鼠标悬停查看数据点和原始行索引；鼠标悬停在坐标轴上可拖动，滚动滚轮可进行缩放；双击可重置视图。")
                     
+                    if use_time_resample:
+                        interval_label = next((label for label, ms in TIME_RESAMPLE_INTERVALS.items()
+                                               if ms == chart_config['time_resample_interval']), '')
+                        st.caption(f"⏱️ 已按 {interval_label} 时间桶重采样（{TIME_RESAMPLE_AGGS[chart_config.get('time_resample_agg', 'mean')]}），"
+                                   f"共 {num_points:,} 个桶；悬浮框中的行索引为每个桶的第一行")
+                    if use_envelope:
+                        st.caption(f"📉 降采样预览：数据按行均分为 {num_points:,} 块，曲线为块内均值，半透明带为块内最小值~最大值；"
+                                   f"悬浮框中的行索引为每块的第一行")
+                    if chart_config.get('chart_type') == '折线图' and any(trace.type == 'scattergl' for trace in fig.data):
+                        st.caption(f"⚡ 曲线总点数超过 {st.session_state.webgl_line_threshold:,}，已自动切换为 WebGL 渲染")
+                    
                     # 显示图表
-                    st.plotly_chart(fig, use_container_width=False, config=config, key=f"chart_{idx}")
+                    if is_density:
+                        # 框选事件触发该图表重跑，按框选的视窗重新分箱
+                        st.plotly_chart(fig, use_container_width=False, config=config, key=f"chart_{idx}",
+                                        on_select="rerun", selection_mode="box")
+                    else:
+                        st.plotly_chart(fig, use_container_width=False, config=config, key=f"chart_{idx}")
+                    st.caption(f"📦 本图发送约 {payload_bytes / 1e6:,.2f} MB（二进制类型数组）")
                     
-                    # 直方图的bin控制组件（放在图表下方）
-                    if chart_config.get('chart_type') == '直方图':
+                    # 直方图的bin控制组件和百分位数汇总（放在图表下方）
+                    if chart_config.get('chart_type') in ('直方图', '通道分布图'):
                         render_histogram_bin_control(idx, chart_config)
+                        if percentile_table is not None and not percentile_table.empty:
+                            render_percentile_table(percentile_table, chart_config.get('decimal_places', 2))
             except Exception as e:
                 st.error(f"绘制图表出错: {str(e)}")
                 import traceback
@@ -2817,8 +5582,52 @@ if st.session_state.files_data:
             st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
     else:
-        # 显示所有图表
-        for idx, chart_config in enumerate(st.session_state.charts):
+        # 分页显示图表：只有当前页且未折叠的图表才准备数据和发送图表
+        num_charts = len(st.session_state.charts)
+        per_page = st.session_state.charts_per_page
+        num_pages = (num_charts + per_page - 1) // per_page
+        st.session_state.chart_page = min(st.session_state.chart_page, num_pages - 1)
+        
+        def select_chart_page():
+            st.session_state.chart_page = st.session_state.chart_page_select
+        
+        def select_charts_per_page():
+            st.session_state.charts_per_page = st.session_state.charts_per_page_select
+        
+        def set_all_collapsed(collapsed):
+            for chart in st.session_state.charts:
+                chart['collapsed'] = collapsed
+        
+        page_col, per_page_col, fold_col, unfold_col = st.columns([3, 2, 1.5, 1.5])
+        with page_col:
+            if num_pages > 1:
+                # 页码由 chart_page 记录（新增图表时会跳页），创建控件前同步
+                st.session_state.chart_page_select = st.session_state.chart_page
+                st.selectbox(
+                    "页码",
+                    options=list(range(num_pages)),
+                    format_func=lambda page: f"第 {page + 1} / {num_pages} 页（图表 {page * per_page + 1}–{min(num_charts, (page + 1) * per_page)}）",
+                    key="chart_page_select",
+                    on_change=select_chart_page
+                )
+        with per_page_col:
+            # 每页图表数由 charts_per_page 记录（没有图表时该控件不渲染，控件的键会被清除），创建控件前同步
+            st.session_state.charts_per_page_select = st.session_state.charts_per_page
+            st.selectbox(
+                "每页图表数",
+                options=CHARTS_PER_PAGE_OPTIONS,
+                key="charts_per_page_select",
+                on_change=select_charts_per_page,
+                help="不在当前页的图表保留配置，但不准备数据也不发送图表"
+            )
+        with fold_col:
+            st.button("▸ 全部折叠", key="collapse_all_btn", on_click=set_all_collapsed, args=(True,), use_container_width=True)
+        with unfold_col:
+            st.button("▾ 全部展开", key="expand_all_btn", on_click=set_all_collapsed, args=(False,), use_container_width=True)
+        
+        page_start = st.session_state.chart_page * per_page
+        for idx in range(page_start, min(num_charts, page_start + per_page)):
+            chart_config = st.session_state.charts[idx]
             render_chart_area(idx, chart_config)
             
             # 图表之间的实线分隔
@@ -3041,6 +5850,9 @@ else:
     - 🚀 **智能容错**：X轴非数值型自动回退到简单采样，确保系统稳定运行
     """)
 
+# 本次渲染新增的缓存也纳入会话内存预算
+enforce_session_memory_budget()
+
 # 页脚
 st.markdown("---")
 st.markdown(
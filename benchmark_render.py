@@ -0,0 +1,84 @@
+"""
+折线图渲染基准：对比 SVG（go.Scatter）与 WebGL（go.Scattergl）两种模式
+
+服务端测量图表构建、序列化耗时和载荷大小；同时生成一个HTML页面，
+在浏览器中打开后逐个绘制各组合并显示 Plotly.newPlot 的渲染耗时。
+
+用法:
+    python benchmark_render.py --points 10000 100000 300000 --traces 4
+"""
+import argparse
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+
+
+def build_figure(trace_class, num_points, num_traces, overlay):
+    """构建与 app.py 相同布局的折线图：overlay=True 时每条曲线使用独立Y轴"""
+    x = np.arange(num_points, dtype=np.int32)
+    rng = np.random.default_rng(0)
+    fig = go.Figure()
+    for i in range(num_traces):
+        y = np.cumsum(rng.standard_normal(num_points))
+        yaxis = f'y{i + 1}' if overlay and i > 0 else 'y'
+        fig.add_trace(trace_class(x=x, y=y, mode='lines', name=f'ch{i}', yaxis=yaxis,
+                                  customdata=x, hovertemplate='%{y:.2f} (行索引: %{customdata})<extra></extra>'))
+    layout = {'hovermode': 'x unified', 'xaxis': {'showspikes': True, 'spikemode': 'across'}}
+    if overlay:
+        for i in range(1, num_traces):
+            layout[f'yaxis{i + 1}'] = {'overlaying': 'y', 'side': 'right' if i % 2 else 'left',
+                                       'anchor': 'free', 'autoshift': True}
+    fig.update_layout(**layout)
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description="折线图 SVG / WebGL 渲染基准")
+    parser.add_argument('--points', type=int, nargs='+', default=[10000, 100000, 300000], help="每条曲线的点数")
+    parser.add_argument('--traces', type=int, default=4, help="曲线条数")
+    parser.add_argument('--out', default='render_benchmark.html', help="浏览器渲染基准页面的输出路径")
+    args = parser.parse_args()
+
+    cases = []
+    print(f"{'模式':<16}{'总点数':>12}{'构建(ms)':>12}{'序列化(ms)':>14}{'载荷(MB)':>12}")
+    for num_points in args.points:
+        for overlay in (False, True):
+            for trace_class, mode in ((go.Scatter, 'SVG'), (go.Scattergl, 'WebGL')):
+                start = time.perf_counter()
+                fig = build_figure(trace_class, num_points, args.traces, overlay)
+                built = time.perf_counter()
+                spec = fig.to_json()
+                serialized = time.perf_counter()
+                label = f"{mode}{' 重叠' if overlay else ''}"
+                print(f"{label:<16}{num_points * args.traces:>12,}{(built - start) * 1000:>12.1f}"
+                      f"{(serialized - built) * 1000:>14.1f}{len(spec) / 1e6:>12.2f}")
+                cases.append((f"{label} {num_points * args.traces:,} 点", spec))
+
+    # 浏览器端：依次绘制每个组合，记录 Plotly.newPlot 到首帧完成的耗时
+    specs = ",\n".join(f"[{label!r}, {spec}]" for label, spec in cases)
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><script>{get_plotlyjs()}</script></head>
+<body><pre id="result">渲染中...</pre><div id="plot" style="width:1600px;height:500px"></div>
+<script>
+const cases = [{specs}];
+const lines = [];
+(async () => {{
+  for (const [label, spec] of cases) {{
+    Plotly.purge('plot');
+    const start = performance.now();
+    await Plotly.newPlot('plot', spec.data, spec.layout);
+    await new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve)));
+    lines.push(label.padEnd(24) + (performance.now() - start).toFixed(0) + ' ms');
+    document.getElementById('result').textContent = lines.join('\\n');
+  }}
+}})();
+</script></body></html>"""
+    with open(args.out, 'w', encoding='utf-8') as f:
+        f.write(html)
+    print(f"\n浏览器渲染基准已写入 {args.out}，用浏览器打开即可查看各模式的绘制耗时")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import os
+import sys
+import warnings
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py 是 Streamlit 脚本，导入时以 bare 模式执行一遍页面（会打印无 ScriptRunContext 的警告）
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore')
+    import app as app_module
+
+
+@pytest.fixture
+def app():
+    return app_module
+
+
+@pytest.fixture
+def disk_cache_dir(app, tmp_path, monkeypatch):
+    """把磁盘缓存目录指向临时目录"""
+    monkeypatch.setattr(app, 'DISK_CACHE_DIR', str(tmp_path))
+    return tmp_path
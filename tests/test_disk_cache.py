@@ -0,0 +1,71 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def make_entry(app):
+    num_rows = 1000
+    df = pd.DataFrame({
+        't': np.arange(num_rows) * 0.01,
+        'a': np.random.default_rng(6).normal(size=num_rows),
+        'n': np.arange(num_rows),
+        'name': [f"row{i}" for i in range(num_rows)],
+        'lst': [f"[{i}, {i + 1}, {i * 0.5}]" for i in range(num_rows)],
+    })
+    return app.build_file_entry(df, {'input_bytes': 1, 'output_bytes': 1})
+
+
+def test_disk_cache_round_trip(app, disk_cache_dir):
+    entry = make_entry(app)
+    app.save_to_disk_cache('key', entry)
+    loaded = app.load_from_disk_cache('key')
+
+    assert loaded['data'].columns.tolist() == entry['data'].columns.tolist()
+    for col in entry['data'].columns:
+        assert loaded['data'][col].tolist() == entry['data'][col].tolist()
+    assert loaded['list_columns_info'] == entry['list_columns_info']
+    assert loaded['column_stats'] == json.loads(json.dumps(entry['column_stats']))
+    assert loaded['ingest_stats']['from_cache']
+    assert loaded['cache_key'] == loaded['content_key'] == 'key'
+    assert loaded['cached_list_arrays'] == {}
+
+
+def test_disk_cache_list_arrays_round_trip(app, disk_cache_dir):
+    entry = make_entry(app)
+    app.save_to_disk_cache('key', entry)
+    parsed = app.parse_list_column_to_array(entry['data']['lst'])
+    app.save_list_array_to_disk_cache('key', 'lst', parsed)
+    app.save_list_array_to_disk_cache('key', 'other', parsed[:, :1])
+
+    loaded = app.load_from_disk_cache('key')
+    assert np.array_equal(loaded['cached_list_arrays']['lst'], parsed)
+    assert np.array_equal(loaded['cached_list_arrays']['other'], parsed[:, :1])
+    # 数组文件名由列名确定，缓存目录中没有遗留的临时文件
+    files = os.listdir(disk_cache_dir / 'key')
+    assert app.column_cache_filename('list', 'lst') in files
+    assert not [name for name in files if '.tmp' in name]
+
+
+def test_disk_cache_sketch_round_trip(app, disk_cache_dir):
+    entry = make_entry(app)
+    assert set(entry['column_sketches']) == {'t', 'a', 'n'}
+    app.save_to_disk_cache('key', entry)
+    loaded = app.load_from_disk_cache('key')
+    for col, sketch in entry['column_sketches'].items():
+        assert loaded['column_sketches'][col]['count'] == sketch['count']
+        assert np.array_equal(loaded['column_sketches'][col]['quantiles'], sketch['quantiles'])
+    # 草图各存一个 .npy，manifest.json 中只有文件名
+    with open(disk_cache_dir / 'key' / 'manifest.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert manifest['sketches']['a'] == app.column_cache_filename('sketch', 'a')
+    assert all('quantiles' not in json.dumps(stats) for stats in manifest['column_stats'].values())
+
+
+def test_load_from_disk_cache_missing_or_corrupt(app, disk_cache_dir):
+    assert app.load_from_disk_cache('missing') is None
+    os.makedirs(disk_cache_dir / 'broken')
+    (disk_cache_dir / 'broken' / 'manifest.json').write_text('{', encoding='utf-8')
+    assert app.load_from_disk_cache('broken') is None
+    assert not (disk_cache_dir / 'broken').exists()
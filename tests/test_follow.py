@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def session(app):
+    """清空会话中的文件和派生缓存"""
+    state = app.st.session_state
+    state.files_data = {}
+    for cache_name in app.FILE_DERIVED_CACHES:
+        state[cache_name] = {}
+    return state
+
+
+def write_log(path, rows, mode='w'):
+    with open(path, mode, encoding='utf-8') as f:
+        f.write(''.join(rows))
+
+
+def make_rows(start, stop):
+    return [f'{i},{i * 0.5},"[{i}, {i + 1}]"\n' for i in range(start, stop)]
+
+
+def follow_log(app, session, path):
+    entry = app.start_follow_file(str(path))
+    session.files_data['log.csv'] = entry
+    return entry
+
+
+def test_read_complete_lines_holds_back_partial_line(app, tmp_path):
+    path = tmp_path / 'log.csv'
+    path.write_bytes(b't,a\n1,2\n3,')
+    raw, offset = app.read_complete_lines(str(path), 0)
+    assert raw == b't,a\n1,2\n'
+    assert offset == len(raw)
+    # 半行写完之前不前进偏移
+    assert app.read_complete_lines(str(path), offset) == (b'', offset)
+    with open(path, 'ab') as f:
+        f.write(b'4\n5')
+    assert app.read_complete_lines(str(path), offset) == (b'3,4\n', offset + 4)
+
+
+def test_append_to_buffer_grows_geometrically(app):
+    buffer = np.arange(4)
+    buffer = app.append_to_buffer(buffer, 4, np.array([4]))
+    assert len(buffer) == 8
+    grown = app.append_to_buffer(buffer, 5, np.array([5, 6, 7]))
+    assert grown is buffer
+    assert grown.tolist() == list(range(8))
+    # 新值需要更宽的类型时整体提升
+    widened = app.append_to_buffer(grown, 8, np.array([np.nan]))
+    assert widened.dtype == np.float64
+    assert widened[:8].tolist() == list(range(8)) and np.isnan(widened[8])
+
+
+def test_append_followed_rows(app, session, tmp_path):
+    path = tmp_path / 'log.csv'
+    write_log(path, ['t,a,lst\n'] + make_rows(0, 10))
+    entry = follow_log(app, session, path)
+    session.parsed_list_columns['log.csv_lst'] = app.parse_list_column_to_array(entry['data']['lst'])
+    session.x_range_indices['log.csv_t'] = {'monotonic': True}
+
+    for start, stop in ((10, 15), (15, 20), (20, 140)):
+        write_log(path, make_rows(start, stop), mode='a')
+        assert app.append_followed_rows('log.csv') == stop - start
+
+    info = session.files_data['log.csv']
+    assert info['data']['t'].tolist() == list(range(140))
+    assert info['data'].index.tolist() == list(range(140))
+    assert info['data']['lst'].iat[139] == '[139, 140]'
+    assert np.array_equal(session.parsed_list_columns['log.csv_lst'],
+                          app.parse_list_column_to_array(info['data']['lst']))
+    assert info['column_stats']['t']['max'] == 139
+    assert info['column_stats']['t']['monotonic']
+    # DataFrame 是预分配缓冲区的视图，追加时不复制已有行
+    assert np.shares_memory(info['data']['a'].to_numpy(), info['follow']['buffers']['a'])
+    # 整列派生缓存追加后失效
+    assert 'log.csv_t' not in session.x_range_indices
+    # 没有新行时不追加
+    assert app.append_followed_rows('log.csv') == 0
+
+
+def test_append_followed_rows_widens_dtype_and_channels(app, session, tmp_path):
+    path = tmp_path / 'log.csv'
+    write_log(path, ['t,a,lst\n'] + make_rows(0, 3))
+    entry = follow_log(app, session, path)
+    session.parsed_list_columns['log.csv_lst'] = app.parse_list_column_to_array(entry['data']['lst'])
+    write_log(path, ['3,,"[3, 4, 5]"\n'], mode='a')
+    app.append_followed_rows('log.csv')
+
+    info = session.files_data['log.csv']
+    assert np.isnan(info['data']['a'].iat[3])
+    assert info['column_stats']['a']['null_count'] == 1
+    parsed = session.parsed_list_columns['log.csv_lst']
+    assert parsed.shape == (4, 3)
+    assert np.isnan(parsed[0, 2]) and parsed[3, 2] == 5
+    assert info['list_columns_info']['lst']['num_channels'] == 3
+
+
+def test_append_followed_rows_reloads_after_truncation(app, session, tmp_path):
+    path = tmp_path / 'log.csv'
+    write_log(path, ['t,a,lst\n'] + make_rows(0, 50))
+    follow_log(app, session, path)
+    session.x_range_indices['log.csv_t'] = {'monotonic': True}
+
+    write_log(path, ['t,a,lst\n'] + make_rows(100, 103))
+    assert app.append_followed_rows('log.csv') == 3
+    info = session.files_data['log.csv']
+    assert info['data']['t'].tolist() == [100, 101, 102]
+    assert info['follow']['offset'] == path.stat().st_size
+    assert 'log.csv_t' not in session.x_range_indices
+
+
+def test_merge_column_stats(app):
+    import pandas as pd
+    old = pd.DataFrame({'t': [1, 2, 3], 'a': [5.0, np.nan, 1.0], 's': ['x', 'y', 'z']})
+    new = pd.DataFrame({'t': [3, 7], 'a': [9.0, -2.0], 's': ['w', None]})
+    merged = app.merge_column_stats(app.compute_column_stats(old), app.compute_column_stats(new),
+                                    pd.concat([old, new], ignore_index=True))
+    assert (merged['t']['min'], merged['t']['max'], merged['t']['last']) == (1, 7, 7)
+    assert merged['t']['monotonic']
+    assert (merged['a']['min'], merged['a']['max'], merged['a']['null_count']) == (-2.0, 9.0, 1)
+    assert not merged['a']['monotonic']
+    assert merged['s']['null_count'] == 1
+    assert merged['s']['min'] is None
+
+    # 新段首值小于旧段末值时不再单调
+    decreasing = pd.DataFrame({'t': [2, 8]})
+    merged = app.merge_column_stats(merged, app.compute_column_stats(decreasing), decreasing)
+    assert not merged['t']['monotonic']
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+
+def test_bin_sorted_values_matches_np_histogram(app):
+    rng = np.random.default_rng(0)
+    values = np.sort(np.concatenate([rng.normal(size=10000), np.round(rng.normal(size=1000) * 4) / 4]))
+    for num_bins in (1, 8, 37, 50):
+        expected, edges = np.histogram(values, bins=num_bins)
+        assert np.array_equal(app.bin_sorted_values(values, edges), expected)
+
+
+def test_bin_sorted_values_edges_and_range(app):
+    values = np.array([0.0, 0.25, 0.5, 0.75, 1.0, 1.5])
+    edges = np.linspace(0, 1, 5)
+    # 内部边界上的值归入上一个分箱，最后一个分箱包含右端点，范围外的值不计数
+    assert app.bin_sorted_values(values, edges).tolist() == [1, 1, 1, 2]
+
+
+def test_merge_quantile_sketches_approximates_whole_column(app):
+    rng = np.random.default_rng(1)
+    first, second = rng.normal(size=200000), rng.normal(loc=2, size=100000)
+    merged = app.merge_quantile_sketches([app.sketch_from_sorted(np.sort(first)),
+                                          app.sketch_from_sorted(np.sort(second))])
+    whole = np.concatenate([first, second])
+    assert merged['count'] == len(whole)
+    percentiles = [0.1, 1, 5, 25, 50, 75, 95, 99, 99.9]
+    assert np.allclose(app.sketch_percentiles(merged, percentiles), np.percentile(whole, percentiles), atol=0.01)
+    # 最小/最大值精确保留
+    assert app.sketch_percentiles(merged, [0, 100]).tolist() == [whole.min(), whole.max()]
+
+
+def test_merge_quantile_sketches_skips_empty(app):
+    sketch = app.sketch_from_sorted(np.arange(10.0))
+    assert app.merge_quantile_sketches([None, {'count': 0, 'quantiles': []}]) is None
+    merged = app.merge_quantile_sketches([None, sketch])
+    assert merged['count'] == 10
+    assert np.array_equal(merged['quantiles'], sketch['quantiles'])
+
+
+def test_build_quantile_sketch_samples_large_blocks(app, monkeypatch):
+    import pandas as pd
+    monkeypatch.setattr(app, 'QUANTILE_SKETCH_SAMPLE_SIZE', 20000)
+    values = np.random.default_rng(7).normal(size=300000)
+    sketch = app.build_quantile_sketch(pd.Series(values))
+    assert sketch['count'] == len(values)
+    # 抽样只影响中间分位点的精度，最小/最大值精确
+    assert app.sketch_percentiles(sketch, [0, 100]).tolist() == [values.min(), values.max()]
+    assert np.allclose(app.sketch_percentiles(sketch, [1, 25, 50, 75, 99]),
+                       np.percentile(values, [1, 25, 50, 75, 99]), atol=0.05)
+
+
+def test_build_quantile_sketch_in_blocks(app, monkeypatch):
+    import pandas as pd
+    monkeypatch.setattr(app, 'QUANTILE_SKETCH_BLOCK_ROWS', 1000)
+    values = np.random.default_rng(2).uniform(size=5000)
+    values[::10] = np.nan
+    sketch = app.build_quantile_sketch(pd.Series(values))
+    finite = values[~np.isnan(values)]
+    assert sketch['count'] == len(finite)
+    assert np.allclose(app.sketch_percentiles(sketch, [1, 50, 99]), np.percentile(finite, [1, 50, 99]), atol=0.01)
+
+
+@pytest.mark.parametrize('per_channel', [False, True])
+def test_bin_channel_values_matches_np_histogram(app, per_channel):
+    rng = np.random.default_rng(3)
+    values = rng.normal(size=(5000, 5))
+    values[::7, 2] = np.nan
+    values[:100, 1] = np.round(values[:100, 1] * 4) / 4  # 落在分箱边界上的值
+    values[:, 4] = 3.0
+    lows = np.fmin.reduce(values, axis=0)
+    highs = np.fmax.reduce(values, axis=0)
+    if not per_channel:
+        lows, highs = np.fmin.reduce(lows), np.fmax.reduce(highs)
+    highs = np.where(highs > lows, highs, lows + 1.0)
+    for num_bins in (8, 37, 50):
+        counts = app.bin_channel_values(values, lows, highs, num_bins)
+        channel_lows = np.broadcast_to(lows, (5,))
+        channel_highs = np.broadcast_to(highs, (5,))
+        expected = [np.histogram(values[:, i][~np.isnan(values[:, i])], bins=num_bins,
+                                 range=(channel_lows[i], channel_highs[i]))[0] for i in range(5)]
+        assert np.array_equal(counts, np.array(expected))
+
+
+def test_bin_channel_values_edges(app, monkeypatch):
+    monkeypatch.setattr(app, 'CHANNEL_HIST_BLOCK_ROWS', 2)
+    values = np.array([[0.0], [0.25], [0.5], [0.75], [1.0], [0.1 + 0.2], [np.nan], [1.5]])
+    assert app.bin_channel_values(values, 0.0, 1.0, 4).tolist() == [[1, 2, 1, 2]]
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+
+def test_compact_plot_array_narrows_floats_to_float32(app):
+    series = pd.Series(np.linspace(-100, 100, 1001))
+    result = app.compact_plot_array(series, 2)
+    assert result.dtype == np.float32
+    assert np.array_equal(np.round(result.astype(np.float64), 2), np.round(series.to_numpy(), 2))
+
+
+def test_compact_plot_array_keeps_float64_when_displayed_decimals_change(app):
+    # float32 下 12345.675 会显示成 12345.67，与原值按两位小数舍入的 12345.68 不同
+    series = pd.Series([12345.675, 1.5, 0.25])
+    assert app.compact_plot_array(series, 2).dtype == np.float64
+
+
+def test_compact_plot_array_keeps_float64_above_exact_limit(app):
+    series = pd.Series([0.5, app.FLOAT32_EXACT_LIMIT / 100])
+    assert app.compact_plot_array(series, 2).dtype == np.float64
+
+
+def test_compact_plot_array_keeps_nan(app):
+    series = pd.Series([1.25, np.nan, -3.5])
+    result = app.compact_plot_array(series, 2)
+    assert result.dtype == np.float32
+    assert np.isnan(result[1])
+
+
+def test_compact_plot_array_integers(app):
+    assert app.compact_plot_array(pd.Series([1, -2, 2 ** 31 - 1]), 0).dtype == np.int32
+    assert app.compact_plot_array(pd.Series([1, 2 ** 31]), 0).dtype == np.int64
+
+
+def test_compact_plot_array_uses_column_stats_range(app):
+    # 列统计给出的范围超过上限时不尝试 float32
+    series = pd.Series([0.5, 1.5])
+    assert app.compact_plot_array(series, 2, {'min': 0.0, 'max': 1e9}).dtype == np.float64
+
+
+def test_compact_plot_array_leaves_non_numeric_columns(app):
+    series = pd.Series(['a', 'b'])
+    assert app.compact_plot_array(series, 2) is series
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+
+def make_time_frame(num_rows=10000):
+    rng = np.random.default_rng(4)
+    times = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.cumsum(rng.integers(1, 400, num_rows)), unit='ms')
+    df = pd.DataFrame({'t': times, 'a': rng.normal(size=num_rows), 'b': rng.uniform(size=num_rows)})
+    df.loc[::13, 'a'] = np.nan
+    return df
+
+
+def test_get_time_bucket_aggregates_matches_pandas(app):
+    df = make_time_frame()
+    interval_ms = 5000
+    entry = app.get_time_bucket_aggregates(df, 't', ['a', 'b'], interval_ms)
+
+    expected = df.groupby(df['t'].dt.floor(f'{interval_ms}ms'))[['a', 'b']].agg(['mean', 'min', 'max'])
+    assert entry['num_rows'] == len(df)
+    assert np.array_equal(entry['bucket_ms'], expected.index.to_numpy().astype('datetime64[ms]').view(np.int64))
+    for col in ('a', 'b'):
+        for agg in ('mean', 'min', 'max'):
+            assert np.allclose(entry['columns'][col][agg], expected[(col, agg)].to_numpy(), equal_nan=True)
+    first_rows = df.groupby(df['t'].dt.floor(f'{interval_ms}ms')).apply(lambda group: group.index[0])
+    assert np.array_equal(entry['first_row'], first_rows.to_numpy())
+
+
+def test_get_time_bucket_aggregates_skips_missing_times(app):
+    df = pd.DataFrame({'t': pd.to_datetime(['2024-01-01 00:00:00.5', None, '2024-01-01 00:00:01.2', '2024-01-01 00:00:01.9']),
+                       'y': [1.0, 100.0, 2.0, 4.0]})
+    entry = app.get_time_bucket_aggregates(df, 't', ['y'], 1000)
+    assert entry['first_row'].tolist() == [0, 2]
+    assert entry['columns']['y']['mean'].tolist() == [1.0, 3.0]
+    assert entry['columns']['y']['max'].tolist() == [1.0, 4.0]
+
+
+def test_row_bucket_aggregates(app):
+    values = np.array([1.0, np.nan, 3.0, -2.0, 5.0, np.nan, np.nan, 7.0])
+    starts = np.array([0, 3, 5, 7])
+    with np.errstate(invalid='ignore'):
+        means, mins, maxs = app.row_bucket_aggregates(values, starts)
+    assert means[:2].tolist() == [2.0, 1.5]
+    assert np.isnan(means[2])  # 整块缺失
+    assert means[3] == 7.0
+    assert np.array_equal(mins, [1.0, -2.0, np.nan, 7.0], equal_nan=True)
+    assert np.array_equal(maxs, [3.0, 5.0, np.nan, 7.0], equal_nan=True)
+
+
+def test_row_bucket_aggregates_matches_blockwise_numpy(app):
+    values = np.random.default_rng(5).normal(size=10007)
+    starts = np.arange(0, len(values), 100)
+    means, mins, maxs = app.row_bucket_aggregates(values.astype(np.float32), starts)
+    blocks = np.split(values.astype(np.float32).astype(np.float64), starts[1:])
+    assert np.allclose(means, [block.mean() for block in blocks])
+    assert np.array_equal(mins, [block.min() for block in blocks])
+    assert np.array_equal(maxs, [block.max() for block in blocks])